@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CategoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.category'
+
+    def ready(self):
+        from apps.category import signals  # noqa: F401
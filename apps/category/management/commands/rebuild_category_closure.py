@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.category.models import category_tree
+
+
+class Command(BaseCommand):
+    help = "Check or rebuild the category closure table from Category.parent."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report inconsistencies, exit with an error if any.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            missing, unexpected = category_tree.check()
+            if missing or unexpected:
+                raise CommandError(
+                    f"Category closure is inconsistent: {len(missing)} missing and {len(unexpected)} unexpected row(s). "
+                    "Run without --check to rebuild it."
+                )
+            self.stdout.write(self.style.SUCCESS("Category closure is consistent."))
+            return
+
+        rows = category_tree.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Category closure rebuilt with {rows} row(s)."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.tree import closure_rows
+
+
+def populate_category_closure(apps, schema_editor):
+    Category = apps.get_model('category', 'Category')
+    CategoryClosure = apps.get_model('category', 'CategoryClosure')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    CategoryClosure.objects.bulk_create(
+        [CategoryClosure(ancestor_id=a, descendant_id=d, depth=depth) for a, d, depth in closure_rows(parents)],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='category.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='category.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_category_closure')],
+            },
+        ),
+        migrations.RunPython(populate_category_closure, migrations.RunPython.noop),
+    ]
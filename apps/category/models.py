@@ -4,6 +4,8 @@ from django.utils.text import slugify
 import uuid
 import os
 
+from core.tree import ClosureTree
+
 def get_category_icon_path(instance, filename):
     ext = filename.split(".")[-1]
     unique_id = uuid.uuid4().hex[:6]
@@ -43,6 +45,22 @@ class Category(models.Model):
         if self.icon:
             return self.icon.url
         return None
+
+
+class CategoryClosure(models.Model):
+    # one row per (ancestor, descendant) pair incl. (category, category) at depth 0, kept by apps.category.signals
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_category_closure')
+        ]
+
+
+category_tree = ClosureTree(CategoryClosure)
+
     
 class UsageRange(models.Model):
     unique_id = models.IntegerField(unique=True)
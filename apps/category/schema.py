@@ -0,0 +1,142 @@
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.category.models import Attribute, DataType
+
+
+# Attribute rules of each category, compiled once per process and reused by the salepost write
+# endpoints. Compiled schemas remember the schema version they were built at. Attribute,
+# AttributeChoice and category membership changes bump the version (apps.category.signals),
+# so the next lookup in every process recompiles. The version lives in the Django cache, which
+# only reaches other workers with a shared backend. With the per-process default cache other
+# workers see a change once their schema is older than CATEGORY_SCHEMA_MAX_AGE seconds.
+
+VERSION_KEY = "category-schema:version"
+
+_lock = threading.Lock()
+_compiled = {}  # category id -> CategorySchema
+
+
+class SchemaValidationError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class AttributeRule:
+    attribute: Attribute
+    choice_ids: frozenset
+
+    @property
+    def unique_name(self):
+        return self.attribute.unique_name
+
+    def clean(self, value):
+        """The value as stored in SalePostAttribute.value, None when missing."""
+        if value in (None, ""):
+            if self.attribute.is_required:
+                raise SchemaValidationError(f"{self.unique_name} is required.")
+            return None
+        data_type = self.attribute.data_type
+        if data_type in (DataType.NUMBER, DataType.CHOICE):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise SchemaValidationError(f"{self.unique_name} must be a number.")
+            if data_type == DataType.CHOICE and value not in self.choice_ids:
+                raise SchemaValidationError(f"{self.unique_name} is not a valid choice.")
+            return str(int(value)) if data_type == DataType.CHOICE else str(value)
+        if not isinstance(value, str):
+            raise SchemaValidationError(f"{self.unique_name} must be a string.")
+        return value
+
+
+class CategorySchema:
+    def __init__(self, category_id, version, rules):
+        self.category_id = category_id
+        self.version = version
+        self.rules = rules
+        self.compiled_at = time.monotonic()
+
+    def is_current(self, version):
+        return self.version == version and time.monotonic() - self.compiled_at < _max_age()
+
+    def validate(self, data):
+        """
+        [(attribute, stored value)] of the attributes present in data (request.data), raises
+        SchemaValidationError with the message of the first invalid or missing attribute.
+        """
+        values = []
+        for rule in self.rules:
+            value = rule.clean(data.get(rule.unique_name))
+            if value is not None:
+                values.append((rule.attribute, value))
+        return values
+
+    def validate_changes(self, data):
+        """
+        Partial form of validate for updates: ([(attribute, stored value)], [cleared attribute])
+        of the attributes present in data. Attributes sent as null or "" are cleared, which
+        required attributes refuse, attributes not sent stay as they are.
+        """
+        values, cleared = [], []
+        for rule in self.rules:
+            if rule.unique_name not in data:
+                continue
+            value = rule.clean(data.get(rule.unique_name))
+            if value is None:
+                cleared.append(rule.attribute)
+            else:
+                values.append((rule.attribute, value))
+        return values, cleared
+
+
+def _max_age():
+    return getattr(settings, "CATEGORY_SCHEMA_MAX_AGE", 60)
+
+
+def _initial_version():
+    # a counter restarted after eviction must not match versions compiled before
+    return time.time_ns() // 1000
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    # without a working cache every lookup compiles
+    return _initial_version() if version is None else version
+
+
+def compile_schema(category_id, version=None):
+    attributes = Attribute.objects.filter(categories=category_id).prefetch_related("choices").order_by("id")
+    rules = [
+        AttributeRule(attribute, frozenset(choice.id for choice in attribute.choices.all()))
+        for attribute in attributes
+    ]
+    return CategorySchema(category_id, _version() if version is None else version, rules)
+
+
+def category_schema(category_id):
+    """The compiled schema of the category, one cache read when it is current."""
+    version = _version()
+    schema = _compiled.get(category_id)
+    if schema is None or not schema.is_current(version):
+        schema = compile_schema(category_id, version)
+        with _lock:
+            _compiled[category_id] = schema
+    return schema
+
+
+def invalidate_schemas():
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            if not cache.add(VERSION_KEY, _initial_version(), timeout=None):
+                cache.incr(VERSION_KEY)
+
+    transaction.on_commit(bump)
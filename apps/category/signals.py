@@ -0,0 +1,45 @@
+from django.core.exceptions import ValidationError
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from apps.category.models import Category, Attribute, AttributeChoice, category_tree
+from apps.category.schema import invalidate_schemas
+
+
+@receiver(pre_save, sender=Category)
+def check_category_parent(sender, instance, **kwargs):
+    instance._previous_parent_id = None
+    if instance.pk is None:
+        return
+    instance._previous_parent_id = Category.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first()
+    if instance.parent_id is not None and instance.parent_id != instance._previous_parent_id:
+        if instance.parent_id == instance.pk or category_tree.is_descendant(instance.pk, instance.parent_id):
+            raise ValidationError("A category cannot be moved under itself or one of its subcategories.")
+
+
+@receiver(post_save, sender=Category)
+def update_category_closure(sender, instance, created, **kwargs):
+    if created:
+        category_tree.node_created(instance)
+    elif instance.parent_id != getattr(instance, "_previous_parent_id", instance.parent_id):
+        category_tree.node_moved(instance)
+
+
+@receiver(pre_delete, sender=Category)
+def detach_category_children(sender, instance, **kwargs):
+    category_tree.node_deleting(instance)
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+@receiver(post_save, sender=AttributeChoice)
+@receiver(post_delete, sender=AttributeChoice)
+@receiver(post_delete, sender=Category)
+def invalidate_attribute_schemas(sender, **kwargs):
+    invalidate_schemas()
+
+
+@receiver(m2m_changed, sender=Attribute.categories.through)
+def invalidate_attribute_schemas_on_categories(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_schemas()
@@ -1,3 +1,130 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from apps.category.models import Attribute, AttributeChoice, Category, DataType, category_tree
+from apps.category.schema import SchemaValidationError, category_schema
+
+
+class CategorySchemaTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="strollers")
+        cls.color = Attribute.objects.create(unique_name="color", display_name="Color", data_type=DataType.CHOICE)
+        cls.red = AttributeChoice.objects.create(attribute=cls.color, value="red")
+        cls.weight = Attribute.objects.create(unique_name="weight", display_name="Weight", data_type=DataType.NUMBER)
+        cls.note = Attribute.objects.create(
+            unique_name="note", display_name="Note", data_type=DataType.TEXT, is_required=False
+        )
+        for attribute in (cls.color, cls.weight, cls.note):
+            attribute.categories.add(cls.category)
+
+    def setUp(self):
+        # schema versions are bumped on commit, which never happens inside a TestCase
+        cache.clear()
+
+    def validate(self, data):
+        return [(attribute.unique_name, value) for attribute, value in category_schema(self.category.id).validate(data)]
+
+    def assertInvalid(self, data, message):
+        with self.assertRaisesMessage(SchemaValidationError, message):
+            self.validate(data)
+
+    def test_valid_values(self):
+        self.assertEqual(
+            self.validate({"color": self.red.id, "weight": 2.5, "note": "as new"}),
+            [("color", str(self.red.id)), ("weight", "2.5"), ("note", "as new")],
+        )
+
+    def test_required_and_type_errors(self):
+        self.assertInvalid({"weight": 1}, "color is required.")
+        self.assertInvalid({"color": self.red.id, "weight": "1"}, "weight must be a number.")
+        self.assertInvalid({"color": self.red.id, "weight": True}, "weight must be a number.")
+        self.assertInvalid({"color": self.red.id, "weight": 1, "note": 3}, "note must be a string.")
+
+    def test_unknown_choice_id_is_rejected(self):
+        self.assertInvalid({"color": self.red.id + 1000, "weight": 1}, "color is not a valid choice.")
+
+    def test_zero_is_a_value(self):
+        # only None and "" count as missing, 0 is a valid number
+        self.assertEqual(self.validate({"color": self.red.id, "weight": 0}), [("color", str(self.red.id)), ("weight", "0")])
+
+    def test_validation_runs_without_queries(self):
+        category_schema(self.category.id)
+        with self.assertNumQueries(0):
+            self.validate({"color": self.red.id, "weight": 1})
+
+    def test_version_bump_recompiles(self):
+        category_schema(self.category.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            blue = AttributeChoice.objects.create(attribute=self.color, value="blue")
+        self.assertEqual(self.validate({"color": blue.id, "weight": 1})[0], ("color", str(blue.id)))
+
+    def test_category_change_recompiles(self):
+        category_schema(self.category.id)
+        size = Attribute.objects.create(unique_name="size", display_name="Size", data_type=DataType.TEXT)
+        with self.captureOnCommitCallbacks(execute=True):
+            size.categories.add(self.category)
+        self.assertInvalid({"color": self.red.id, "weight": 1}, "size is required.")
+
+    @override_settings(CATEGORY_SCHEMA_MAX_AGE=0)
+    def test_schema_expires_without_a_version_bump(self):
+        # another worker's change only bumps the version in its own cache when the cache is not shared
+        category_schema(self.category.id)
+        blue = AttributeChoice.objects.create(attribute=self.color, value="blue")
+        self.assertEqual(self.validate({"color": blue.id, "weight": 1})[0], ("color", str(blue.id)))
+
+
+class CategoryClosureTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # baby > strollers > twin strollers, toys
+        cls.baby = Category.objects.create(name="baby")
+        cls.strollers = Category.objects.create(name="strollers", parent=cls.baby)
+        cls.twin = Category.objects.create(name="twin strollers", parent=cls.strollers)
+        cls.toys = Category.objects.create(name="toys")
+
+    def descendants(self, category):
+        return set(category_tree.descendant_ids([category.id]))
+
+    def assertConsistent(self):
+        self.assertEqual(category_tree.check(), (set(), set()))
+
+    def test_descendants(self):
+        self.assertEqual(self.descendants(self.baby), {self.baby.id, self.strollers.id, self.twin.id})
+        self.assertEqual(self.descendants(self.twin), {self.twin.id})
+        self.assertConsistent()
+
+    def test_reparent_moves_the_subtree(self):
+        self.strollers.parent = self.toys
+        self.strollers.save()
+
+        self.assertEqual(self.descendants(self.baby), {self.baby.id})
+        self.assertEqual(self.descendants(self.toys), {self.toys.id, self.strollers.id, self.twin.id})
+        self.assertEqual(set(category_tree.ancestor_ids([self.twin.id])), {self.twin.id, self.strollers.id, self.toys.id})
+        self.assertConsistent()
+
+    def test_move_to_root_and_back(self):
+        self.strollers.parent = None
+        self.strollers.save()
+        self.assertEqual(self.descendants(self.baby), {self.baby.id})
+
+        self.strollers.parent = self.baby
+        self.strollers.save()
+        self.assertEqual(self.descendants(self.baby), {self.baby.id, self.strollers.id, self.twin.id})
+        self.assertConsistent()
+
+    def test_cannot_move_under_own_subtree(self):
+        self.baby.parent = self.twin
+        with self.assertRaises(ValidationError):
+            self.baby.save()
+        self.assertConsistent()
+
+    def test_deleted_category_detaches_children(self):
+        self.strollers.delete()
+
+        self.assertEqual(self.descendants(self.baby), {self.baby.id})
+        self.assertEqual(self.descendants(self.twin), {self.twin.id})
+        self.assertConsistent()
@@ -1,15 +1,27 @@
-import uuid
 from apps.message.models import Conversation
 from django.utils import timezone
 
-def generate_conversation_unique_id():
-    # Create a unique identifier using UUID4 for 8 characters
+from core.sequences import IdentifierGenerator
+
+
+def _conversation_code(code):
     month = timezone.now().strftime("%m")
     year = timezone.now().strftime("%Y")[2:]
-    unique_code = str(uuid.uuid4().hex[:16])
-    code = f"{year}{month}{unique_code}"
-    # Check if the unique code is already used
-    while Conversation.objects.filter(unique_id=code).exists():
-        unique_code = str(uuid.uuid4().hex[:16])
-        code = f"{year}{month}{unique_code}"
-    return code  
\ No newline at end of file
+    return f"{year}{month}{code}"
+
+
+def _taken_conversation_codes(codes):
+    unique_ids = {_conversation_code(code): code for code in codes}
+    return [unique_ids[unique_id] for unique_id in Conversation.objects.filter(unique_id__in=list(unique_ids)).values_list("unique_id", flat=True)]
+
+
+conversation_codes = IdentifierGenerator(
+    "conversation.unique_id",
+    domain_size=16 ** 16,
+    encode=lambda number: f"{number:016x}",  # 16 hex characters
+    existing=_taken_conversation_codes,
+)
+
+
+def generate_conversation_unique_id():
+    return _conversation_code(conversation_codes.next())
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.region.models import region_tree
+
+
+class Command(BaseCommand):
+    help = "Check or rebuild the region closure table from Region.parent."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report inconsistencies, exit with an error if any.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            missing, unexpected = region_tree.check()
+            if missing or unexpected:
+                raise CommandError(
+                    f"Region closure is inconsistent: {len(missing)} missing and {len(unexpected)} unexpected row(s). "
+                    "Run without --check to rebuild it."
+                )
+            self.stdout.write(self.style.SUCCESS("Region closure is consistent."))
+            return
+
+        rows = region_tree.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Region closure rebuilt with {rows} row(s)."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.tree import closure_rows
+
+
+def populate_region_closure(apps, schema_editor):
+    Region = apps.get_model('region', 'Region')
+    RegionClosure = apps.get_model('region', 'RegionClosure')
+    parents = dict(Region.objects.values_list('id', 'parent_id'))
+    RegionClosure.objects.bulk_create(
+        [RegionClosure(ancestor_id=a, descendant_id=d, depth=depth) for a, d, depth in closure_rows(parents)],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('region', '0004_alter_region_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='region.region')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='region.region')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_region_closure')],
+            },
+        ),
+        migrations.RunPython(populate_region_closure, migrations.RunPython.noop),
+    ]
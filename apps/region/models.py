@@ -1,5 +1,7 @@
 from django.db import models
 
+from core.tree import ClosureTree
+
 class Region(models.Model):
     name = models.CharField(max_length=255)
     parent = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="subregions")
@@ -12,3 +14,26 @@ class Region(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def coordinates(self):
+        # centroid is stored as text, (lat, lon) floats or (None, None) when missing
+        try:
+            return float(self.latitude), float(self.longitude)
+        except (TypeError, ValueError):
+            return None, None
+
+
+
+class RegionClosure(models.Model):
+    # one row per (ancestor, descendant) pair incl. (region, region) at depth 0, kept by apps.region.signals
+    ancestor = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_region_closure')
+        ]
+
+
+region_tree = ClosureTree(RegionClosure)
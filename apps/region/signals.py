@@ -0,0 +1,29 @@
+from django.core.exceptions import ValidationError
+from django.db.models.signals import pre_save, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.region.models import Region, region_tree
+
+
+@receiver(pre_save, sender=Region)
+def check_region_parent(sender, instance, **kwargs):
+    instance._previous_parent_id = None
+    if instance.pk is None:
+        return
+    instance._previous_parent_id = Region.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first()
+    if instance.parent_id is not None and instance.parent_id != instance._previous_parent_id:
+        if instance.parent_id == instance.pk or region_tree.is_descendant(instance.pk, instance.parent_id):
+            raise ValidationError("A region cannot be moved under itself or one of its subregions.")
+
+
+@receiver(post_save, sender=Region)
+def update_region_closure(sender, instance, created, **kwargs):
+    if created:
+        region_tree.node_created(instance)
+    elif instance.parent_id != getattr(instance, "_previous_parent_id", instance.parent_id):
+        region_tree.node_moved(instance)
+
+
+@receiver(pre_delete, sender=Region)
+def detach_region_children(sender, instance, **kwargs):
+    region_tree.node_deleting(instance)
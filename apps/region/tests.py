@@ -1,3 +1,133 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-# Create your tests here.
+from apps.category.models import Category
+from apps.region.models import Region, region_tree
+from apps.salepost.models import SalePost, PublishStatus
+
+from core.geo import grid_cell
+
+
+class RegionClosureTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # turkey > istanbul > kadikoy, ankara
+        cls.turkey = Region.objects.create(name="turkey")
+        cls.istanbul = Region.objects.create(name="istanbul", parent=cls.turkey)
+        cls.kadikoy = Region.objects.create(name="kadikoy", parent=cls.istanbul)
+        cls.ankara = Region.objects.create(name="ankara")
+
+    def descendants(self, region):
+        return set(region_tree.descendant_ids([region.id]))
+
+    def assertConsistent(self):
+        self.assertEqual(region_tree.check(), (set(), set()))
+
+    def test_reparent_moves_the_subtree(self):
+        self.istanbul.parent = self.ankara
+        self.istanbul.save()
+
+        self.assertEqual(self.descendants(self.turkey), {self.turkey.id})
+        self.assertEqual(self.descendants(self.ankara), {self.ankara.id, self.istanbul.id, self.kadikoy.id})
+        self.assertConsistent()
+
+    def test_cannot_move_under_own_subtree(self):
+        self.turkey.parent = self.kadikoy
+        with self.assertRaises(ValidationError):
+            self.turkey.save()
+        self.assertConsistent()
+
+    def test_deleted_region_detaches_children(self):
+        self.istanbul.delete()
+
+        self.assertEqual(self.descendants(self.turkey), {self.turkey.id})
+        self.assertEqual(self.descendants(self.kadikoy), {self.kadikoy.id})
+        self.assertConsistent()
+
+    def test_region_filter_follows_the_move(self):
+        post = SalePost.objects.create(
+            post_id=600000, post_status=PublishStatus.PUBLISHED, seller=get_user_model().objects.create(username="seller"),
+            category=Category.objects.create(name="strollers"), region=self.kadikoy, post_title="Stroller",
+            description="", product_price=Decimal("10"),
+        )
+
+        def post_ids(region):
+            cache.clear()
+            response = self.client.get("/api/salepost/", {"region_ids": region.id})
+            self.assertEqual(response.status_code, 200, response.content)
+            return [item["post_id"] for item in response.json()["results"]]
+
+        self.assertEqual(post_ids(self.turkey), [post.post_id])
+        self.istanbul.parent = self.ankara
+        self.istanbul.save()
+        self.assertEqual(post_ids(self.turkey), [])
+        self.assertEqual(post_ids(self.ankara), [post.post_id])
+
+
+class RegionCentroidTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.istanbul = Region.objects.create(name="istanbul", latitude="41.0", longitude="29.0")
+        cls.seller = get_user_model().objects.create(username="seller")
+        cls.category = Category.objects.create(name="strollers")
+        cls.centroid_post = cls.create_post(600001, cls.istanbul)
+        cls.half_placed_post = cls.create_post(600002, cls.istanbul, latitude=40.5)
+        cls.placed_post = cls.create_post(600003, cls.istanbul, latitude=40.9, longitude=28.8)
+
+    @classmethod
+    def create_post(cls, post_id, region, **coordinates):
+        return SalePost.objects.create(
+            post_id=post_id, post_status=PublishStatus.PUBLISHED, seller=cls.seller, category=cls.category,
+            region=region, post_title="Stroller", description="", product_price=Decimal("10"), **coordinates,
+        )
+
+    def location(self, post):
+        post.refresh_from_db()
+        return post.effective_lat, post.effective_lon, post.geo_cell
+
+    def move(self, region, latitude, longitude):
+        region.latitude, region.longitude = latitude, longitude
+        region.save()
+
+    def test_moved_centroid_moves_posts_without_coordinates(self):
+        self.assertEqual(self.location(self.centroid_post), (41.0, 29.0, grid_cell(41.0, 29.0)))
+        self.move(self.istanbul, "41.05", "28.95")
+
+        moved = (41.05, 28.95, grid_cell(41.05, 28.95))
+        self.assertNotEqual(moved[2], grid_cell(41.0, 29.0))
+        self.assertEqual(self.location(self.centroid_post), moved)
+        # a single coordinate is not a location, the centroid is used
+        self.assertEqual(self.location(self.half_placed_post), moved)
+        self.assertEqual(self.location(self.placed_post), (40.9, 28.8, grid_cell(40.9, 28.8)))
+
+    def test_cleared_and_added_centroid(self):
+        self.move(self.istanbul, None, None)
+        self.assertEqual(self.location(self.centroid_post), (None, None, None))
+        self.assertEqual(self.location(self.placed_post), (40.9, 28.8, grid_cell(40.9, 28.8)))
+
+        self.move(self.istanbul, "39.9", "32.85")
+        self.assertEqual(self.location(self.centroid_post), (39.9, 32.85, grid_cell(39.9, 32.85)))
+
+    def test_post_saved_into_a_region_without_centroid(self):
+        nowhere = Region.objects.create(name="nowhere")
+        post = self.create_post(600004, nowhere)
+        self.assertEqual(self.location(post), (None, None, None))
+        self.move(nowhere, "38.4", "27.1")
+        self.assertEqual(self.location(post), (38.4, 27.1, grid_cell(38.4, 27.1)))
+
+    def test_distance_list_follows_the_centroid(self):
+        def nearby():
+            cache.clear()
+            response = self.client.get("/api/salepost/", {"max_distance": 5, "user_latitude": 39.9, "user_longitude": 32.85})
+            self.assertEqual(response.status_code, 200, response.content)
+            return {item["post_id"] for item in response.json()["results"]}
+
+        self.assertEqual(nearby(), set())
+        self.move(self.istanbul, "39.9", "32.85")
+        self.assertEqual(nearby(), {self.centroid_post.post_id, self.half_placed_post.post_id})
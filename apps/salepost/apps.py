@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SalepostConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.salepost'
+
+    def ready(self):
+        from apps.salepost import signals  # noqa: F401
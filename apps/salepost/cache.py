@@ -0,0 +1,192 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.category.models import category_tree
+from apps.region.models import region_tree
+from apps.salepost.search import normalize_search_text
+from apps.salepost.queries import attribute_params
+from apps.salepost.pagination import capped_count
+
+
+# Ordered id lists of the list endpoint, keyed by the normalized filters. Entries remember the
+# versions of their invalidation scope: the requested categories (or regions), else every post
+# write. Writes bump the versions of the category and region of the post and their ancestors,
+# so unrelated writes keep the other entries. Versions live in the same cache, with several
+# workers it has to be a shared backend (otherwise entries go stale for at most the timeout).
+
+KEY_PREFIX = "salepost-list"
+FILTER_PARAMS = ("category_ids", "region_ids", "price_min", "price_max", "published_last_days", "keyword")
+
+
+def _timeout():
+    return getattr(settings, "SALEPOST_LIST_CACHE_TIMEOUT", 60)
+
+
+def _max_ids():
+    return getattr(settings, "SALEPOST_LIST_CACHE_MAX_IDS", 1000)
+
+
+def _parse_ids(raw):
+    return sorted({int(part.strip()) for part in (raw or "").split(",") if part.strip().isdigit()})
+
+
+def _version_key(scope, node_id=None):
+    return f"{KEY_PREFIX}:version:{scope}" if node_id is None else f"{KEY_PREFIX}:version:{scope}:{node_id}"
+
+
+class ListQuery:
+    """Normalized filters, ordering and location of a list request."""
+
+    def __init__(self, query_params, sort_by, order, location=None):
+        self.filters = {name: query_params.get(name) or None for name in FILTER_PARAMS}
+        self.filters["category_ids"] = _parse_ids(self.filters["category_ids"])
+        self.filters["region_ids"] = _parse_ids(self.filters["region_ids"])
+        if self.filters["keyword"]:
+            self.filters["keyword"] = normalize_search_text(self.filters["keyword"]).strip()
+        self.filters["attributes"] = attribute_params(query_params)
+        self.sort_by = sort_by
+        self.order = order
+        self.location = location  # (user_lat, user_lon, max_distance) in distance mode
+
+    @property
+    def key(self):
+        raw = json.dumps([self.filters, self.sort_by, self.order, self.location], sort_keys=True, default=str)
+        return f"{KEY_PREFIX}:ids:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    def version_keys(self):
+        # tree changes (reparenting, region centroids) affect every entry
+        keys = [_version_key("tree")]
+        if self.filters["category_ids"]:
+            keys += [_version_key("category", pk) for pk in self.filters["category_ids"]]
+        elif self.filters["region_ids"]:
+            keys += [_version_key("region", pk) for pk in self.filters["region_ids"]]
+        else:
+            keys.append(_version_key("posts"))
+        return keys
+
+
+class CachedOrdering:
+    """
+    The first ids (or (id, distance) pairs) of an ordering plus its length, sliceable like it.
+    Slices past the cached prefix are read from a freshly built ordering.
+    """
+
+    def __init__(self, items, length, build):
+        self.items = items
+        self.length = length
+        self.build = build
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        stop = index.stop if isinstance(index, slice) else index + 1
+        if stop is not None and stop <= len(self.items):
+            return self.items[index]
+        return self.build()[index]
+
+
+def _versions(query):
+    keys = query.version_keys()
+    stored = cache.get_many(keys)
+    return [stored.get(key, 0) for key in keys]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # missing key, start a new counter
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def _record(name):
+    try:
+        cache.incr(f"{KEY_PREFIX}:stats:{name}")
+    except ValueError:
+        cache.add(f"{KEY_PREFIX}:stats:{name}", 1, timeout=None)
+
+
+def cached_ordering(query, build):
+    """
+    Ordering for the query from the cache, or built with build() and cached.
+    build returns the ordered id queryset or NearbyPosts of the request.
+    """
+    timeout = _timeout()
+    if not timeout:
+        return build()
+
+    versions = _versions(query)
+    entry = cache.get(query.key)
+    if entry is not None and entry["versions"] == versions:
+        _record("hits")
+        return CachedOrdering(entry["items"], entry["count"], build)
+
+    _record("misses")
+    ordered = build()
+    max_ids = _max_ids()
+    items = list(ordered[:max_ids + 1])
+    if len(items) <= max_ids:
+        count = len(items)
+    else:
+        count = capped_count(ordered)
+    items = items[:max_ids]
+    cache.set(query.key, {"versions": versions, "items": items, "count": count}, timeout)
+    return CachedOrdering(items, count, lambda: ordered)
+
+
+def cached_result(query, name, build):
+    """Any other value derived from the filtered posts (e.g. facets), under the same invalidation."""
+    timeout = _timeout()
+    if not timeout:
+        return build()
+
+    key = f"{query.key}:{name}"
+    versions = _versions(query)
+    entry = cache.get(key)
+    if entry is not None and entry["versions"] == versions:
+        _record("hits")
+        return entry["value"]
+
+    _record("misses")
+    value = build()
+    cache.set(key, {"versions": versions, "value": value}, timeout)
+    return value
+
+
+def invalidate_saleposts(category_ids=(), region_ids=()):
+    """Bump the versions covering posts in these categories/regions, after the transaction commits."""
+    category_ids = [pk for pk in category_ids if pk is not None]
+    region_ids = [pk for pk in region_ids if pk is not None]
+
+    def bump():
+        _bump(_version_key("posts"))
+        for pk in set(category_tree.ancestor_ids(category_ids)) if category_ids else ():
+            _bump(_version_key("category", pk))
+        for pk in set(region_tree.ancestor_ids(region_ids)) if region_ids else ():
+            _bump(_version_key("region", pk))
+
+    transaction.on_commit(bump)
+
+
+def invalidate_all():
+    transaction.on_commit(lambda: _bump(_version_key("tree")))
+
+
+def cache_stats():
+    names = ["hits", "misses"]
+    values = cache.get_many([f"{KEY_PREFIX}:stats:{name}" for name in names])
+    hits, misses = (values.get(f"{KEY_PREFIX}:stats:{name}", 0) for name in names)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+        "timeout": _timeout(),
+        "max_ids": _max_ids(),
+    }
@@ -0,0 +1,205 @@
+import threading
+import time
+
+import numpy as np
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from apps.category.models import category_tree
+from apps.region.models import region_tree
+from apps.salepost.models import SalePost, SalePostChange, PublishStatus
+from apps.salepost.queries import NearbyPosts, attribute_params, _parse_id_list, _sort_key
+
+from core.geo import haversine_vectorized, bounding_box
+
+
+# column name -> (SalePost field, dtype, missing value)
+COLUMNS = {
+    "ids": ("id", np.int64, None),
+    "price": ("product_price", np.float64, np.nan),
+    "posted_at": ("posted_at", np.float64, np.nan),
+    "lat": ("effective_lat", np.float64, np.nan),
+    "lon": ("effective_lon", np.float64, np.nan),
+    "category": ("category_id", np.int32, -1),
+    "region": ("region_id", np.int32, -1),
+    "min_usage": ("min_usage_id", np.int32, -1),
+    "max_usage": ("max_usage_id", np.int32, -1),
+}
+SORT_COLUMNS = {"price": "price", "published_at": "posted_at"}
+
+
+def catalog_enabled():
+    return getattr(settings, "SALEPOST_CATALOG_ENABLED", False)
+
+
+def _refresh_seconds():
+    return getattr(settings, "SALEPOST_CATALOG_REFRESH_SECONDS", 2)
+
+
+def _replay_seconds():
+    return getattr(settings, "SALEPOST_CATALOG_REPLAY_SECONDS", 30)
+
+
+def _value(value, missing):
+    if value is None:
+        return missing
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return value
+
+
+class CatalogPosts(NearbyPosts):
+    # catalog ordering outside distance mode, slices to plain ids like ordered_salepost_ids
+
+    def __getitem__(self, index):
+        selected = super().__getitem__(index)
+        if isinstance(index, slice):
+            return [pk for pk, _ in selected]
+        return selected[0]
+
+
+class SalePostCatalog:
+    """
+    Columnar snapshot of the published saleposts, one numpy array per column, sorted by id.
+    56 bytes per post (5.6 MB per 100k posts) plus the per-request masks and distances.
+    refresh() replays the posts named by the SalePostChange rows written since the last
+    refresh, at most every SALEPOST_CATALOG_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.last_change_id = 0
+        self.replay_from = None
+        self.refreshed = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        return 0 if self.columns is None else len(self.columns["ids"])
+
+    @property
+    def nbytes(self):
+        return 0 if self.columns is None else sum(column.nbytes for column in self.columns.values())
+
+    def _load(self, post_ids=None):
+        posts = SalePost.objects.filter(post_status=PublishStatus.PUBLISHED)
+        if post_ids is not None:
+            posts = posts.filter(id__in=post_ids)
+        rows = list(posts.order_by("id").values_list(*(field for field, _, _ in COLUMNS.values())))
+        return {
+            name: np.fromiter((_value(row[i], missing) for row in rows), dtype=dtype, count=len(rows))
+            for i, (name, (_, dtype, missing)) in enumerate(COLUMNS.items())
+        }
+
+    def refresh(self):
+        if self.columns is not None and time.monotonic() - self.refreshed < _refresh_seconds():
+            return
+        with self.lock:
+            started = timezone.now()
+            markers = SalePostChange.objects.aggregate(first=Min("id"), last=Max("id"))
+            last = markers["last"] or 0
+
+            # first load, or change rows were pruned before this process read them
+            if self.columns is None or (markers["first"] or 0) > self.last_change_id + 1:
+                self.columns = self._load()
+            else:
+                # change ids are assigned before commit, so rows of transactions that committed late
+                # can land below last_change_id: the recent ones are replayed again
+                changed = list(
+                    SalePostChange.objects.filter(
+                        Q(id__gt=self.last_change_id)
+                        | Q(changed_at__gte=self.replay_from - timezone.timedelta(seconds=_replay_seconds()))
+                    ).values_list("salepost_id", flat=True).distinct()
+                )
+                if changed:
+                    self._merge(changed)
+
+            self.last_change_id = max(self.last_change_id, last)
+            self.replay_from = started
+            self.refreshed = time.monotonic()
+
+    def _merge(self, changed):
+        fresh = self._load(changed)
+        keep = ~np.isin(self.columns["ids"], np.asarray(changed, dtype=np.int64))
+        merged = {name: np.concatenate((column[keep], fresh[name])) for name, column in self.columns.items()}
+        order = np.argsort(merged["ids"], kind="stable")
+        self.columns = {name: column[order] for name, column in merged.items()}
+
+    @staticmethod
+    def supports(query_params):
+        # keyword search and attribute filters stay in the database
+        return not query_params.get("keyword") and not attribute_params(query_params)
+
+    def _mask(self, query_params):
+        columns = self.columns
+        mask = np.ones(len(columns["ids"]), dtype=bool)
+
+        category_ids = query_params.get("category_ids")
+        if category_ids:
+            ids = category_tree.descendant_ids(_parse_id_list(category_ids))
+            mask &= np.isin(columns["category"], np.asarray(ids, dtype=np.int64))
+
+        region_ids = query_params.get("region_ids")
+        if region_ids:
+            ids = region_tree.descendant_ids(_parse_id_list(region_ids))
+            mask &= np.isin(columns["region"], np.asarray(ids, dtype=np.int64))
+
+        # NaN (missing) never compares true, same as NULL in SQL
+        price_min = query_params.get("price_min")
+        if price_min:
+            mask &= columns["price"] >= int(price_min)
+
+        price_max = query_params.get("price_max")
+        if price_max:
+            mask &= columns["price"] <= int(price_max)
+
+        published_last_days = query_params.get("published_last_days")
+        if published_last_days:
+            cutoff = timezone.now() - timezone.timedelta(days=int(published_last_days))
+            mask &= columns["posted_at"] >= _sort_key(cutoff)
+
+        return mask
+
+    def ordering(self, query_params, sort_by, order, location=None):
+        """
+        Same ordering as ordered_salepost_ids (location None) or nearby_saleposts
+        (location = (user_lat, user_lon, max_distance)), computed on the snapshot.
+        """
+        columns = self.columns
+        mask = self._mask(query_params)
+        reverse = order == "desc"
+
+        if location is None:
+            selected = np.flatnonzero(mask)
+            keys = np.nan_to_num(columns[SORT_COLUMNS[sort_by]][selected], nan=-np.inf)
+            return CatalogPosts(columns["ids"][selected], np.zeros(len(selected)), keys, reverse=reverse)
+
+        user_lat, user_lon, max_distance = location
+        mask &= ~np.isnan(columns["lat"]) & ~np.isnan(columns["lon"])
+        if max_distance:
+            min_lat, max_lat, min_lon, max_lon = bounding_box(user_lat, user_lon, max_distance)
+            mask &= (columns["lat"] >= min_lat) & (columns["lat"] <= max_lat)
+            mask &= (columns["lon"] >= min_lon) & (columns["lon"] <= max_lon)
+        selected = np.flatnonzero(mask)
+        distances = haversine_vectorized(user_lat, user_lon, columns["lat"][selected], columns["lon"][selected])
+        if max_distance:
+            keep = distances <= max_distance
+            selected, distances = selected[keep], distances[keep]
+
+        sort_keys = None
+        if sort_by != "distance":
+            sort_keys = np.nan_to_num(columns[SORT_COLUMNS[sort_by]][selected], nan=-np.inf)
+        return NearbyPosts(columns["ids"][selected], distances, sort_keys=sort_keys, reverse=reverse)
+
+
+_catalog = SalePostCatalog()
+
+
+def get_catalog():
+    """The refreshed per-process catalog, None when disabled."""
+    if not catalog_enabled():
+        return None
+    _catalog.refresh()
+    return _catalog
@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from apps.salepost.models import SalePostChange, SalePostIndexState
+
+
+# markers this recent are read again, their transactions may have committed after the last run
+REPLAY_SECONDS = 30
+
+_pruned_at = time.monotonic()
+
+
+def _retention_hours():
+    return getattr(settings, "SALEPOST_CHANGE_RETENTION_HOURS", 24)
+
+
+def _prune_interval():
+    return getattr(settings, "SALEPOST_CHANGE_PRUNE_SECONDS", 3600)
+
+
+def prune_changes(hours=None):
+    """Delete the markers older than hours, jobs that had not read them yet rebuild fully. Returns the count."""
+    hours = _retention_hours() if hours is None else hours
+    cutoff = timezone.now() - timezone.timedelta(hours=hours)
+    deleted, _ = SalePostChange.objects.filter(changed_at__lt=cutoff).delete()
+    return deleted
+
+
+def record_salepost_changes(post_ids):
+    """
+    Marker rows for every post write, read by the catalog, the neighbour refresh and the text
+    vectors whatever their settings. Each process also prunes the expired markers once per
+    SALEPOST_CHANGE_PRUNE_SECONDS, after the writing transaction commits.
+    """
+    global _pruned_at
+    if not post_ids:
+        return
+    SalePostChange.objects.bulk_create([SalePostChange(salepost_id=pk) for pk in post_ids])
+    if time.monotonic() - _pruned_at >= _prune_interval():
+        _pruned_at = time.monotonic()
+        transaction.on_commit(prune_changes)
+
+
+class ChangeCheckpoint:
+    """
+    Progress of a batch job through the SalePostChange markers, stored in SalePostIndexState
+    under name. changed_ids() returns the posts to process, save() records the run once the
+    job has finished.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = None
+        self.started = None
+        self.last = 0
+
+    def changed_ids(self, full=False):
+        """Ids of the posts changed since the last run, None when everything has to be processed."""
+        self.state, _ = SalePostIndexState.objects.get_or_create(name=self.name)
+        self.started = timezone.now()
+        markers = SalePostChange.objects.aggregate(first=Min("id"), last=Max("id"))
+        self.last = markers["last"] or 0
+
+        # first run, or markers this job had not read were pruned
+        if full or self.state.replay_from is None or (markers["first"] or 0) > self.state.last_change_id + 1:
+            return None
+        return set(SalePostChange.objects.filter(
+            Q(id__gt=self.state.last_change_id)
+            | Q(changed_at__gte=self.state.replay_from - timezone.timedelta(seconds=REPLAY_SECONDS))
+        ).values_list("salepost_id", flat=True))
+
+    def save(self):
+        self.state.last_change_id = max(self.state.last_change_id, self.last)
+        self.state.replay_from = self.started
+        self.state.save()
@@ -0,0 +1,200 @@
+import atexit
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.salepost.models import SalePost, SalePostViewSketch
+
+from core.network import get_client_ip
+from core.sketches import HyperLogLog
+
+
+def _flush_seconds():
+    return getattr(settings, "SALEPOST_VIEW_FLUSH_SECONDS", 10)
+
+
+def _max_pending():
+    return getattr(settings, "SALEPOST_VIEW_MAX_PENDING", 1000)
+
+
+class ViewCounter:
+    """
+    Per-process buffer of salepost views, written at most every SALEPOST_VIEW_FLUSH_SECONDS
+    (or once SALEPOST_VIEW_MAX_PENDING views are waiting) in one transaction with one
+    `viewed = viewed + n` UPDATE per distinct n. A flush takes the pending counts out of the
+    buffer before writing and puts them back if the transaction fails, so a view is counted
+    exactly once. A background thread per process flushes every interval, so views of idle
+    workers are written too, and pending views are flushed when the worker exits; a killed
+    worker loses at most one interval of views.
+    Viewers go into a HyperLogLog per post that the flush merges into SalePostViewSketch, merging
+    is idempotent so a retried flush cannot count a viewer twice either.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.pending = Counter()
+        self.viewers = {}
+        self.flushed = time.monotonic()
+
+    def _reset_after_fork(self):
+        # views buffered before a fork belong to the parent, which flushes them itself
+        if self.pid != os.getpid():
+            self.pid, self.pending, self.viewers, self.flushed = os.getpid(), Counter(), {}, time.monotonic()
+            # threads do not survive a fork, every process starts its own flusher
+            threading.Thread(target=self._flush_periodically, name="salepost-view-flush", daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(_flush_seconds())
+            try:
+                if time.monotonic() - self.flushed >= _flush_seconds():
+                    self.flush()
+            except Exception:
+                # the views were put back, the next round retries
+                pass
+            finally:
+                connections.close_all()
+
+    def add(self, post_id, viewer=None):
+        with self.lock:
+            self._reset_after_fork()
+            self.pending[post_id] += 1
+            if viewer is not None:
+                self.viewers.setdefault(post_id, HyperLogLog()).add(viewer)
+            due = (
+                sum(self.pending.values()) >= _max_pending()
+                or time.monotonic() - self.flushed >= _flush_seconds()
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self._reset_after_fork()
+            pending, self.pending = self.pending, Counter()
+            viewers, self.viewers = self.viewers, {}
+            self.flushed = time.monotonic()
+        if not pending:
+            return 0
+
+        by_increment = defaultdict(list)
+        for post_id, views in pending.items():
+            by_increment[views].append(post_id)
+        try:
+            with transaction.atomic():
+                for views, post_ids in by_increment.items():
+                    SalePost.objects.filter(id__in=post_ids).update(viewed=F("viewed") + views)
+                _merge_sketches(viewers)
+        except Exception:
+            with self.lock:
+                self.pending.update(pending)
+                for post_id, sketch in viewers.items():
+                    self.viewers.setdefault(post_id, HyperLogLog()).merge(sketch)
+            raise
+        return sum(pending.values())
+
+    def pending_views(self, post_ids):
+        with self.lock:
+            self._reset_after_fork()
+            return {pk: self.pending[pk] for pk in post_ids if pk in self.pending}
+
+    def pending_viewers(self, post_ids):
+        with self.lock:
+            self._reset_after_fork()
+            return {pk: HyperLogLog().merge(self.viewers[pk]) for pk in post_ids if pk in self.viewers}
+
+
+def _merge_sketches(viewers):
+    stored = {
+        row.salepost_id: row
+        for row in SalePostViewSketch.objects.select_for_update().filter(salepost_id__in=list(viewers))
+    }
+    changed, created = [], []
+    now = timezone.now()
+    for post_id, sketch in viewers.items():
+        row = stored.get(post_id)
+        if row is None:
+            created.append(SalePostViewSketch(salepost_id=post_id, sketch=sketch.to_bytes()))
+        else:
+            row.sketch = HyperLogLog.from_bytes(row.sketch).merge(sketch).to_bytes()
+            # bulk_update skips auto_now
+            row.updated_at = now
+            changed.append(row)
+    SalePostViewSketch.objects.bulk_update(changed, ["sketch", "updated_at"])
+    # posts deleted since the view are skipped
+    existing = set(SalePost.objects.filter(id__in=[row.salepost_id for row in created]).values_list("id", flat=True))
+    SalePostViewSketch.objects.bulk_create([row for row in created if row.salepost_id in existing])
+
+
+def viewer_sketches(post_ids):
+    """Stored viewer sketches of the posts merged with the views still buffered in this process."""
+    sketches = {
+        salepost_id: HyperLogLog.from_bytes(sketch)
+        for salepost_id, sketch in SalePostViewSketch.objects.filter(salepost_id__in=post_ids).values_list("salepost_id", "sketch")
+    }
+    for post_id, sketch in view_counter.pending_viewers(post_ids).items():
+        sketches.setdefault(post_id, HyperLogLog()).merge(sketch)
+    return sketches
+
+
+def pending_views(post_id):
+    """Views of the post recorded by this process and not written yet."""
+    return view_counter.pending_views([post_id]).get(post_id, 0)
+
+
+def unique_views(post_id):
+    sketch = viewer_sketches([post_id]).get(post_id)
+    return sketch.count() if sketch is not None else 0
+
+
+view_counter = ViewCounter()
+
+
+def viewer_key(request):
+    if request.user and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{get_client_ip(request)}"
+
+
+def record_view(post_id, request=None):
+    view_counter.add(post_id, viewer_key(request) if request is not None else None)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        pass
+
+
+def seller_view_stats(seller):
+    """Views and unique viewers per post of the seller, the total unique viewers is the union of the posts."""
+    posts = list(SalePost.objects.filter(seller=seller).order_by("-posted_at", "-id").values("id", "post_id", "post_title", "post_status", "viewed"))
+    sketches = viewer_sketches([post["id"] for post in posts])
+    pending = Counter(view_counter.pending_views([post["id"] for post in posts]))
+    union = HyperLogLog()
+    for sketch in sketches.values():
+        union.merge(sketch)
+    return {
+        "posts": len(posts),
+        "views": sum(post["viewed"] + pending[post["id"]] for post in posts),
+        "unique_views": union.count(),
+        "saleposts": [
+            {
+                "post_id": post["post_id"],
+                "post_title": post["post_title"],
+                "post_status": post["post_status"],
+                "viewed": post["viewed"] + pending[post["id"]],
+                "unique_views": sketches[post["id"]].count() if post["id"] in sketches else 0,
+            }
+            for post in posts
+        ],
+    }
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+from django.conf import settings
+from django.db.models import Q
+
+from apps.salepost.models import Image
+
+from core.images import HASH_SIZE, content_hash, dhash
+from core.storage import get_image_storage
+
+
+# Duplicate detection for uploaded images. Byte identical uploads are found by content_hash and
+# reuse the stored file. Near duplicates (re-encoded, resized, cropped a little) are found by the
+# Hamming distance of the dHash with multi-index hashing: the 64 bit hash is split into BANDS
+# indexed bands, two hashes within distance d agree within d // BANDS bits on at least one band,
+# so candidates come from a few band IN lookups and only they are compared bit by bit.
+
+BANDS = 4
+BAND_BITS = HASH_SIZE * HASH_SIZE // BANDS
+BAND_FIELDS = [f"hash_band_{band}" for band in range(BANDS)]
+# radius 2 per band, larger distances would enumerate thousands of band values
+MAX_DISTANCE_LIMIT = 3 * BANDS - 1
+
+
+def max_distance():
+    return getattr(settings, "IMAGE_NEAR_DUPLICATE_DISTANCE", 6)
+
+
+def _signed(value):
+    # BigIntegerField is signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def hash_bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (band * BAND_BITS)) & mask for band in range(BANDS)]
+
+
+def hamming(a, b):
+    return bin(_unsigned(a) ^ _unsigned(b)).count("1")
+
+
+def fingerprint(data):
+    """Image hash fields for the file bytes, perceptual ones stay empty when Pillow cannot read it."""
+    fields = {"content_hash": content_hash(data), "perceptual_hash": None}
+    fields.update(dict.fromkeys(BAND_FIELDS))
+    try:
+        value = dhash(data)
+    except OSError:
+        return fields
+    fields["perceptual_hash"] = _signed(value)
+    fields.update(zip(BAND_FIELDS, hash_bands(value)))
+    return fields
+
+
+def _band_variants(value, radius):
+    variants = [value]
+    for flipped in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), flipped):
+            variant = value
+            for bit in bits:
+                variant ^= 1 << bit
+            variants.append(variant)
+    return variants
+
+
+def existing_images(content_hashes):
+    """{content_hash: oldest Image with that hash} for the given hashes."""
+    found = {}
+    for image in Image.objects.filter(content_hash__in=set(content_hashes) - {""}).order_by("id"):
+        found.setdefault(image.content_hash, image)
+    return found
+
+
+def near_duplicate_images(perceptual_hash, distance=None, images=None):
+    """
+    [(image, distance)] of the images whose dHash is within distance bits of perceptual_hash
+    (the stored, signed value), closest first. images narrows the searched queryset.
+    """
+    distance = max_distance() if distance is None else distance
+    if perceptual_hash is None:
+        return []
+    distance = min(distance, MAX_DISTANCE_LIMIT)
+    radius = distance // BANDS
+    lookup = Q()
+    for field, band in zip(BAND_FIELDS, hash_bands(_unsigned(perceptual_hash))):
+        lookup |= Q(**{f"{field}__in": _band_variants(band, radius)})
+
+    images = Image.objects.all() if images is None else images
+    matches = []
+    for image in images.filter(lookup).select_related("related_post__seller"):
+        image_distance = hamming(perceptual_hash, image.perceptual_hash)
+        if image_distance <= distance:
+            matches.append((image, image_distance))
+    matches.sort(key=lambda match: (match[1], match[0].id))
+    return matches
+
+
+def salepost_near_duplicates(salepost, distance=None):
+    """[(image, [(other image, distance)])] for every image of the post, matches in other posts only."""
+    others = Image.objects.exclude(related_post=salepost)
+    return [
+        (image, near_duplicate_images(image.perceptual_hash, distance, others))
+        for image in salepost.image_set.order_by("position", "id")
+    ]
+
+
+def _fetch_fingerprint(storage, image):
+    try:
+        return fingerprint(storage.read(image.img))
+    except OSError:
+        return None
+
+
+def index_image_hashes(batch_size=200, workers=None):
+    """
+    Hash the images stored before hashing was added, downloading batch_size files at a time on
+    worker threads. Returns (hashed, failed), failed images keep an empty hash and are retried
+    on the next run.
+    """
+    storage = get_image_storage()
+    workers = workers or getattr(settings, "IMAGE_UPLOAD_WORKERS", 4)
+    pending = Image.objects.filter(content_hash="", img__isnull=False).order_by("id")
+    hashed = failed = 0
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return hashed, failed
+        last_id = batch[-1].id
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda image: _fetch_fingerprint(storage, image), batch))
+        updated = []
+        for image, fields in zip(batch, results):
+            if fields is None:
+                failed += 1
+                continue
+            for name, value in fields.items():
+                setattr(image, name, value)
+            updated.append(image)
+        Image.objects.bulk_update(updated, ["content_hash", "perceptual_hash", *BAND_FIELDS])
+        hashed += len(updated)
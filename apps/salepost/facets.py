@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db.models import Count, Q
+
+from apps.category.models import Category, UsageRange, AttributeChoice, DataType
+from apps.region.models import Region
+from apps.salepost.models import SalePostAttribute
+
+
+DEFAULT_PRICE_BUCKETS = [0, 100, 250, 500, 1000, 2500, 5000]
+
+
+def _price_buckets():
+    # bucket lower bounds, the last bucket is open ended
+    return getattr(settings, "SALEPOST_FACET_PRICE_BUCKETS", DEFAULT_PRICE_BUCKETS)
+
+
+def _grouped(posts, field):
+    return {
+        row[field]: row["count"]
+        for row in posts.order_by().values(field).annotate(count=Count("id"))
+        if row[field] is not None
+    }
+
+
+def _named(counts, model):
+    names = model.objects.in_bulk(list(counts))
+    facet = [
+        {"id": pk, "name": names[pk].name, "count": count}
+        for pk, count in counts.items() if pk in names
+    ]
+    return sorted(facet, key=lambda item: (-item["count"], item["id"]))
+
+
+def _usage_range_facet(posts):
+    # a post counts for every usage range between its min and max usage, open ends included
+    pairs = list(posts.order_by().values("min_usage__unique_id", "max_usage__unique_id").annotate(count=Count("id")))
+    facet = []
+    for usage_range in UsageRange.objects.order_by("unique_id"):
+        count = sum(
+            row["count"] for row in pairs
+            if (row["min_usage__unique_id"] is not None or row["max_usage__unique_id"] is not None)
+            and (row["min_usage__unique_id"] is None or row["min_usage__unique_id"] <= usage_range.unique_id)
+            and (row["max_usage__unique_id"] is None or usage_range.unique_id <= row["max_usage__unique_id"])
+        )
+        facet.append({"id": usage_range.id, "name": usage_range.name, "count": count})
+    return facet
+
+
+def _price_facet(posts):
+    bounds = _price_buckets()
+    buckets = []
+    for i, low in enumerate(bounds):
+        high = bounds[i + 1] if i + 1 < len(bounds) else None
+        condition = Q(product_price__gte=low)
+        if high is not None:
+            condition &= Q(product_price__lt=high)
+        buckets.append((low, high, condition))
+
+    # the total and every bucket in a single aggregate query
+    counts = posts.order_by().aggregate(total=Count("id"), **{
+        f"bucket_{i}": Count("id", filter=condition) for i, (_, _, condition) in enumerate(buckets)
+    })
+    return counts["total"], [
+        {"min": low, "max": high, "count": counts[f"bucket_{i}"]}
+        for i, (low, high, _) in enumerate(buckets)
+    ]
+
+
+def _attribute_facet(posts):
+    rows = (
+        SalePostAttribute.objects
+        .filter(salepost__in=posts.order_by().values("id"), attribute__data_type__in=[DataType.CHOICE, DataType.SWITCH])
+        .values("attribute__unique_name", "value")
+        .annotate(count=Count("salepost", distinct=True))
+    )
+    rows = list(rows)
+    choices = AttributeChoice.objects.in_bulk([int(row["value"]) for row in rows if row["value"].isdigit()])
+
+    facet = {}
+    for row in rows:
+        choice = choices.get(int(row["value"])) if row["value"].isdigit() else None
+        if choice is None:
+            continue
+        facet.setdefault(row["attribute__unique_name"], []).append(
+            {"id": choice.id, "value": choice.value, "count": row["count"]}
+        )
+    return [
+        {"attribute": unique_name, "values": sorted(values, key=lambda item: (-item["count"], item["id"]))}
+        for unique_name, values in sorted(facet.items())
+    ]
+
+
+def salepost_facets(posts):
+    """
+    Counts per category, region, usage range, price bucket and choice attribute value for the
+    filtered posts, one grouped aggregate query per facet instead of a COUNT per facet value.
+    """
+    total, price_buckets = _price_facet(posts)
+    return {
+        "total": total,
+        "categories": _named(_grouped(posts, "category_id"), Category),
+        "regions": _named(_grouped(posts, "region_id"), Region),
+        "usage_ranges": _usage_range_facet(posts),
+        "price_buckets": price_buckets,
+        "attributes": _attribute_facet(posts),
+    }
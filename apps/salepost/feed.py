@@ -0,0 +1,178 @@
+from django.db import transaction
+from django.db.models import F
+
+from apps.category.models import AttributeChoice, UsageRange
+from apps.salepost.models import SalePost, SalePostAttribute, HomeFeedSegment, PublishStatus
+
+
+GENDER_ATTRIBUTE = "gender"
+PAGE_SIZE = 16
+# entries kept per segment, the extra ones refill the page when posts leave it
+CAPACITY = 64
+# sort key of posts without posted_at, they come last like with nulls_last
+MISSING_POSTED_AT = -1e18
+
+
+def _timestamp(posted_at):
+    return posted_at.timestamp() if posted_at is not None else MISSING_POSTED_AT
+
+
+def _sort(entries):
+    # newest first like the segment query, the id keeps equal timestamps deterministic
+    entries.sort(key=tuple, reverse=True)
+
+
+def segment_key(gender, min_usage, max_usage):
+    return f"{gender or ''}|{'' if min_usage is None else min_usage}|{'' if max_usage is None else max_usage}"
+
+
+def resolve_gender(gender):
+    """
+    Stored value (choice id) of a gender given as choice id or (case-insensitive) label.
+    Raises LookupError for values that are not a gender choice, they would each get a segment.
+    """
+    if not gender:
+        return ""
+    choices = AttributeChoice.objects.filter(attribute__unique_name=GENDER_ATTRIBUTE)
+    choices = choices.filter(id=int(gender)) if gender.isdigit() else choices.filter(value__iexact=gender)
+    choice_id = choices.values_list("id", flat=True).first()
+    if choice_id is None:
+        raise LookupError("unknown gender")
+    return str(choice_id)
+
+
+def resolve_usage_bounds(min_usage, max_usage):
+    """
+    Usage range unique_ids the bounds select: the smallest one >= min_usage and the largest
+    one <= max_usage, so every request maps to one of the (ranges + 1) ** 2 segments.
+    Raises LookupError when no usage range can match.
+    """
+    low = high = None
+    if min_usage is not None:
+        low = UsageRange.objects.filter(unique_id__gte=min_usage).order_by("unique_id").values_list("unique_id", flat=True).first()
+        if low is None:
+            raise LookupError("no usage range above min_usage")
+    if max_usage is not None:
+        high = UsageRange.objects.filter(unique_id__lte=max_usage).order_by("-unique_id").values_list("unique_id", flat=True).first()
+        if high is None:
+            raise LookupError("no usage range below max_usage")
+    if low is not None and high is not None and low > high:
+        raise LookupError("min_usage above max_usage")
+    return low, high
+
+
+def _segment_posts(segment):
+    posts = SalePost.objects.filter(post_status=PublishStatus.PUBLISHED)
+    if segment.gender:
+        posts = posts.filter(id__in=SalePostAttribute.objects.filter(
+            attribute__unique_name=GENDER_ATTRIBUTE, value=segment.gender
+        ).values("salepost_id"))
+    if segment.min_usage is not None:
+        posts = posts.filter(min_usage__unique_id__gte=segment.min_usage)
+    if segment.max_usage is not None:
+        posts = posts.filter(max_usage__unique_id__lte=segment.max_usage)
+    return posts
+
+
+def _fill(segment):
+    rows = _segment_posts(segment).order_by(
+        F("posted_at").desc(nulls_last=True), "-id"
+    ).values_list("posted_at", "id")[:CAPACITY + 1]
+    entries = [[_timestamp(posted_at), pk] for posted_at, pk in rows]
+    segment.complete = len(entries) <= CAPACITY
+    segment.entries = entries[:CAPACITY]
+
+
+def _matches(segment, post):
+    if post["post_status"] != PublishStatus.PUBLISHED:
+        return False
+    if segment.gender and segment.gender not in post["genders"]:
+        return False
+    if segment.min_usage is not None and (post["min_usage_unique_id"] is None or post["min_usage_unique_id"] < segment.min_usage):
+        return False
+    if segment.max_usage is not None and (post["max_usage_unique_id"] is None or post["max_usage_unique_id"] > segment.max_usage):
+        return False
+    return True
+
+
+def home_feed_ids(gender, min_usage, max_usage):
+    """Ids of the newest published posts of the segment, the segment is built on first use."""
+    key = segment_key(gender, min_usage, max_usage)
+    segment = HomeFeedSegment.objects.filter(key=key).first()
+    if segment is None:
+        segment = HomeFeedSegment(key=key, gender=gender or "", min_usage=min_usage, max_usage=max_usage)
+        _fill(segment)
+        # a concurrent request may have built it, keep theirs
+        segment, _ = HomeFeedSegment.objects.get_or_create(key=key, defaults={
+            "gender": segment.gender, "min_usage": min_usage, "max_usage": max_usage,
+            "entries": segment.entries, "complete": segment.complete,
+        })
+    return [pk for _, pk in segment.entries[:PAGE_SIZE]]
+
+
+def _added_entries(segment, posts):
+    added = [[_timestamp(post["posted_at"]), pk] for pk, post in posts.items() if _matches(segment, post)]
+    if not segment.complete and segment.entries:
+        # past the oldest stored entry there are posts that are not stored, the page there is unknown
+        oldest = tuple(segment.entries[-1])
+        added = [entry for entry in added if tuple(entry) > oldest]
+    return added
+
+
+def _affects(segment, post_ids, posts):
+    return any(entry[1] in post_ids for entry in segment.entries) or bool(_added_entries(segment, posts))
+
+
+def refresh_home_feed(post_ids):
+    """Move the posts into or out of every stored segment, after a status, date, usage or gender change."""
+    post_ids = set(post_ids)
+    posts = {
+        row["id"]: {**row, "genders": set()}
+        for row in SalePost.objects.filter(id__in=post_ids).values(
+            "id", "post_status", "posted_at", min_usage_unique_id=F("min_usage__unique_id"),
+            max_usage_unique_id=F("max_usage__unique_id"),
+        )
+    }
+    for salepost_id, value in SalePostAttribute.objects.filter(
+        salepost_id__in=post_ids, attribute__unique_name=GENDER_ATTRIBUTE
+    ).values_list("salepost_id", "value"):
+        posts[salepost_id]["genders"].add(value)
+
+    # most saves touch no segment, only the affected ones are locked and rewritten
+    affected = [segment.pk for segment in HomeFeedSegment.objects.all() if _affects(segment, post_ids, posts)]
+    if not affected:
+        return
+    with transaction.atomic():
+        changed = []
+        for segment in HomeFeedSegment.objects.select_for_update().filter(pk__in=affected):
+            entries = [entry for entry in segment.entries if entry[1] not in post_ids]
+            removed = len(entries) != len(segment.entries)
+            added = _added_entries(segment, posts)
+            if not removed and not added:
+                continue
+            entries += added
+            _sort(entries)
+            if len(entries) > CAPACITY:
+                entries, segment.complete = entries[:CAPACITY], False
+            segment.entries = entries
+            if not segment.complete and len(entries) < PAGE_SIZE:
+                # posts past the stored ones exist, read them again
+                _fill(segment)
+            changed.append(segment)
+        HomeFeedSegment.objects.bulk_update(changed, ["entries", "complete"])
+
+
+def schedule_home_feed_refresh(post_ids):
+    # after commit, when the attributes created with the post are visible too
+    post_ids = [pk for pk in post_ids if pk is not None]
+    if post_ids:
+        transaction.on_commit(lambda: refresh_home_feed(post_ids))
+
+
+def rebuild_home_feed():
+    """Fill every stored segment again from the posts, for changes made with bulk updates."""
+    segments = list(HomeFeedSegment.objects.all())
+    for segment in segments:
+        _fill(segment)
+    HomeFeedSegment.objects.bulk_update(segments, ["entries", "complete"])
+    return len(segments)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from apps.salepost.models import SalePost
+
+
+class Command(BaseCommand):
+    help = "Recompute SalePost.effective_lat/effective_lon and geo_cell from the post or region coordinates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        fields = ["effective_lat", "effective_lon", "geo_cell"]
+
+        posts = SalePost.objects.select_related("region").only(
+            "id", "latitude", "longitude", *fields, "region__latitude", "region__longitude",
+        ).order_by("id")
+
+        updated = 0
+        batch = []
+        for post in posts.iterator(chunk_size=batch_size):
+            current = (post.effective_lat, post.effective_lon, post.geo_cell)
+            post.refresh_effective_coordinates()
+            if (post.effective_lat, post.effective_lon, post.geo_cell) != current:
+                batch.append(post)
+            if len(batch) >= batch_size:
+                SalePost.objects.bulk_update(batch, fields)
+                updated += len(batch)
+                batch = []
+        if batch:
+            SalePost.objects.bulk_update(batch, fields)
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} salepost(s) updated."))
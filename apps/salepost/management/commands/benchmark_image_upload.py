@@ -0,0 +1,40 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.storage import LocalImageStorage, upload_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the image upload pipeline offline: serial uploads against the thread pool, "
+        "on the local storage stand-in with a simulated network latency per upload."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=10)
+        parser.add_argument("--size-kb", type=int, default=300)
+        parser.add_argument("--latency", type=float, default=0.3, help="Seconds per upload.")
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        content = os.urandom(options["size_kb"] * 1024)
+        files = [SimpleUploadedFile(f"image{i}.jpg", content, content_type="image/jpeg") for i in range(options["images"])]
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            storage = LocalImageStorage(latency=options["latency"])
+            for label, workers in (("serial", 1), (f"{options['workers']} workers", options["workers"])):
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    upload_files(files, storage, workers=workers)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"{label:>12}: {statistics.median(timings) * 1000:8.1f} ms median for {len(files)} images"
+                )
@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from rest_framework.test import APIRequestFactory
+
+from apps.category.models import Category
+from apps.region.models import Region
+from apps.salepost.models import SalePost, PublishStatus
+from apps.salepost.search import get_search_backend
+from apps.salepost.catalog import get_catalog
+from apps.salepost.changes import record_salepost_changes
+from apps.salepost.views import SalePostViewSet
+
+User = get_user_model()
+
+# a few list requests that cover the SQL and the distance paths
+SCENARIOS = {
+    "published_at first page": {"sort_by": "published_at", "order": "desc"},
+    "published_at page 50": {"sort_by": "published_at", "order": "desc", "page": 50},
+    "price first page": {"sort_by": "price", "order": "asc"},
+    "distance 10 km": {"sort_by": "distance", "max_distance": 10, "user_latitude": 41.0082, "user_longitude": 28.9784},
+    "keyword": {"keyword": "Ürün 4242"},
+    "price band, newest": {"price_min": 2000, "price_max": 2100, "sort_by": "published_at", "order": "desc"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure salepost list latency while the published catalog grows. "
+        "Synthetic posts are inserted inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--catalog", action="store_true", help="Serve the requests from the in-memory catalog.")
+
+    def handle(self, *args, **options):
+        # the list result cache would turn every repeat into a hit, measure the query paths
+        with override_settings(SALEPOST_LIST_CACHE_TIMEOUT=0, SALEPOST_CATALOG_ENABLED=options["catalog"]):
+            with transaction.atomic():
+                self.run(sorted(options["sizes"]), options["repeat"], options["batch_size"])
+                transaction.set_rollback(True)
+
+    def run(self, sizes, repeat, batch_size):
+        seller = User.objects.create(username=f"benchmark-{time.time_ns()}")
+        category = Category.objects.create(name=f"benchmark-{time.time_ns()}")
+        region = Region.objects.create(name="benchmark", latitude="39.0", longitude="35.0")
+
+        view = SalePostViewSet.as_view({"get": "list"})
+        factory = APIRequestFactory()
+        rng = random.Random(42)
+        now = timezone.now()
+        next_post_id = SalePost.objects.count() + 1
+        search_backend = get_search_backend()
+
+        self.stdout.write(f"{'posts':>10}  " + "  ".join(f"{name:>24}" for name in SCENARIOS))
+        created = 0
+        for size in sizes:
+            while created < size:
+                count = min(batch_size, size - created)
+                posts = [
+                    SalePost(
+                        post_id=next_post_id + i,
+                        post_status=PublishStatus.PUBLISHED,
+                        seller=seller,
+                        category=category,
+                        region=region,
+                        post_title=f"ürün {rng.randint(0, 1_000_000)}",
+                        description="benchmark",
+                        product_price=Decimal(rng.randint(1, 10_000)),
+                        posted_at=now - timezone.timedelta(minutes=rng.randint(0, 525_600)),
+                        # spread over Turkey's bounding box
+                        latitude=rng.uniform(36.0, 42.0),
+                        longitude=rng.uniform(26.0, 45.0),
+                    )
+                    for i in range(count)
+                ]
+                # bulk_create skips save(), which fills the effective coordinates and grid cell
+                for post in posts:
+                    post.refresh_effective_coordinates()
+                batch = SalePost.objects.bulk_create(posts, batch_size=batch_size)
+                # bulk_create skips the post_save receivers that maintain the keyword index and change markers
+                search_backend.index(batch)
+                record_salepost_changes([post.pk for post in batch])
+                next_post_id += count
+                created += count
+
+            # planner statistics, as a maintained database would have them
+            if connection.vendor == "sqlite":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+
+            timings = []
+            matches = []
+            for params in SCENARIOS.values():
+                samples = []
+                for _ in range(repeat):
+                    request = factory.get("/api/salepost/", params)
+                    started = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings.append(statistics.median(samples))
+                # an empty result would time nothing, print the match counts next to the timings
+                matches.append(response.data.get("count", "-") if isinstance(response.data, dict) else len(response.data))
+
+            self.stdout.write(f"{size:>10}  " + "  ".join(f"{ms:>21.1f} ms" for ms in timings))
+            self.stdout.write(f"{'matches':>10}  " + "  ".join(f"{count:>24}" for count in matches))
+            catalog = get_catalog()
+            if catalog is not None:
+                self.stdout.write(f"{'':>10}  catalog: {catalog.size} posts, {catalog.nbytes / 1024 / 1024:.1f} MB")
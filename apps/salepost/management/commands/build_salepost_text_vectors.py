@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.salepost.text_vectors import build_text_vectors
+
+
+class Command(BaseCommand):
+    help = "Vectorize the title and description of the saleposts changed since the last run (all of them with --full)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Vectorize every published post, e.g. after changing the dimensions.")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the CPU count.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        mode, count = build_text_vectors(full=options["full"], workers=options["workers"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{mode} build: {count} post(s) vectorized."))
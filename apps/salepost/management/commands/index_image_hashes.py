@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.salepost.duplicates import index_image_hashes
+
+
+class Command(BaseCommand):
+    help = "Compute the content and perceptual hashes of stored images that have none yet (uploaded before hashing)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=None, help="Download threads, defaults to IMAGE_UPLOAD_WORKERS.")
+
+    def handle(self, *args, **options):
+        hashed, failed = index_image_hashes(batch_size=options["batch_size"], workers=options["workers"])
+        self.stdout.write(self.style.SUCCESS(f"{hashed} image(s) hashed, {failed} could not be read."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.salepost.changes import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete SalePostChange markers older than --hours (jobs that fell behind rebuild fully)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=None, help="Defaults to SALEPOST_CHANGE_RETENTION_HOURS.")
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options["hours"])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} change marker(s) deleted."))
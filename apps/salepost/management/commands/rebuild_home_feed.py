@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.salepost.feed import rebuild_home_feed
+
+
+class Command(BaseCommand):
+    help = "Refill the stored home feed segments from the posts (after bulk updates that skip the signals)."
+
+    def handle(self, *args, **options):
+        count = rebuild_home_feed()
+        self.stdout.write(self.style.SUCCESS(f"{count} home feed segment(s) rebuilt."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.salepost.models import SalePost
+from apps.salepost.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the salepost keyword search index from the post table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild(SalePost.objects.order_by("id"), batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt with {type(backend).__name__}."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.salepost.similar import run_neighbour_refresh
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored similar posts of the saleposts changed since the last run (all of them with --full)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Rebuild the neighbours of every published post.")
+
+    def handle(self, *args, **options):
+        mode, count = run_neighbour_refresh(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"{mode} refresh: neighbours of {count} post(s) recomputed."))
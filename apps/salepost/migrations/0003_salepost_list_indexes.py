@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0002_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salepost',
+            index=models.Index(fields=['post_status', 'posted_at', 'id'], name='salepost_status_posted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salepost',
+            index=models.Index(fields=['post_status', 'product_price', 'id'], name='salepost_status_price_idx'),
+        ),
+    ]
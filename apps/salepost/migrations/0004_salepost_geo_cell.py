@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:52
+
+from django.db import migrations, models
+
+from core.geo import grid_cell
+
+
+def backfill_geo_cell(apps, schema_editor):
+    SalePost = apps.get_model('salepost', 'SalePost')
+    batch = []
+    for post in SalePost.objects.select_related('region').iterator(chunk_size=2000):
+        lat, lon = post.latitude, post.longitude
+        if (lat is None or lon is None) and post.region is not None:
+            lat, lon = post.region.latitude, post.region.longitude
+        try:
+            post.geo_cell = grid_cell(float(lat), float(lon))
+        except (TypeError, ValueError):
+            continue
+        batch.append(post)
+        if len(batch) >= 2000:
+            SalePost.objects.bulk_update(batch, ['geo_cell'])
+            batch = []
+    if batch:
+        SalePost.objects.bulk_update(batch, ['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('region', '0004_alter_region_options'),
+        ('salepost', '0003_salepost_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salepost',
+            name='geo_cell',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='salepost',
+            index=models.Index(fields=['post_status', 'geo_cell'], name='salepost_status_cell_idx'),
+        ),
+        migrations.RunPython(backfill_geo_cell, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+from core.geo import grid_cell
+
+
+def backfill_effective_coordinates(apps, schema_editor):
+    # SalePost.refresh_effective_coordinates, the historical model has no methods
+    SalePost = apps.get_model('salepost', 'SalePost')
+    batch = []
+    for post in SalePost.objects.select_related('region').iterator(chunk_size=2000):
+        lat, lon = post.latitude, post.longitude
+        if (lat is None or lon is None) and post.region is not None:
+            lat, lon = post.region.latitude, post.region.longitude
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            continue
+        post.effective_lat, post.effective_lon, post.geo_cell = lat, lon, grid_cell(lat, lon)
+        batch.append(post)
+        if len(batch) >= 2000:
+            SalePost.objects.bulk_update(batch, ['effective_lat', 'effective_lon', 'geo_cell'])
+            batch = []
+    if batch:
+        SalePost.objects.bulk_update(batch, ['effective_lat', 'effective_lon', 'geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0004_salepost_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salepost',
+            name='effective_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='salepost',
+            name='effective_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_effective_coordinates, migrations.RunPython.noop),
+    ]
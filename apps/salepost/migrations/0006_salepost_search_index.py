@@ -0,0 +1,39 @@
+from django.db import migrations
+
+from core.text import turkish_lower
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    SalePost = apps.get_model('salepost', 'SalePost')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS salepost_search "
+            "USING fts5(post_title, description, tokenize='trigram')"
+        )
+        rows = [
+            (pk, turkish_lower(title or ''), turkish_lower(description or ''))
+            for pk, title, description in SalePost.objects.values_list('id', 'post_title', 'description').iterator()
+        ]
+        cursor.executemany(
+            "INSERT INTO salepost_search (rowid, post_title, description) VALUES (%s, %s, %s)", rows
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS salepost_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0005_salepost_effective_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0006_salepost_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalePostChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('salepost_id', models.BigIntegerField()),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
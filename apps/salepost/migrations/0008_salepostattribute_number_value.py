@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:14
+
+from django.db import migrations, models
+
+
+def backfill_number_value(apps, schema_editor):
+    SalePostAttribute = apps.get_model('salepost', 'SalePostAttribute')
+    batch = []
+    for row in SalePostAttribute.objects.filter(attribute__data_type='number').only('id', 'value').iterator(chunk_size=2000):
+        try:
+            row.number_value = float(row.value)
+        except (TypeError, ValueError):
+            continue
+        batch.append(row)
+        if len(batch) >= 2000:
+            SalePostAttribute.objects.bulk_update(batch, ['number_value'])
+            batch = []
+    SalePostAttribute.objects.bulk_update(batch, ['number_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0002_categoryclosure'),
+        ('salepost', '0007_salepostchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salepostattribute',
+            name='number_value',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='salepostattribute',
+            index=models.Index(fields=['attribute', 'value', 'salepost'], name='salepost_attr_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salepostattribute',
+            index=models.Index(fields=['attribute', 'number_value', 'salepost'], name='salepost_attr_number_idx'),
+        ),
+        migrations.RunPython(backfill_number_value, migrations.RunPython.noop),
+    ]
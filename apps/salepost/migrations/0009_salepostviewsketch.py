@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0008_salepostattribute_number_value'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalePostViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sketch', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('salepost', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='view_sketch', to='salepost.salepost')),
+            ],
+        ),
+    ]
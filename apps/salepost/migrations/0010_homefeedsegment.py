@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0009_salepostviewsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HomeFeedSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=150, unique=True)),
+                ('gender', models.CharField(blank=True, max_length=100)),
+                ('min_usage', models.IntegerField(blank=True, null=True)),
+                ('max_usage', models.IntegerField(blank=True, null=True)),
+                ('entries', models.JSONField(default=list)),
+                ('complete', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0010_homefeedsegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalePostIndexState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_change_id', models.BigIntegerField(default=0)),
+                ('replay_from', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SalePostNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='salepost.salepost')),
+                ('salepost', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_links', to='salepost.salepost')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('salepost', 'rank'), name='unique_salepost_neighbour_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0011_salepostneighbour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalePostTextVector',
+            fields=[
+                ('salepost', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text_vector', serialize=False, to='salepost.salepost')),
+                ('vector', models.BinaryField()),
+                ('digest', models.CharField(max_length=32)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0012_saleposttextvector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='medium_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='thumbnail_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
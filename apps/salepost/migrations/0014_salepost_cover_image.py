@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_cover_image(apps, schema_editor):
+    # existing images keep position 0, the oldest one becomes the cover
+    Image = apps.get_model('salepost', 'Image')
+    SalePost = apps.get_model('salepost', 'SalePost')
+    covers = {}
+    for image_id, post_id in Image.objects.order_by('-position', '-id').values_list('id', 'related_post_id').iterator():
+        covers[post_id] = image_id
+    posts = [SalePost(id=post_id, cover_image_id=image_id) for post_id, image_id in covers.items()]
+    SalePost.objects.bulk_update(posts, ['cover_image'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salepost', '0013_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='position',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='salepost',
+            name='cover_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='salepost.image'),
+        ),
+        migrations.RunPython(backfill_cover_image, migrations.RunPython.noop),
+    ]
@@ -3,9 +3,12 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 
-from apps.category.models import Category, Attribute, UsageRange
+from apps.category.models import Category, Attribute, UsageRange, DataType
 from apps.region.models import Region
 
+from core.geo import grid_cell
+from core.storage import get_image_storage
+
 from cloudinary.models import CloudinaryField
 
 User = get_user_model()
@@ -32,6 +35,21 @@ class SalePost(models.Model):
     min_usage = models.ForeignKey(UsageRange, on_delete=models.SET_NULL, null=True, blank=True, related_name='min_usage_range')
     max_usage = models.ForeignKey(UsageRange, on_delete=models.SET_NULL, null=True, blank=True, related_name='max_usage_range')
     viewed = models.IntegerField(default=0) # how many time the post is viewed
+    # own coordinates or the region centroid, kept in sync so distance queries read two float columns
+    effective_lat = models.FloatField(null=True, blank=True, editable=False)
+    effective_lon = models.FloatField(null=True, blank=True, editable=False)
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False) # core.geo grid cell of the effective coordinates
+    # first image by (position, id), kept by apps.salepost.signals / services so list cards skip the images query
+    cover_image = models.ForeignKey('Image', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+')
+
+    class Meta:
+        indexes = [
+            # list endpoint filters on status and orders by these columns, LIMIT/OFFSET can walk the index
+            models.Index(fields=['post_status', 'posted_at', 'id'], name='salepost_status_posted_idx'),
+            models.Index(fields=['post_status', 'product_price', 'id'], name='salepost_status_price_idx'),
+            # max_distance queries read only the grid cells around the user
+            models.Index(fields=['post_status', 'geo_cell'], name='salepost_status_cell_idx'),
+        ]
 
     def is_published(self):
         return self.post_status == PublishStatus.PUBLISHED
@@ -39,29 +57,137 @@ class SalePost(models.Model):
     def save(self, *args, **kwargs):
         if self.min_usage and self.max_usage and self.min_usage.unique_id > self.max_usage.unique_id:
             raise ValidationError("Minimum usage range must be less than or equal to maximum usage range.")
+        self.refresh_effective_coordinates()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'effective_lat', 'effective_lon', 'geo_cell'}
         super().save(*args, **kwargs)
 
+    def refresh_cover_image(self):
+        # bulk image writes skip the signals, callers doing them call this themselves
+        cover_id = self.image_set.order_by('position', 'id').values_list('id', flat=True).first()
+        if cover_id != self.cover_image_id:
+            self.cover_image_id = cover_id
+            SalePost.objects.filter(pk=self.pk).update(cover_image_id=cover_id)
+
+    def refresh_effective_coordinates(self):
+        # own coordinates win, otherwise the region centroid (stored as text) is used
+        lat, lon = self.latitude, self.longitude
+        if lat is None or lon is None:
+            lat, lon = self.region.coordinates if self.region else (None, None)
+        self.effective_lat, self.effective_lon = lat, lon
+        self.geo_cell = grid_cell(lat, lon) if lat is not None and lon is not None else None
+
     @property
     def effective_latitude(self):
-        return self.latitude if self.latitude is not None else self.region.latitude
-        
+        return self.effective_lat
+
     @property
     def effective_longitude(self):
-        return self.longitude if self.longitude is not None else self.region.longitude
+        return self.effective_lon
 
     def __str__(self):
         return f"{self.post_id}"
 
 
+class SalePostChange(models.Model):
+    # append-only change marker read by the in-memory catalog and the neighbour refresh, no FK so deletes are kept
+    salepost_id = models.BigIntegerField()
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.salepost_id} @ {self.changed_at}"
+
+
+class SalePostNeighbour(models.Model):
+    # precomputed similar posts of a published post (apps.salepost.similar), rank 0 is the most similar
+    salepost = models.ForeignKey(SalePost, on_delete=models.CASCADE, related_name="neighbour_links")
+    neighbour = models.ForeignKey(SalePost, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['salepost', 'rank'], name='unique_salepost_neighbour_rank')
+        ]
+
+    def __str__(self):
+        return f"{self.salepost_id} #{self.rank} {self.neighbour_id}"
+
+
+class SalePostTextVector(models.Model):
+    # core.vectors.hashed_vector of the title and description (float32 bytes), built by apps.salepost.text_vectors
+    salepost = models.OneToOneField(SalePost, on_delete=models.CASCADE, primary_key=True, related_name="text_vector")
+    vector = models.BinaryField()
+    digest = models.CharField(max_length=32) # text_digest of the vectorized text, unchanged texts are skipped
+
+    def __str__(self):
+        return f"{self.salepost_id} text vector"
+
+
+class SalePostIndexState(models.Model):
+    # progress of a job consuming SalePostChange, e.g. the neighbour refresh
+    name = models.CharField(max_length=50, unique=True)
+    last_change_id = models.BigIntegerField(default=0)
+    replay_from = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_change_id}"
+
+
+class SalePostViewSketch(models.Model):
+    # core.sketches.HyperLogLog of the viewers (user id or client ip) of the post, merged in by apps.salepost.counters
+    salepost = models.OneToOneField(SalePost, on_delete=models.CASCADE, related_name="view_sketch")
+    sketch = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.salepost_id} viewers"
+
+
+class HomeFeedSegment(models.Model):
+    # newest published posts of one gender x usage range bucket of the home view, kept by apps.salepost.feed
+    key = models.CharField(max_length=150, unique=True)
+    gender = models.CharField(max_length=100, blank=True) # gender attribute value, empty for all
+    min_usage = models.IntegerField(null=True, blank=True) # UsageRange.unique_id bounds, null for open
+    max_usage = models.IntegerField(null=True, blank=True)
+    entries = models.JSONField(default=list) # [posted_at timestamp, salepost id] pairs, newest first
+    complete = models.BooleanField(default=True) # False when matching posts past the stored entries exist
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+
 class SalePostAttribute(models.Model):
     salepost = models.ForeignKey(SalePost, on_delete=models.CASCADE)
     attribute = models.ForeignKey(Attribute, on_delete=models.CASCADE)
     value = models.CharField(max_length=100)
+    number_value = models.FloatField(null=True, blank=True, editable=False) # typed copy of value for number attributes
 
     class Meta:
         constraints = [
                 models.UniqueConstraint(fields=['salepost', 'attribute'], name="unique_salepost_attribute")
         ]
+        indexes = [
+            # (attribute, value) -> post ids lookups of the attr.<name> list filters
+            models.Index(fields=['attribute', 'value', 'salepost'], name='salepost_attr_value_idx'),
+            models.Index(fields=['attribute', 'number_value', 'salepost'], name='salepost_attr_number_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.refresh_number_value()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'number_value'}
+        super().save(*args, **kwargs)
+
+    def refresh_number_value(self):
+        # bulk_create skips save(), callers creating number attributes in bulk call this themselves
+        self.number_value = None
+        if self.attribute.data_type == DataType.NUMBER:
+            try:
+                self.number_value = float(self.value)
+            except (TypeError, ValueError):
+                pass
 
 
     def __str__(self):
@@ -71,7 +197,27 @@ class SalePostAttribute(models.Model):
 class Image(models.Model):
     img = CloudinaryField("salepost_image", blank=True, null=True)
     related_post = models.ForeignKey(SalePost, on_delete=models.DO_NOTHING)
+    position = models.PositiveSmallIntegerField(default=0) # display order within the post, the first one is the cover
+    # renditions written after upload by apps.salepost.renditions, empty until they are ready
+    thumbnail_url = models.CharField(max_length=500, blank=True, default="")
+    medium_url = models.CharField(max_length=500, blank=True, default="")
+    # apps.salepost.duplicates: sha256 of the file and its 64 bit dHash (signed, as stored), the
+    # hash is split into 16 bit bands so near duplicates are found through the band indexes
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    perceptual_hash = models.BigIntegerField(null=True, blank=True)
+    hash_band_0 = models.PositiveIntegerField(null=True, blank=True)
+    hash_band_1 = models.PositiveIntegerField(null=True, blank=True)
+    hash_band_2 = models.PositiveIntegerField(null=True, blank=True)
+    hash_band_3 = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hash_band_0'], name='image_hash_band_0_idx'),
+            models.Index(fields=['hash_band_1'], name='image_hash_band_1_idx'),
+            models.Index(fields=['hash_band_2'], name='image_hash_band_2_idx'),
+            models.Index(fields=['hash_band_3'], name='image_hash_band_3_idx'),
+        ]
 
     @property
     def get_url(self):
-        return f"https://res.cloudinary.com/{CLOUDINARY_CLOUD_NAME}/{self.img}" 
\ No newline at end of file
+        return get_image_storage().url(self.img)
\ No newline at end of file
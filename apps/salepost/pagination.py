@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _count_limit():
+    return getattr(settings, "SALEPOST_LIST_COUNT_LIMIT", 10000)
+
+
+def capped_count(ordered):
+    """
+    Length of an ordering, at most SALEPOST_LIST_COUNT_LIMIT. A queryset is counted over a
+    LIMITed subquery, so the cost stops growing with the catalog past the limit. The ordering
+    is dropped first, any rows will do and sorting them could cost more than the count.
+    """
+    limit = _count_limit()
+    if isinstance(ordered, QuerySet):
+        return ordered.order_by()[:limit].count()
+    return min(len(ordered), limit)
+
+
+class CappedCountPaginator(Paginator):
+    """Pages past the count limit are not served, deeper reads go through cursor pagination."""
+
+    @cached_property
+    def count(self):
+        return capped_count(self.object_list)
+
+
+class SalePostPagination(PageNumberPagination):
+    django_paginator_class = CappedCountPaginator
+    page_size = 20  # Default page size
+    page_size_query_param = 'limit'  # Allow ?limit=40
+    max_page_size = 100
+
+
+class SalePostCursorPagination(BasePagination):
+    """
+    Opt-in (?pagination=cursor) forward-only paging for infinite scroll clients.
+    The cursor is an opaque token holding the sort key and post id of the last item served,
+    so the next page is read by seeking past it: no total count, no skipped rows, and posts
+    inserted meanwhile do not shift the pages.
+    """
+
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    page_size = SalePostPagination.page_size
+    page_size_query_param = SalePostPagination.page_size_query_param
+    max_page_size = SalePostPagination.max_page_size
+
+    def is_requested(self, request):
+        params = request.query_params
+        return params.get(self.mode_query_param) == 'cursor' or self.cursor_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request, sort_by, order, distance_mode):
+        """(sort key, post id) of the last item of the previous page, None on the first page. Raises ValueError."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            if (data['s'], data['o'], data['d']) != (sort_by, order, distance_mode):
+                raise ValueError('Cursor does not match the requested ordering.')
+            return self._parse_key(data['k'], sort_by, distance_mode), int(data['i'])
+        except (KeyError, TypeError, ArithmeticError, UnicodeDecodeError, json.JSONDecodeError) as exc:
+            raise ValueError('Invalid cursor.') from exc
+
+    def encode_cursor(self, position, sort_by, order, distance_mode):
+        key, post_id = position
+        if isinstance(key, datetime):
+            key = key.isoformat()
+        elif isinstance(key, Decimal):
+            key = str(key)
+        data = {'s': sort_by, 'o': order, 'd': distance_mode, 'k': key, 'i': post_id}
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+    def _parse_key(self, key, sort_by, distance_mode):
+        if key is None:
+            return None
+        # distance mode orders numpy arrays, keys are plain floats there
+        if distance_mode:
+            return float(key)
+        if sort_by == 'published_at':
+            return datetime.fromisoformat(key)
+        return Decimal(key)
+
+    def get_next_link(self, request, cursor):
+        if cursor is None:
+            return None
+        url = request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_cursor_response(self, request, data, next_cursor):
+        return Response({
+            'next': self.get_next_link(request, next_cursor),
+            'previous': None,
+            'results': data,
+        })
@@ -0,0 +1,287 @@
+import numpy as np
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.salepost.models import SalePost, SalePostAttribute, PublishStatus
+from apps.category.models import Attribute, DataType, category_tree
+from apps.region.models import region_tree
+from apps.salepost.search import get_search_backend
+
+from core.geo import haversine_vectorized, grid_cell_ranges, nearest_indices
+
+
+# sort_by value -> SalePost column, distance is computed outside the database
+SORT_FIELDS = {
+    "price": "product_price",
+    "published_at": "posted_at",
+}
+
+
+def _parse_id_list(raw):
+    return [int(part.strip()) for part in raw.split(",") if part.strip().isdigit()]
+
+
+def filter_published_saleposts(query_params):
+    """
+    Build the filtered (but not yet ordered) queryset of published saleposts.
+    Raises ValueError for malformed filter values.
+    """
+    posts = SalePost.objects.filter(post_status=PublishStatus.PUBLISHED)
+
+    # descendant expansion runs as a closure table subquery, an il expands to thousands of mahalle ids
+    category_ids = query_params.get("category_ids")
+    if category_ids:
+        posts = posts.filter(category_id__in=category_tree.descendants(_parse_id_list(category_ids)))
+
+    region_ids = query_params.get("region_ids")
+    if region_ids:
+        posts = posts.filter(region_id__in=region_tree.descendants(_parse_id_list(region_ids)))
+
+    price_min = query_params.get("price_min")
+    if price_min:
+        posts = posts.filter(product_price__gte=int(price_min))
+
+    price_max = query_params.get("price_max")
+    if price_max:
+        posts = posts.filter(product_price__lte=int(price_max))
+
+    published_last_days = query_params.get("published_last_days")
+    if published_last_days:
+        cutoff = timezone.now() - timezone.timedelta(days=int(published_last_days))
+        posts = posts.filter(posted_at__gte=cutoff)
+
+    keyword = query_params.get("keyword")
+    if keyword:
+        posts = get_search_backend().filter(posts, keyword)
+
+    return filter_by_attributes(posts, query_params)
+
+
+ATTRIBUTE_PARAM_PREFIX = "attr."
+
+
+def attribute_params(query_params):
+    """
+    {unique_name: {"values": [...], "min": ..., "max": ...}} from the attr.<unique_name>=v1,v2
+    and attr.<unique_name>.min / .max query parameters.
+    """
+    params = {}
+    for name, raw in query_params.items():
+        if not name.startswith(ATTRIBUTE_PARAM_PREFIX) or not raw:
+            continue
+        unique_name = name[len(ATTRIBUTE_PARAM_PREFIX):]
+        bound = None
+        if unique_name.endswith((".min", ".max")):
+            unique_name, bound = unique_name[:-4], unique_name[-3:]
+        spec = params.setdefault(unique_name, {})
+        if bound:
+            spec[bound] = raw
+        else:
+            spec["values"] = [part.strip() for part in raw.split(",") if part.strip()]
+    return params
+
+
+def filter_by_attributes(posts, query_params):
+    """
+    Narrow posts with the attr.<unique_name> filters, each one a subquery over the
+    (attribute, value, salepost) / (attribute, number_value, salepost) indexes.
+    Choice attributes match choice ids or (case-insensitive) choice values.
+    Raises ValueError for unknown attributes or malformed numbers.
+    """
+    params = attribute_params(query_params)
+    if not params:
+        return posts
+
+    attributes = Attribute.objects.in_bulk(list(params), field_name="unique_name")
+    for unique_name, spec in params.items():
+        attribute = attributes.get(unique_name)
+        if attribute is None:
+            raise ValueError(f"unknown attribute '{unique_name}'")
+
+        rows = SalePostAttribute.objects.filter(attribute=attribute)
+        values = spec.get("values")
+        if values is not None:
+            if attribute.data_type == DataType.NUMBER:
+                rows = rows.filter(number_value__in=[float(value) for value in values])
+            elif attribute.data_type in (DataType.CHOICE, DataType.SWITCH):
+                choice_ids = [value for value in values if value.isdigit()]
+                labels = [value for value in values if not value.isdigit()]
+                if labels:
+                    label_match = Q()
+                    for label in labels:
+                        label_match |= Q(value__iexact=label)
+                    choice_ids += [str(pk) for pk in attribute.choices.filter(label_match).values_list("id", flat=True)]
+                rows = rows.filter(value__in=choice_ids)
+            else:
+                rows = rows.filter(value__in=values)
+
+        if "min" in spec or "max" in spec:
+            if attribute.data_type != DataType.NUMBER:
+                raise ValueError(f"attribute '{unique_name}' is not numeric")
+            if "min" in spec:
+                rows = rows.filter(number_value__gte=float(spec["min"]))
+            if "max" in spec:
+                rows = rows.filter(number_value__lte=float(spec["max"]))
+
+        posts = posts.filter(id__in=rows.values("salepost_id"))
+    return posts
+
+
+def ordered_salepost_ids(posts, sort_by, order):
+    """
+    Ordered id queryset for the SQL sortable fields. Slicing it (as the paginator does)
+    becomes LIMIT/OFFSET, so only the ids of the requested page are read.
+    Missing values sort as the smallest ones, the id keeps the order deterministic.
+    """
+    field = SORT_FIELDS[sort_by]
+    if order == "desc":
+        ordering = (F(field).desc(nulls_last=True), "-id")
+    else:
+        ordering = (F(field).asc(nulls_first=True), "id")
+    return posts.order_by(*ordering).values_list("id", flat=True)
+
+
+class NearbyPosts:
+    """
+    (post id, distance_km) pairs of the posts that passed the distance step, ordered by
+    distance or by the requested sort key. Behaves like a sliceable sequence so it can be
+    handed to the paginator.
+    """
+
+    def __init__(self, ids, distances, sort_keys=None, reverse=False):
+        self.ids = ids
+        self.distances = distances
+        self.sort_keys = distances if sort_keys is None else sort_keys
+        self.reverse = reverse
+        self._order = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _ordering(self, limit=None):
+        """Positions in sort order, only the first limit of them are selected and sorted when given."""
+        if self._order is not None:
+            return self._order
+        if limit is not None and limit < len(self.ids):
+            # early pages: O(n) top-k selection instead of sorting every candidate
+            return nearest_indices(self.sort_keys, limit, farthest=self.reverse, tiebreak=self.ids)
+        self._order = nearest_indices(self.sort_keys, len(self.ids), farthest=self.reverse, tiebreak=self.ids)
+        return self._order
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.ids))
+            selected = self._ordering(stop)[start:stop:step] if step > 0 else self._ordering()[index]
+        else:
+            if index < 0:
+                index += len(self.ids)
+            selected = self._ordering(index + 1)[index]
+        if np.ndim(selected) == 0:
+            return int(self.ids[selected]), float(self.distances[selected])
+        return list(zip(self.ids[selected].tolist(), self.distances[selected].tolist()))
+
+    def sort_key_at(self, index):
+        key = float(self.sort_keys[self._ordering(index + 1)[index]])
+        return None if np.isneginf(key) else key
+
+    def after(self, position):
+        """The posts that come after position = (sort key, post id) in this ordering."""
+        key, last_id = position
+        key = -np.inf if key is None else key
+        if self.reverse:
+            keep = (self.sort_keys < key) | ((self.sort_keys == key) & (self.ids < last_id))
+        else:
+            keep = (self.sort_keys > key) | ((self.sort_keys == key) & (self.ids > last_id))
+        return NearbyPosts(self.ids[keep], self.distances[keep], self.sort_keys[keep], reverse=self.reverse)
+
+
+def seek_ordered_saleposts(posts, sort_by, order, position, limit):
+    """
+    Keyset variant of ordered_salepost_ids: (id, sort key) rows that follow
+    position = (sort key, post id), read with index range scans instead of OFFSET.
+    Posts without a value form their own segment (first in asc, last in desc) so
+    every query stays a single range over the (post_status, field, id) index.
+    """
+    field = SORT_FIELDS[sort_by]
+    descending = order == "desc"
+    id_order = "-id" if descending else "id"
+
+    missing = posts.filter(**{f"{field}__isnull": True}).order_by(id_order)
+    present = posts.filter(**{f"{field}__isnull": False}).order_by(
+        F(field).desc() if descending else F(field).asc(), id_order
+    )
+    segments = [present, missing] if descending else [missing, present]
+
+    if position is not None:
+        key, last_id = position
+        if key is None:
+            current = segments.index(missing)
+            segments[current] = missing.filter(**{"id__lt" if descending else "id__gt": last_id})
+        else:
+            current = segments.index(present)
+            if descending:
+                after = Q(**{f"{field}__lte": key}) & (Q(**{f"{field}__lt": key}) | Q(id__lt=last_id))
+            else:
+                after = Q(**{f"{field}__gte": key}) & (Q(**{f"{field}__gt": key}) | Q(id__gt=last_id))
+            segments[current] = present.filter(after)
+        segments = segments[current:]
+
+    rows = []
+    for segment in segments:
+        rows.extend(segment.values_list("id", field)[:limit - len(rows)])
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def _sort_key(value):
+    if value is None:
+        return np.nan
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return float(value)
+
+
+def nearby_saleposts(posts, user_lat, user_lon, max_distance=None, sort_by="distance", reverse=False):
+    """
+    Compute distances for the filtered posts without instantiating models.
+    With max_distance only the posts in the grid cells overlapping the radius are read
+    from the database, the exact haversine check runs on those candidates.
+    """
+    posts = posts.filter(effective_lat__isnull=False, effective_lon__isnull=False)
+    if max_distance:
+        cells = Q()
+        for first_cell, last_cell in grid_cell_ranges(user_lat, user_lon, max_distance):
+            cells |= Q(geo_cell__range=(first_cell, last_cell))
+        posts = posts.filter(cells)
+
+    columns = ["id", "effective_lat", "effective_lon"]
+    if sort_by != "distance":
+        columns.append(SORT_FIELDS[sort_by])
+
+    rows = list(posts.values_list(*columns))
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    lats = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+    lons = np.fromiter((row[2] for row in rows), dtype=float, count=len(rows))
+    distances = haversine_vectorized(user_lat, user_lon, lats, lons)
+
+    sort_keys = None
+    if sort_by != "distance":
+        # missing prices/dates sort as the smallest values, same as the SQL ordering
+        sort_keys = np.fromiter((_sort_key(row[3]) for row in rows), dtype=float, count=len(rows))
+        sort_keys = np.nan_to_num(sort_keys, nan=-np.inf)
+
+    if max_distance:
+        keep = distances <= max_distance
+        ids, distances = ids[keep], distances[keep]
+        if sort_keys is not None:
+            sort_keys = sort_keys[keep]
+
+    return NearbyPosts(ids, distances, sort_keys=sort_keys, reverse=reverse)
+
+
+def hydrate_saleposts(ids, related=("seller", "category", "region")):
+    """Load the posts of a single page, preserving the given id order."""
+    posts = SalePost.objects.select_related(*related).in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
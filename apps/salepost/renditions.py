@@ -0,0 +1,94 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+from apps.salepost.models import Image
+
+from core.images import render_renditions
+from core.storage import get_image_storage
+
+
+# Thumbnail and medium renditions of uploaded images. Decoding and resizing run in a process
+# pool (spawned, the workers only import core.images), a few threads per process wait for the
+# renders, upload them through the image storage and record the URLs on Image. Until then, or
+# when rendering fails, the URL fields stay empty and clients use the original image.
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executors = (None, None, None)  # (pid, render processes, job threads)
+
+
+def _workers():
+    return getattr(settings, "IMAGE_RENDITION_WORKERS", 2)
+
+
+def _get_executors():
+    global _executors
+    with _lock:
+        pid, renderers, jobs = _executors
+        # pools created before a fork belong to the parent
+        if pid != os.getpid():
+            renderers = ProcessPoolExecutor(max_workers=_workers(), mp_context=multiprocessing.get_context("spawn"))
+            jobs = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="image-renditions")
+            _executors = (os.getpid(), renderers, jobs)
+        return renderers, jobs
+
+
+def store_renditions(image_id, rendered, storage=None):
+    storage = storage or get_image_storage()
+    urls = {}
+    for name, (data, extension) in rendered.items():
+        stored = storage.upload(ContentFile(data, name=f"{name}.{extension}"))
+        urls[f"{name}_url"] = storage.url(stored)
+    Image.objects.filter(pk=image_id).update(**urls)
+
+
+def _render(image_id, data, renderers=None):
+    try:
+        rendered = renderers.submit(render_renditions, data).result() if renderers is not None else render_renditions(data)
+        store_renditions(image_id, rendered)
+    except Exception:
+        # nobody waits for the renditions, the URLs stay empty and the failure is only logged
+        logger.exception("Renditions of image %s failed", image_id)
+
+
+def _job(image_id, data):
+    renderers, _ = _get_executors()
+    try:
+        _render(image_id, data, renderers)
+    finally:
+        # the job thread's own connection
+        connections.close_all()
+
+
+def _read(file):
+    if hasattr(file, "seekable") and file.seekable():
+        file.seek(0)
+    return file.read()
+
+
+def schedule_renditions(images, files):
+    """
+    Render the files of the just created images once the transaction commits. The bytes are
+    read now, while the uploaded files are still open, the rest happens off the request thread
+    (inline when IMAGE_RENDITION_WORKERS is 0).
+    """
+    payloads = [(image.pk, _read(file)) for image, file in zip(images, files)]
+
+    def submit():
+        if not _workers():
+            for image_id, data in payloads:
+                _render(image_id, data)
+            return
+        _, jobs = _get_executors()
+        for image_id, data in payloads:
+            jobs.submit(_job, image_id, data)
+
+    transaction.on_commit(submit)
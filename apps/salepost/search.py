@@ -0,0 +1,103 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from core.text import turkish_lower
+
+
+def normalize_search_text(text):
+    return turkish_lower(text or "")
+
+
+class SearchBackend:
+    """
+    Keyword index over salepost title and description.
+    Backends receive SalePost instances on writes and narrow a SalePost queryset on reads.
+    """
+
+    def index(self, posts):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def rebuild(self, posts, batch_size=2000):
+        pass
+
+    def filter(self, queryset, keyword):
+        raise NotImplementedError
+
+
+class IContainsSearchBackend(SearchBackend):
+    # no index, LIKE scan over the post table (works on every database)
+
+    def filter(self, queryset, keyword):
+        return queryset.filter(Q(post_title__icontains=keyword) | Q(description__icontains=keyword))
+
+
+class SQLiteFTS5SearchBackend(SearchBackend):
+    """
+    FTS5 trigram table (created by migration 0006) holding the Turkish-lowercased title and
+    description under the salepost rowid. Trigram matching keeps the substring semantics of
+    icontains, shorter keywords than a trigram fall back to it.
+    """
+
+    table = "salepost_search"
+    min_keyword_length = 3
+
+    def index(self, posts):
+        rows = [
+            (post.pk, normalize_search_text(post.post_title), normalize_search_text(post.description))
+            for post in posts
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, post_title, description) VALUES (%s, %s, %s)", rows
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in post_ids])
+
+    def rebuild(self, posts, batch_size=2000):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        batch = []
+        for post in posts.only("id", "post_title", "description").iterator(chunk_size=batch_size):
+            batch.append(post)
+            if len(batch) >= batch_size:
+                self.index(batch)
+                batch = []
+        self.index(batch)
+        # Without statistics SQLite walks the whole post_status index instead of probing the
+        # matched rowids, so refresh them together with the index.
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def filter(self, queryset, keyword):
+        normalized = normalize_search_text(keyword).strip()
+        if len(normalized) < self.min_keyword_length:
+            # stripped like the FTS phrase, the list cache keys both spellings the same
+            return IContainsSearchBackend().filter(queryset, keyword.strip())
+        # a quoted FTS5 string is matched as a phrase, i.e. as a substring with the trigram tokenizer
+        phrase = '"' + normalized.replace('"', '""') + '"'
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", (phrase,))
+        )
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    backend_path = getattr(settings, "SALEPOST_SEARCH_BACKEND", None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == "sqlite":
+        return SQLiteFTS5SearchBackend()
+    return IContainsSearchBackend()
@@ -1,13 +1,16 @@
 from django.conf import settings
+from django.db import models
+from django.db.models import Prefetch, prefetch_related_objects
 
 from rest_framework import serializers
 
 from apps.salepost.models import SalePost, SalePostAttribute, Image
+from apps.salepost.services import create_salepost_images
 from apps.category.models import Attribute,AttributeChoice
 
 
 def get_max_images_per_salepost():
-    return int(settings("MAX_NUM_OF_IMAGES_PER_SALEPOST", 5))
+    return int(getattr(settings, "MAX_NUM_OF_IMAGES_PER_SALEPOST", 5))
 
 class SalePostAttributeSerializer(serializers.ModelSerializer):
     attribute = serializers.SerializerMethodField()
@@ -18,11 +21,15 @@ class SalePostAttributeSerializer(serializers.ModelSerializer):
         fields = ['attribute', 'value']
 
     def get_attribute(self, obj):
-        attribute = Attribute.objects.get(id=obj.attribute.id)
-        return attribute.unique_name
+        return obj.attribute.unique_name
     def get_value(self, obj):
-        attribute = Attribute.objects.get(id=obj.attribute.id)
+        attribute = obj.attribute
         if attribute.data_type == 'choice':
+            # choices loaded for the whole page by SalePostListBatchSerializer, if any
+            choices = self.context.get('attribute_choices')
+            if choices is not None:
+                choice = choices.get(int(obj.value))
+                return choice.value if choice else None
             try:
                 choice = AttributeChoice.objects.get(id=int(obj.value))
                 return choice.value
@@ -34,6 +41,37 @@ class SalePostAttributeSerializer(serializers.ModelSerializer):
             return obj.value
 
 
+def prefetch_salepost_list(posts):
+    """
+    Load everything SalePostListSerializer reads for the given posts in a constant number of queries.
+    Returns the {id: AttributeChoice} map of the choice values used by their attributes.
+    """
+    prefetch_related_objects(
+        posts,
+        "seller",
+        "category",
+        "region",
+        Prefetch("salepostattribute_set", queryset=SalePostAttribute.objects.select_related("attribute").order_by("id")),
+        Prefetch("image_set", queryset=Image.objects.order_by("position", "id")),
+    )
+    choice_ids = {
+        int(row.value)
+        for post in posts
+        for row in post.salepostattribute_set.all()
+        if row.attribute.data_type == 'choice' and row.value.isdigit()
+    }
+    return AttributeChoice.objects.in_bulk(choice_ids) if choice_ids else {}
+
+
+class SalePostListBatchSerializer(serializers.ListSerializer):
+    # many=True path, prefetches the relations of the whole page before serializing each post
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        # read by the child through the shared context, the child serializer itself stays stateless
+        self.context['attribute_choices'] = prefetch_salepost_list(posts)
+        return super().to_representation(posts)
+
+
 class SalePostListSerializer(serializers.Serializer):
     post_id = serializers.IntegerField(required=False, help_text="6 digits unique post id")
     post_status = serializers.CharField(required=False)
@@ -50,19 +88,42 @@ class SalePostListSerializer(serializers.Serializer):
     attributes = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
 
+    class Meta:
+        list_serializer_class = SalePostListBatchSerializer
+
     def get_attributes(self, obj):
-        attributes = SalePostAttribute.objects.filter(salepost=obj)
-        if attributes.exists():
-            return SalePostAttributeSerializer(attributes, many=True).data
+        # served from the prefetch cache when serialized with many=True
+        attributes = obj.salepostattribute_set.all()
+        if attributes:
+            # set by SalePostListBatchSerializer, absent when a single post is serialized
+            context = {'attribute_choices': self.context.get('attribute_choices')}
+            return SalePostAttributeSerializer(attributes, many=True, context=context).data
         return None
     
     def get_images(self, obj):
-        images = Image.objects.filter(related_post=obj)
-        if images.exists():
+        images = obj.image_set.all()
+        if images:
             return ImageSerializer(images, many=True).data
         return None
 
 
+class SalePostCardSerializer(serializers.Serializer):
+    # lean list item (view=card), the cover image comes from SalePost.cover_image instead of every image
+    post_id = serializers.IntegerField()
+    post_status = serializers.CharField()
+    post_title = serializers.CharField()
+    region = serializers.CharField()
+    posted_at = serializers.DateTimeField()
+    product_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    cover_image = serializers.SerializerMethodField()
+
+    def get_cover_image(self, obj):
+        image = obj.cover_image
+        if image is None:
+            return None
+        return {"id": image.id, "thumbnail_url": image.thumbnail_url or image.get_url}
+
+
 class SalePostCreateSerializer(serializers.Serializer):
     category = serializers.IntegerField(required=True)
     region = serializers.IntegerField(required=True)
@@ -82,10 +143,19 @@ class SalePostUpdateSerializer(serializers.Serializer):
 
 class ImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    # stored URLs of the renditions, null until they are rendered
+    thumbnail_url = serializers.CharField(allow_null=True)
+    medium_url = serializers.CharField(allow_null=True)
 
     class Meta:
         model = Image
-        fields = ['id', 'image_url']
+        fields = ['id', 'image_url', 'thumbnail_url', 'medium_url']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['thumbnail_url'] = data['thumbnail_url'] or None
+        data['medium_url'] = data['medium_url'] or None
+        return data
 
     def get_image_url(self, obj):
         return obj.get_url  
@@ -119,5 +189,5 @@ class MultipleImageUploadSerializer(serializers.Serializer):
         images = validated_data.pop('images', [])
         post_id = validated_data.pop('post_id')  # This is already a SalePost object from validate_post_id
         related_post = SalePost.objects.get(post_id=post_id)
-        image_instances = [Image.objects.create(img=image, related_post=related_post) for image in images]
-        return image_instances
\ No newline at end of file
+        # concurrent uploads and a single INSERT instead of one blocking upload per Image.objects.create
+        return create_salepost_images(related_post, images)
\ No newline at end of file
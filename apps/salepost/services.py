@@ -1,7 +1,12 @@
 from django.db import transaction
+from django.db.models import Max
 
-from apps.salepost.models import SalePost, SalePostAttribute
-from apps.category.models import Attribute
+from apps.salepost.models import SalePost, SalePostAttribute, Image
+from apps.salepost.cache import invalidate_saleposts
+from apps.salepost.renditions import schedule_renditions
+from apps.salepost.duplicates import fingerprint, existing_images
+
+from core.storage import get_image_storage, upload_files, delete_uploads
 
 
 @transaction.atomic
@@ -18,10 +23,11 @@ def create_salepost_atomic(
     longitude, 
     min_usage, 
     max_usage, 
-    category_attributes
+    attribute_values
 ):
+    """attribute_values: [(attribute, value)] as validated by apps.category.schema.CategorySchema."""
     salepost = SalePost.objects.create(
-        post_id=postid, 
+        post_id=post_id, 
         seller=seller, 
         category=category, 
         region=region, 
@@ -34,29 +40,115 @@ def create_salepost_atomic(
         max_usage=max_usage
     )
 
-    attr_ids = [a.id for a in category_attributes]
-    attrs = Attribute.objects.in_bulk(attr_ids)
-
     to_create=[]
-    for category_att in category_attributes:
-        att_value = attributes_payload.get(category_att.unique_name)
-        if att_value in (None, ""):
-            continue
-
-        att_obj = attrs.get(category_att.id)
-        if not att_obj:
-            raise Attribute.DoesNotExist(f"Attribute not found: {category_att.id}")
-
-        to_create.append(
-            SalePostAttribute(
-                salepost=salepost,
-                attribute=att_obj,
-                value=att_value,
-            )
+    for attribute, value in attribute_values:
+        salepost_attribute = SalePostAttribute(
+            salepost=salepost,
+            attribute=attribute,
+            value=value,
         )
+        salepost_attribute.refresh_number_value()
+        to_create.append(salepost_attribute)
 
     if to_create:
         SalePostAttribute.objects.bulk_create(to_create)
 
     return salepost
 
+
+@transaction.atomic
+def update_salepost_atomic(salepost, *, attribute_values, cleared_attributes=(), **fields):
+    """
+    Save the given fields, write attribute_values ([(attribute, value)] from
+    CategorySchema.validate_changes) with one upsert on the unique_salepost_attribute
+    constraint and delete the cleared attributes. Attributes in neither stay as they are.
+    """
+    for name, value in fields.items():
+        setattr(salepost, name, value)
+    # the post save hooks (list invalidation, change marker, home feed refresh) also cover the
+    # attribute rows, whose own signals the bulk writes below skip
+    salepost.save()
+
+    to_upsert = []
+    for attribute, value in attribute_values:
+        salepost_attribute = SalePostAttribute(salepost=salepost, attribute=attribute, value=value)
+        salepost_attribute.refresh_number_value()
+        to_upsert.append(salepost_attribute)
+    if to_upsert:
+        SalePostAttribute.objects.bulk_create(
+            to_upsert,
+            update_conflicts=True,
+            unique_fields=["salepost", "attribute"],
+            update_fields=["value", "number_value"],
+        )
+
+    if cleared_attributes:
+        SalePostAttribute.objects.filter(salepost=salepost, attribute__in=cleared_attributes).delete()
+    return salepost
+
+
+def _read(file):
+    if hasattr(file, "seekable") and file.seekable():
+        file.seek(0)
+    return file.read()
+
+
+def create_salepost_images(salepost, files):
+    """
+    Upload the files concurrently (core.storage.upload_files), then insert all Image rows with
+    one bulk_create. If the insert fails the uploaded files are deleted again, a failed upload
+    deletes the others before anything is written. Thumbnail/medium renditions follow after
+    commit (apps.salepost.renditions).
+
+    Files whose bytes are already stored (apps.salepost.duplicates) are not uploaded again, their
+    Image rows point at the existing file and copy its renditions.
+    """
+    storage = get_image_storage()
+    fingerprints = [fingerprint(_read(file)) for file in files]
+    existing = existing_images([fields["content_hash"] for fields in fingerprints])
+    # new content is uploaded once, even when the same file is in the batch twice
+    to_upload = {}
+    for file, fields in zip(files, fingerprints):
+        if fields["content_hash"] not in existing:
+            to_upload.setdefault(fields["content_hash"], file)
+    uploaded = dict(zip(to_upload, upload_files(list(to_upload.values()), storage)))
+    try:
+        with transaction.atomic():
+            # new images go after the existing ones
+            last = Image.objects.filter(related_post=salepost).aggregate(last=Max("position"))["last"]
+            start = 0 if last is None else last + 1
+            images = []
+            for i, fields in enumerate(fingerprints):
+                source = existing.get(fields["content_hash"])
+                if source is not None:
+                    image = Image(img=source.img, thumbnail_url=source.thumbnail_url, medium_url=source.medium_url, **fields)
+                else:
+                    image = Image(img=uploaded[fields["content_hash"]], **fields)
+                image.related_post = salepost
+                image.position = start + i
+                images.append(image)
+            images = Image.objects.bulk_create(images)
+            # bulk_create skips the Image post_save handlers
+            salepost.refresh_cover_image()
+            invalidate_saleposts(category_ids=[salepost.category_id], region_ids=[salepost.region_id])
+            pending = [(image, file) for image, file in zip(images, files) if not image.thumbnail_url]
+            schedule_renditions([image for image, _ in pending], [file for _, file in pending])
+    except Exception:
+        delete_uploads(list(uploaded.values()), storage)
+        raise
+    return images
+
+
+@transaction.atomic
+def reorder_salepost_images(salepost, image_ids):
+    """Display the post images in the given order (the first one becomes the cover), unlisted ones follow."""
+    images = list(Image.objects.filter(related_post=salepost).order_by("position", "id"))
+    order = {pk: i for i, pk in enumerate(image_ids)}
+    images.sort(key=lambda image: (order.get(image.pk, len(order)), image.position, image.pk))
+    for position, image in enumerate(images):
+        image.position = position
+    Image.objects.bulk_update(images, ["position"])
+    # bulk_update skips the Image post_save handlers
+    salepost.refresh_cover_image()
+    invalidate_saleposts(category_ids=[salepost.category_id], region_ids=[salepost.region_id])
+    return images
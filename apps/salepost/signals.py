@@ -0,0 +1,125 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.category.models import Category, UsageRange
+from apps.region.models import Region
+from apps.salepost.models import SalePost, SalePostAttribute, Image
+from apps.salepost.search import get_search_backend
+from apps.salepost.cache import invalidate_saleposts, invalidate_all
+from apps.salepost.changes import record_salepost_changes
+from apps.salepost.feed import GENDER_ATTRIBUTE, schedule_home_feed_refresh, rebuild_home_feed
+
+from core.geo import grid_cell
+
+
+@receiver(post_save, sender=Region)
+def sync_region_post_coordinates(sender, instance, **kwargs):
+    # posts without their own coordinates are located at the region centroid
+    lat, lon = instance.coordinates
+    cell = grid_cell(lat, lon) if lat is not None else None
+
+    post_ids = list(SalePost.objects.filter(
+        Q(latitude__isnull=True) | Q(longitude__isnull=True),
+        region=instance,
+    ).exclude(
+        effective_lat=lat, effective_lon=lon, geo_cell=cell,
+    ).values_list("id", flat=True))
+    if post_ids:
+        SalePost.objects.filter(id__in=post_ids).update(effective_lat=lat, effective_lon=lon, geo_cell=cell)
+        record_salepost_changes(post_ids)
+
+
+@receiver(post_save, sender=SalePost)
+def index_salepost_text(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"post_title", "description"} & set(update_fields):
+        return
+    get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=SalePost)
+def remove_salepost_text(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(pre_save, sender=SalePost)
+def remember_salepost_scope(sender, instance, **kwargs):
+    # a post moved to another category/region leaves the cached lists of the old ones too
+    instance._previous_scope = (None, None)
+    if instance.pk is not None:
+        instance._previous_scope = SalePost.objects.filter(pk=instance.pk).values_list(
+            "category_id", "region_id"
+        ).first() or (None, None)
+
+
+@receiver(post_save, sender=SalePost)
+@receiver(post_delete, sender=SalePost)
+def invalidate_salepost_lists(sender, instance, **kwargs):
+    previous_category_id, previous_region_id = getattr(instance, "_previous_scope", (None, None))
+    invalidate_saleposts(
+        category_ids=[instance.category_id, previous_category_id],
+        region_ids=[instance.region_id, previous_region_id],
+    )
+
+
+@receiver(post_save, sender=SalePost)
+@receiver(post_delete, sender=SalePost)
+def mark_salepost_changed(sender, instance, **kwargs):
+    record_salepost_changes([instance.pk])
+
+
+@receiver(post_save, sender=SalePostAttribute)
+@receiver(post_delete, sender=SalePostAttribute)
+def mark_salepost_attributes_changed(sender, instance, **kwargs):
+    # shared attributes count in the similar posts score
+    record_salepost_changes([instance.salepost_id])
+
+
+@receiver(post_save, sender=SalePostAttribute)
+@receiver(post_delete, sender=SalePostAttribute)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def invalidate_salepost_related_lists(sender, instance, **kwargs):
+    post = SalePost.objects.filter(
+        pk=instance.salepost_id if sender is SalePostAttribute else instance.related_post_id
+    ).values_list("category_id", "region_id").first()
+    if post is not None:
+        invalidate_saleposts(category_ids=[post[0]], region_ids=[post[1]])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+def invalidate_tree_lists(sender, instance, **kwargs):
+    # reparenting changes descendant expansion, region centroids change distances
+    invalidate_all()
+
+
+@receiver(post_save, sender=SalePost)
+@receiver(post_delete, sender=SalePost)
+def refresh_salepost_home_feed(sender, instance, **kwargs):
+    schedule_home_feed_refresh([instance.pk])
+
+
+@receiver(post_save, sender=SalePostAttribute)
+@receiver(post_delete, sender=SalePostAttribute)
+def refresh_gender_home_feed(sender, instance, **kwargs):
+    if instance.attribute.unique_name == GENDER_ATTRIBUTE:
+        schedule_home_feed_refresh([instance.salepost_id])
+
+
+@receiver(post_save, sender=UsageRange)
+@receiver(post_delete, sender=UsageRange)
+def rebuild_usage_home_feed(sender, instance, **kwargs):
+    # segment bounds are usage range unique_ids, a renumbered range can move any post
+    transaction.on_commit(rebuild_home_feed)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def refresh_salepost_cover_image(sender, instance, **kwargs):
+    post = SalePost.objects.filter(pk=instance.related_post_id).first()
+    if post is not None:
+        post.refresh_cover_image()
@@ -0,0 +1,295 @@
+from collections import defaultdict
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.category.models import CategoryClosure, UsageRange
+from apps.salepost.models import SalePost, SalePostAttribute, SalePostNeighbour, PublishStatus
+from apps.salepost.changes import ChangeCheckpoint
+from apps.salepost.text_vectors import load_text_vectors
+
+from core.geo import haversine_vectorized, nearest_indices
+from core.vectors import cosine_top_k
+
+
+STATE_NAME = "similar"
+# share of each signal in the similarity score, every signal is in [0, 1]
+WEIGHTS = {"category": 0.35, "price": 0.15, "usage": 0.15, "attributes": 0.1, "distance": 0.1, "text": 0.15}
+# posts further apart in the category tree (edges through the closest common ancestor) never match
+MAX_CATEGORY_DISTANCE = 4
+DISTANCE_SCALE_KM = 50
+
+
+def _neighbour_count():
+    return getattr(settings, "SALEPOST_SIMILAR_NEIGHBOURS", 10)
+
+
+def _max_candidates():
+    return getattr(settings, "SALEPOST_SIMILAR_MAX_CANDIDATES", 5000)
+
+
+def _category_distances(category_ids):
+    """{category id: row index} and the tree distance matrix of the categories (inf when unrelated)."""
+    index = {pk: i for i, pk in enumerate(category_ids)}
+    distances = np.full((len(index), len(index)), np.inf)
+    below = defaultdict(list)
+    for ancestor_id, descendant_id, depth in CategoryClosure.objects.filter(
+        descendant_id__in=category_ids
+    ).values_list("ancestor_id", "descendant_id", "depth"):
+        below[ancestor_id].append((index[descendant_id], depth))
+    for subtree in below.values():
+        rows = np.array([i for i, _ in subtree])
+        depths = np.array([depth for _, depth in subtree], dtype=np.float64)
+        through = depths[:, None] + depths[None, :]
+        distances[np.ix_(rows, rows)] = np.minimum(distances[np.ix_(rows, rows)], through)
+    return index, distances
+
+
+class SimilarityIndex:
+    """
+    Columns of the published posts for scoring a post against its candidates with numpy. The
+    candidates of a post are the posts of the categories within MAX_CATEGORY_DISTANCE of its
+    own (the others never match), posts without a category only match each other. The score
+    is symmetric, which lets the incremental refresh find the posts whose neighbour lists a
+    changed post enters.
+
+    Neighbourhoods larger than SALEPOST_SIMILAR_MAX_CANDIDATES are cut down per post: half of
+    the candidates are the closest texts (cosine_top_k over the text vectors), half the
+    closest prices. Above that size the neighbours are approximate, and an incremental refresh
+    can differ from a rebuild where a changed text moves other posts in or out of a cut.
+    """
+
+    def __init__(self):
+        rows = list(
+            SalePost.objects.filter(post_status=PublishStatus.PUBLISHED).order_by("id").values_list(
+                "id", "category_id", "product_price", "min_usage__unique_id", "max_usage__unique_id",
+                "effective_lat", "effective_lon",
+            )
+        )
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.position = {pk: i for i, pk in enumerate(self.ids.tolist())}
+
+        category_ids = sorted({row[1] for row in rows if row[1] is not None})
+        category_index, self.category_distances = _category_distances(category_ids)
+        self.categories = np.array([category_index.get(row[1], -1) for row in rows], dtype=np.int64)
+        # positions of the posts of every category row, -1 for the posts without a category
+        members = defaultdict(list)
+        for i, category in enumerate(self.categories.tolist()):
+            members[category].append(i)
+        self.members = {category: np.array(positions, dtype=np.int64) for category, positions in members.items()}
+
+        self.prices = np.array([float(row[2]) if row[2] is not None else np.nan for row in rows])
+
+        # usage ranges as positions in unique_id order, open ends reach the first/last range
+        ordinals = {
+            unique_id: i for i, unique_id in enumerate(UsageRange.objects.order_by("unique_id").values_list("unique_id", flat=True))
+        }
+        last = max(len(ordinals) - 1, 0)
+        self.usage_low = np.array([
+            np.nan if row[3] is None and row[4] is None else ordinals.get(row[3], 0) for row in rows
+        ], dtype=np.float64)
+        self.usage_high = np.array([
+            np.nan if row[3] is None and row[4] is None else ordinals.get(row[4], last) for row in rows
+        ], dtype=np.float64)
+
+        self.lats = np.array([row[5] if row[5] is not None else np.nan for row in rows], dtype=np.float64)
+        self.lons = np.array([row[6] if row[6] is not None else np.nan for row in rows], dtype=np.float64)
+
+        # (attribute, value) pairs as integer codes, post i owns pair_codes[pair_offsets[i]:pair_offsets[i + 1]]
+        pairs = [[] for _ in rows]
+        codes = {}
+        for salepost_id, attribute_id, value in SalePostAttribute.objects.filter(
+            salepost__post_status=PublishStatus.PUBLISHED
+        ).values_list("salepost_id", "attribute_id", "value"):
+            i = self.position.get(salepost_id)
+            # published after the posts were read, it joins on the next refresh
+            if i is not None:
+                pairs[i].append(codes.setdefault((attribute_id, value), len(codes)))
+        self.attribute_counts = np.array([len(codes_of_post) for codes_of_post in pairs], dtype=np.float64)
+        self.pair_offsets = np.concatenate([[0], np.cumsum([len(codes_of_post) for codes_of_post in pairs])]).astype(np.int64)
+        self.pair_codes = np.array([code for codes_of_post in pairs for code in codes_of_post], dtype=np.int64)
+
+        # title/description vectors of `manage.py build_salepost_text_vectors`, zero (no match) when missing
+        self.text_vectors = load_text_vectors(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def neighbourhood(self, category):
+        """Sorted positions of the posts in the categories within MAX_CATEGORY_DISTANCE of category (a row, -1 for none)."""
+        if category < 0:
+            related = [-1]
+        else:
+            related = np.flatnonzero(self.category_distances[category] <= MAX_CATEGORY_DISTANCE).tolist()
+        parts = [self.members[row] for row in related if row in self.members]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def candidates(self, i):
+        return self.candidate_lists(self.neighbourhood(int(self.categories[i])), [i])[0]
+
+    def candidate_lists(self, neighbourhood, positions):
+        """Sorted candidate positions of each post in positions, out of its neighbourhood."""
+        limit = _max_candidates()
+        if len(neighbourhood) <= limit:
+            return [neighbourhood] * len(positions)
+        positions = np.asarray(positions, dtype=np.int64)
+        texts, _ = cosine_top_k(self.text_vectors[neighbourhood], self.text_vectors[positions], limit // 2)
+        # a window of the neighbourhood sorted by price (missing prices last) around each post
+        by_price = neighbourhood[np.argsort(self.prices[neighbourhood], kind="stable")]
+        width = limit - limit // 2
+        starts = np.searchsorted(self.prices[by_price], self.prices[positions]) - width // 2
+        starts = np.clip(starts, 0, len(by_price) - width)
+        return [
+            np.union1d(neighbourhood[text_rows], by_price[start:start + width])
+            for text_rows, start in zip(texts, starts.tolist())
+        ]
+
+    def _shared_attributes(self, i, candidates):
+        # gather the pair codes of every candidate, count those post i has too
+        own = self.pair_codes[self.pair_offsets[i]:self.pair_offsets[i + 1]]
+        starts = self.pair_offsets[candidates]
+        lengths = self.pair_offsets[candidates + 1] - starts
+        flat = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        owners = np.repeat(np.arange(len(candidates)), lengths)
+        return np.bincount(owners, weights=np.isin(self.pair_codes[flat], own), minlength=len(candidates))
+
+    def scores(self, i, candidates):
+        """Similarity of post i to the candidate posts (positions), -inf for post i itself."""
+        total = np.zeros(len(candidates))
+
+        category = self.categories[i]
+        if category >= 0:
+            total += WEIGHTS["category"] / (1 + self.category_distances[category, self.categories[candidates]])
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            prices = self.prices[candidates]
+            low, high = np.minimum(self.prices[i], prices), np.maximum(self.prices[i], prices)
+            # free items match each other, a missing price matches nothing
+            price = np.where(high > 0, low / high, np.where(high == 0, 1.0, np.nan))
+            total += WEIGHTS["price"] * np.nan_to_num(price, nan=0.0)
+
+            usage_low, usage_high = self.usage_low[candidates], self.usage_high[candidates]
+            overlap = np.minimum(self.usage_high[i], usage_high) - np.maximum(self.usage_low[i], usage_low) + 1
+            union = np.maximum(self.usage_high[i], usage_high) - np.minimum(self.usage_low[i], usage_low) + 1
+            total += WEIGHTS["usage"] * np.nan_to_num(np.clip(overlap, 0, None) / union, nan=0.0)
+
+            if self.attribute_counts[i]:
+                shared = self._shared_attributes(i, candidates)
+                jaccard = shared / (self.attribute_counts[i] + self.attribute_counts[candidates] - shared)
+                total += WEIGHTS["attributes"] * np.nan_to_num(jaccard, nan=0.0)
+
+            if not np.isnan(self.lats[i]):
+                kilometres = haversine_vectorized(self.lats[i], self.lons[i], self.lats[candidates], self.lons[candidates])
+                total += WEIGHTS["distance"] * np.nan_to_num(np.exp(-kilometres / DISTANCE_SCALE_KM), nan=0.0)
+
+        # cosine of the unit vectors, texts pointing away from each other count as unrelated
+        total += WEIGHTS["text"] * np.clip(self.text_vectors[candidates] @ self.text_vectors[i], 0, 1)
+
+        total[candidates == i] = -np.inf
+        return total
+
+    def neighbours(self, i, k, candidates=None):
+        """(salepost id, score) of the k most similar posts, newer posts first on equal scores."""
+        candidates = self.candidates(i) if candidates is None else candidates
+        scores = self.scores(i, candidates)
+        best = nearest_indices(scores, k, farthest=True, tiebreak=self.ids[candidates])
+        return [(int(self.ids[candidates[j]]), float(scores[j])) for j in best if np.isfinite(scores[j])]
+
+
+def _store(neighbours):
+    """Replace the stored neighbour rows of the posts, {salepost id: [(neighbour id, score), ...]}."""
+    SalePostNeighbour.objects.filter(salepost_id__in=list(neighbours)).delete()
+    SalePostNeighbour.objects.bulk_create(
+        [
+            SalePostNeighbour(salepost_id=salepost_id, neighbour_id=neighbour_id, rank=rank, score=score)
+            for salepost_id, rows in neighbours.items()
+            for rank, (neighbour_id, score) in enumerate(rows)
+        ],
+        batch_size=2000,
+    )
+
+
+def rebuild_neighbours(index=None, batch_size=500):
+    """Neighbours of every published post, scored against the candidates from its category neighbourhood."""
+    index = SimilarityIndex() if index is None else index
+    k = _neighbour_count()
+    with transaction.atomic():
+        SalePostNeighbour.objects.all().delete()
+        neighbours = {}
+        # the posts of a category share their neighbourhood
+        for category, members in index.members.items():
+            neighbourhood = index.neighbourhood(category)
+            for start in range(0, len(members), batch_size):
+                batch = members[start:start + batch_size]
+                for i, candidates in zip(batch.tolist(), index.candidate_lists(neighbourhood, batch)):
+                    neighbours[int(index.ids[i])] = index.neighbours(i, k, candidates)
+                if len(neighbours) >= batch_size:
+                    _store(neighbours)
+                    neighbours = {}
+        _store(neighbours)
+    return len(index)
+
+
+def refresh_neighbours(changed_ids, index=None):
+    """
+    Recompute the neighbours of the changed posts and of every post whose list they enter or
+    leave: a changed post enters the list of q when it scores at least the last stored neighbour
+    of q (scores are symmetric), and leaves it when q lists it already.
+    Returns the number of posts recomputed.
+    """
+    index = SimilarityIndex() if index is None else index
+    k = _neighbour_count()
+    changed_ids = set(changed_ids)
+
+    stored = defaultdict(list)
+    for salepost_id, neighbour_id, score in SalePostNeighbour.objects.order_by("salepost_id", "rank").values_list(
+        "salepost_id", "neighbour_id", "score"
+    ):
+        stored[salepost_id].append((neighbour_id, score))
+    floor = np.array([
+        stored[pk][-1][1] if len(stored[pk]) >= k else -np.inf for pk in index.ids.tolist()
+    ])
+
+    targets = {pk for pk in changed_ids if pk in index.position}
+    for salepost_id, rows in stored.items():
+        if any(neighbour_id in changed_ids for neighbour_id, _ in rows):
+            targets.add(salepost_id)
+    for pk in changed_ids:
+        if pk in index.position:
+            i = index.position[pk]
+            # every post of the neighbourhood, lists cut down to their closest candidates can hold it too
+            candidates = index.neighbourhood(int(index.categories[i]))
+            scores = index.scores(i, candidates)
+            targets.update(index.ids[candidates[scores >= floor[candidates]]].tolist())
+
+    with transaction.atomic():
+        # posts that are gone or no longer published keep no neighbours
+        SalePostNeighbour.objects.filter(salepost_id__in=[pk for pk in changed_ids if pk not in index.position]).delete()
+        _store({pk: index.neighbours(index.position[pk], k) for pk in targets if pk in index.position})
+    return len(targets)
+
+
+def run_neighbour_refresh(full=False):
+    """
+    Refresh from the SalePostChange markers written since the last run, or rebuild everything on
+    the first run, with full=True, or when markers this job had not read were pruned.
+    Returns (mode, number of posts).
+    """
+    checkpoint = ChangeCheckpoint(STATE_NAME)
+    changed = checkpoint.changed_ids(full)
+    if changed is None:
+        mode, count = "full", rebuild_neighbours()
+    else:
+        mode, count = "incremental", refresh_neighbours(changed) if changed else 0
+    checkpoint.save()
+    return mode, count
+
+
+def similar_salepost_ids(salepost, limit):
+    """Stored neighbours that are still published, ordered by rank."""
+    return list(
+        SalePostNeighbour.objects.filter(salepost=salepost, neighbour__post_status=PublishStatus.PUBLISHED)
+        .order_by("rank").values_list("neighbour_id", flat=True)[:limit]
+    )
@@ -1,3 +1,1158 @@
-from django.test import TestCase
+import io
+import itertools
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+import numpy as np
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+
+from apps.category.models import Attribute, AttributeChoice, Category, DataType, UsageRange
+from apps.category.schema import category_schema
+from apps.region.models import Region
+from apps.salepost.cache import cache_stats
+from apps.salepost.counters import ViewCounter, view_counter, viewer_sketches
+from apps.salepost.duplicates import (
+    BAND_BITS, BAND_FIELDS, BANDS, MAX_DISTANCE_LIMIT, _signed, hamming, hash_bands, near_duplicate_images,
+)
+from apps.salepost.feed import GENDER_ATTRIBUTE
+from apps.salepost.models import (
+    SalePost, SalePostAttribute, SalePostChange, SalePostNeighbour, SalePostTextVector, SalePostViewSketch,
+    HomeFeedSegment, Image, PublishStatus,
+)
+from apps.salepost.queries import nearby_saleposts
+from apps.salepost.search import IContainsSearchBackend, SQLiteFTS5SearchBackend, get_search_backend
+from apps.salepost.services import create_salepost_images, reorder_salepost_images
+from apps.salepost.similar import SimilarityIndex, rebuild_neighbours, run_neighbour_refresh
+from apps.salepost.text_vectors import vector_dimensions
+
+from core.geo import haversine_vectorized
+from core.storage import LocalImageStorage, get_image_storage, upload_files
+from core.vectors import vectorize_rows
+
+
+_post_ids = itertools.count(100000)
+
+
+class SalePostFixtures:
+    """Seller, category and region shared by the salepost tests, and a post factory using them."""
+
+    @classmethod
+    def create_fixtures(cls):
+        cls.seller = get_user_model().objects.create(username="seller")
+        cls.category = Category.objects.create(name="strollers")
+        cls.region = Region.objects.create(name="istanbul", latitude="41.0", longitude="29.0")
+
+    @classmethod
+    def create_post(cls, **fields):
+        """A published post of the shared seller, category and region unless fields say otherwise."""
+        fields = {
+            "post_id": next(_post_ids), "post_status": PublishStatus.PUBLISHED, "seller": cls.seller,
+            "category": cls.category, "region": cls.region, "post_title": "Stroller", "description": "",
+            "product_price": Decimal("10"), **fields,
+        }
+        return SalePost.objects.create(**fields)
+
+
+class UnmigratedTablesMixin:
+    """
+    Creates the tables of apps.message for the test class. Its migrations package is empty, so
+    the test database has none, and deleting a post fails on the conversation foreign key.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # schema changes cannot run inside the transaction of the TestCase
+        with connection.schema_editor() as editor:
+            for model in apps.get_app_config("message").get_models():
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            for model in apps.get_app_config("message").get_models():
+                editor.delete_model(model)
+
+
+class SalePostTestCase(SalePostFixtures, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+
+    def setUp(self):
+        # list results and schema versions are cached, the versions are bumped on commit,
+        # which never happens inside a TestCase
+        cache.clear()
+
+
+class SalePostUpdateAttributesTest(SalePostTestCase):
+    ATTRIBUTES = 24
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.seller.user_permissions.add(Permission.objects.get(codename="change_salepost"))
+        cls.attributes = []
+        for i in range(cls.ATTRIBUTES):
+            attribute = Attribute.objects.create(
+                unique_name=f"attribute_{i}",
+                display_name=f"Attribute {i}",
+                data_type=DataType.NUMBER if i % 2 else DataType.TEXT,
+                is_required=False,
+            )
+            attribute.categories.add(cls.category)
+            cls.attributes.append(attribute)
+        cls.salepost = cls.create_post(description="Good condition", product_price=Decimal("100"))
+
+    def setUp(self):
+        super().setUp()
+        category_schema(self.category.id)
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def payload(self, attributes, value):
+        data = {"post_title": "Stroller", "product_price": 120}
+        for attribute in attributes:
+            data[attribute.unique_name] = value if attribute.data_type == DataType.NUMBER else str(value)
+        return data
+
+    def update(self, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f"/api/salepost/{self.salepost.post_id}/", data, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_attributes(self):
+        # the first request also loads the permissions of the user
+        self.update(self.payload([], 0))
+        few = self.update(self.payload(self.attributes[:2], 1))
+        all_created = self.update(self.payload(self.attributes, 2))
+        all_updated = self.update(self.payload(self.attributes, 3))
+        self.assertEqual(few, all_created)
+        self.assertEqual(few, all_updated)
+
+    def rows(self):
+        rows = SalePostAttribute.objects.filter(salepost=self.salepost).order_by("attribute_id")
+        return [(row.attribute_id, row.value, row.number_value) for row in rows]
+
+    def test_sent_attributes_are_upserted_and_others_kept(self):
+        self.update(self.payload(self.attributes[:4], 5))
+        self.update(self.payload(self.attributes[2:3], 7))
+
+        self.assertEqual(self.rows(), [
+            (self.attributes[0].id, "5", None),
+            (self.attributes[1].id, "5", 5.0),
+            (self.attributes[2].id, "7", None),
+            (self.attributes[3].id, "5", 5.0),
+        ])
+        self.salepost.refresh_from_db()
+        self.assertEqual(self.salepost.product_price, Decimal("120"))
+
+    def test_update_without_attributes_keeps_them(self):
+        self.update(self.payload(self.attributes[:2], 5))
+        self.update({"post_title": "Renamed"})
+
+        self.assertEqual(len(self.rows()), 2)
+        self.salepost.refresh_from_db()
+        self.assertEqual(self.salepost.post_title, "Renamed")
+
+    def test_cleared_attributes_are_deleted(self):
+        self.update(self.payload(self.attributes[:3], 5))
+        self.update({self.attributes[0].unique_name: None, self.attributes[1].unique_name: ""})
+
+        self.assertEqual(self.rows(), [(self.attributes[2].id, "5", None)])
+
+    def test_required_attribute_cannot_be_cleared(self):
+        Attribute.objects.filter(pk=self.attributes[0].pk).update(is_required=True)
+        cache.clear()
+        self.update(self.payload(self.attributes[:1], 5))
+
+        response = self.client.put(
+            f"/api/salepost/{self.salepost.post_id}/", {self.attributes[0].unique_name: ""}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.rows()), 1)
+
+
+class SalePostHomeFeedTest(SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        gender = Attribute.objects.create(unique_name=GENDER_ATTRIBUTE, display_name="Gender", is_required=False)
+        cls.girl = AttributeChoice.objects.create(attribute=gender, value="Girl")
+        cls.posts = [cls.create_post(posted_at=timezone.now() - timezone.timedelta(days=i)) for i in range(3)]
+        SalePostAttribute.objects.create(salepost=cls.posts[1], attribute=gender, value=str(cls.girl.id))
+
+    def get(self, **params):
+        return self.client.get("/api/salepost/home/", params)
+
+    def post_ids(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        return [post["post_id"] for post in response.json()["data"]]
+
+    def test_home_feed_is_routed(self):
+        self.assertEqual(self.post_ids(self.get()), [post.post_id for post in self.posts])
+
+    def test_gender_by_label_or_id(self):
+        self.assertEqual(self.post_ids(self.get(gender="girl")), [self.posts[1].post_id])
+        self.assertEqual(self.post_ids(self.get(gender=str(self.girl.id))), [self.posts[1].post_id])
+
+    def test_unknown_gender_is_rejected_without_a_segment(self):
+        for value in ("robot", "999999"):
+            self.assertEqual(self.get(gender=value).status_code, 400)
+        self.assertFalse(HomeFeedSegment.objects.filter(gender__in=["robot", "999999"]).exists())
+
+    def test_saved_post_moves_into_the_feed(self):
+        self.get()
+        post = self.posts[2]
+        post.posted_at = timezone.now() + timezone.timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertEqual(self.post_ids(self.get())[0], post.post_id)
+
+
+class SalePostListQueryCountTest(SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.color = Attribute.objects.create(unique_name="color", display_name="Color", data_type=DataType.CHOICE)
+        cls.red = AttributeChoice.objects.create(attribute=cls.color, value="red")
+        cls.weight = Attribute.objects.create(unique_name="weight", display_name="Weight", data_type=DataType.NUMBER)
+
+    def create_posts(self, count):
+        for _ in range(count):
+            post = self.create_post()
+            SalePostAttribute.objects.create(salepost=post, attribute=self.color, value=str(self.red.id))
+            SalePostAttribute.objects.create(salepost=post, attribute=self.weight, value="7")
+            for position in range(2):
+                Image.objects.create(img=f"images/{post.id}-{position}.jpg", related_post=post, position=position)
+
+    def list_posts(self):
+        # the list result cache would skip the ordering queries on the second request
+        cache.clear()
+        response = self.client.get("/api/salepost/")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_query_count_does_not_grow_with_posts(self):
+        self.create_posts(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.list_posts()
+
+        self.create_posts(15)
+        with self.assertNumQueries(len(queries)):
+            posts = self.list_posts()
+
+        self.assertEqual(len(posts), 16)
+        self.assertEqual(
+            sorted((item["attribute"], item["value"]) for item in posts[0]["attributes"]),
+            [("color", "red"), ("weight", 7)],
+        )
+        self.assertEqual(len(posts[0]["images"]), 2)
+
+
+class SalePostOrderingTestCase(SalePostTestCase):
+    PRICES = [Decimal("30"), None, Decimal("10"), Decimal("30"), None, Decimal("20"), Decimal("10")]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        cls.posts = []
+        for i, price in enumerate(cls.PRICES):
+            cls.posts.append(cls.create_post(
+                product_price=price,
+                # every third post has no publish date, two pairs share one
+                posted_at=None if i % 3 == 2 else now - timezone.timedelta(days=i // 2),
+                # 0.01 degrees of latitude apart, about 1.1 km
+                latitude=41.0 + 0.01 * ((i * 3) % 7), longitude=29.0,
+            ))
+
+    def expected(self, key, descending=False, posts=None):
+        posts = self.posts if posts is None else posts
+        missing = sorted((post for post in posts if key(post) is None), key=lambda post: post.id)
+        present = sorted((post for post in posts if key(post) is not None), key=lambda post: (key(post), post.id))
+        ordered = present[::-1] + missing[::-1] if descending else missing + present
+        return [post.post_id for post in ordered]
+
+
+class SalePostCursorPaginationTest(SalePostOrderingTestCase):
+
+    def walk(self, **params):
+        """post ids of every page followed through the next links, limit 2."""
+        return self.walk_from("/api/salepost/?" + urlencode({"pagination": "cursor", "limit": 2, **params}))
+
+    def walk_from(self, url):
+        post_ids = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            self.assertLessEqual(len(data["results"]), 2)
+            post_ids.extend(post["post_id"] for post in data["results"])
+            url = data["next"]
+        return post_ids
+
+    def test_price_pages_include_posts_without_price(self):
+        price = lambda post: post.product_price
+        self.assertEqual(self.walk(sort_by="price"), self.expected(price))
+        self.assertEqual(self.walk(sort_by="price", order="desc"), self.expected(price, descending=True))
+
+    def test_published_at_pages_include_posts_without_date(self):
+        posted_at = lambda post: post.posted_at
+        self.assertEqual(self.walk(sort_by="published_at"), self.expected(posted_at))
+        self.assertEqual(self.walk(sort_by="published_at", order="desc"), self.expected(posted_at, descending=True))
+
+    def test_distance_pages(self):
+        distance = lambda post: post.latitude
+        location = {"user_latitude": 41.0, "user_longitude": 29.0}
+        self.assertEqual(self.walk(sort_by="distance", **location), self.expected(distance))
+        self.assertEqual(
+            self.walk(sort_by="distance", order="desc", **location), self.expected(distance, descending=True)
+        )
+
+    def test_distance_filter_pages_by_price(self):
+        nearby = [post for post in self.posts if post.latitude < 41.035]
+        walked = self.walk(sort_by="price", max_distance=4, user_latitude=41.0, user_longitude=29.0)
+        self.assertEqual(walked, self.expected(lambda post: post.product_price, posts=nearby))
+
+    def test_posts_added_meanwhile_do_not_shift_pages(self):
+        params = {"pagination": "cursor", "limit": 2, "sort_by": "price", "order": "desc"}
+        response = self.client.get("/api/salepost/", params)
+        first_page = [post["post_id"] for post in response.json()["results"]]
+        # sorts before the served page, an offset would serve the last post of that page again
+        self.create_post(product_price=Decimal("40"))
+        cache.clear()
+        rest = self.walk_from(response.json()["next"])
+        self.assertEqual(first_page + rest, self.expected(lambda post: post.product_price, descending=True))
+
+    def test_cursor_of_another_ordering_is_rejected(self):
+        response = self.client.get("/api/salepost/", {"pagination": "cursor", "limit": 2, "sort_by": "price"})
+        cursor = response.json()["next"].split("cursor=")[1]
+        self.assertEqual(self.client.get("/api/salepost/", {"cursor": cursor, "sort_by": "published_at"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/salepost/", {"cursor": "not-a-cursor"}).status_code, 400)
+
+
+class SalePostSearchTest(UnmigratedTablesMixin, SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.stroller = cls.create_post(post_title="Bebek Arabası", description="Az kullanılmış, İSTANBUL teslim")
+        cls.cot = cls.create_post(post_title="Ahşap beşik", description="Sallanan model")
+        cls.bike = cls.create_post(post_title="Çocuk bisikleti", description="ab 12 jant")
+
+    def search(self, keyword):
+        return set(get_search_backend().filter(SalePost.objects.all(), keyword).values_list("id", flat=True))
+
+    def indexed(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT post_title, description FROM {SQLiteFTS5SearchBackend.table} WHERE rowid = %s", [post.id])
+            return cursor.fetchone()
+
+    def test_sqlite_uses_the_fts5_index(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTS5SearchBackend)
+        self.assertEqual(self.indexed(self.stroller), ("bebek arabası", "az kullanılmış, istanbul teslim"))
+
+    def test_substrings_in_any_case(self):
+        self.assertEqual(self.search("arab"), {self.stroller.id})
+        self.assertEqual(self.search("İstanbul"), {self.stroller.id})
+        self.assertEqual(self.search("BEŞİK"), {self.cot.id})
+        self.assertEqual(self.search("model"), {self.cot.id})
+        self.assertEqual(self.search("be"), {self.stroller.id, self.cot.id})
+
+    def test_same_posts_as_icontains_for_ascii_keywords(self):
+        for keyword in ("bebek", "ebe", "kullan", "jant", "an", "12 j", "yok"):
+            with self.subTest(keyword=keyword):
+                expected = IContainsSearchBackend().filter(SalePost.objects.all(), keyword).values_list("id", flat=True)
+                self.assertEqual(self.search(keyword), set(expected))
+
+    def test_title_update_is_reindexed(self):
+        self.stroller.post_title = "İkiz puset"
+        self.stroller.save()
+        self.assertEqual(self.indexed(self.stroller)[0], "ikiz puset")
+        self.assertEqual(self.search("puset"), {self.stroller.id})
+        self.assertEqual(self.search("arabası"), set())
+
+    def test_deleted_post_leaves_the_index(self):
+        self.cot.delete()
+        self.assertIsNone(self.indexed(self.cot))
+        self.assertEqual(self.search("beşik"), set())
+
+    def test_short_keywords_fall_back_to_icontains(self):
+        # "ab" is shorter than a trigram, the FTS table is not read and the spaces are dropped like for it
+        queryset = get_search_backend().filter(SalePost.objects.all(), " ab ")
+        self.assertNotIn(SQLiteFTS5SearchBackend.table, str(queryset.query))
+        self.assertEqual(set(queryset.values_list("id", flat=True)), {self.stroller.id, self.bike.id})
+
+    def test_list_keyword_filter(self):
+        response = self.client.get("/api/salepost/", {"keyword": "ARABASI"})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([item["post_id"] for item in response.json()["results"]], [self.stroller.post_id])
+
+
+class SalePostNearbyTest(SalePostTestCase):
+    # (lat, lon, radius km): on a grid cell corner, near the pole, across the antimeridian
+    CENTERS = [(41.0, 29.0, 10), (89.9, 45.0, 30), (0.0, 179.98, 20)]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        rng = random.Random(5)
+        for lat, lon, radius_km in cls.CENTERS:
+            # up to twice the radius away in latitude, longitude spans widen towards the pole
+            span = 2 * radius_km / 111.2
+            for _ in range(60):
+                point_lat = min(max(lat + rng.uniform(-span, span), -90.0), 90.0)
+                point_lon = (lon + rng.uniform(-span, span) / max(math.cos(math.radians(point_lat)), 0.01) + 180) % 360 - 180
+                cls.create_post(latitude=point_lat, longitude=point_lon)
+        # no own coordinates: the istanbul centroid, or nothing at all
+        cls.centroid_post = cls.create_post()
+        cls.unplaced_post = cls.create_post(region=Region.objects.create(name="nowhere"))
+
+    def brute_force(self, lat, lon, radius_km):
+        posts = SalePost.objects.exclude(effective_lat=None).values_list("id", "effective_lat", "effective_lon")
+        distances = {
+            pk: float(haversine_vectorized(lat, lon, np.array([post_lat]), np.array([post_lon]))[0])
+            for pk, post_lat, post_lon in posts
+        }
+        return {pk: distance for pk, distance in distances.items() if radius_km is None or distance <= radius_km}
+
+    def nearby(self, lat, lon, radius_km):
+        found = nearby_saleposts(SalePost.objects.filter(post_status=PublishStatus.PUBLISHED), lat, lon, radius_km)
+        return dict(zip(found.ids.tolist(), found.distances.tolist()))
+
+    def test_prefilter_matches_a_full_scan(self):
+        for lat, lon, radius_km in self.CENTERS:
+            with self.subTest(lat=lat, lon=lon):
+                expected = self.brute_force(lat, lon, radius_km)
+                found = self.nearby(lat, lon, radius_km)
+                self.assertGreater(len(expected), 5)
+                self.assertEqual(found.keys(), expected.keys())
+                for pk, distance in expected.items():
+                    self.assertAlmostEqual(found[pk], distance, places=6)
+
+    def test_posts_without_coordinates(self):
+        self.assertIn(self.centroid_post.id, self.nearby(41.0, 29.0, 1))
+        everything = self.nearby(41.0, 29.0, None)
+        self.assertEqual(everything.keys(), self.brute_force(41.0, 29.0, None).keys())
+        self.assertNotIn(self.unplaced_post.id, everything)
+
+
+# without the result cache every page is read with LIMIT/OFFSET from the ordered id query
+@override_settings(SALEPOST_LIST_CACHE_TIMEOUT=0)
+class SalePostPageOrderingTest(SalePostOrderingTestCase):
+
+    def page(self, number, **params):
+        response = self.client.get("/api/salepost/", {"limit": 2, "page": number, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, **params):
+        """post ids of every page, limit 2."""
+        post_ids, number = [], 1
+        while True:
+            data = self.page(number, **params)
+            post_ids.extend(post["post_id"] for post in data["results"])
+            if data["next"] is None:
+                return post_ids
+            number += 1
+
+    def test_missing_values_sort_as_the_smallest(self):
+        price = lambda post: post.product_price
+        self.assertEqual(self.walk(sort_by="price"), self.expected(price))
+        self.assertEqual(self.walk(sort_by="price", order="desc"), self.expected(price, descending=True))
+        posted_at = lambda post: post.posted_at
+        self.assertEqual(self.walk(sort_by="published_at"), self.expected(posted_at))
+        self.assertEqual(self.walk(sort_by="published_at", order="desc"), self.expected(posted_at, descending=True))
+
+    def test_offset_pages_split_equal_keys_by_id(self):
+        # posts 0 and 3 both cost 30 and fall on pages 3 and 4, the id decides which comes first
+        expected = self.expected(lambda post: post.product_price)
+        for number in range(1, 5):
+            data = self.page(number, sort_by="price")
+            self.assertEqual(data["count"], len(self.PRICES))
+            self.assertEqual([post["post_id"] for post in data["results"]], expected[2 * (number - 1):2 * number])
+
+    @override_settings(SALEPOST_LIST_COUNT_LIMIT=5)
+    def test_count_stops_at_the_limit(self):
+        data = self.page(1, sort_by="price")
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(self.page(3, sort_by="price")["next"], None)
+        self.assertEqual(self.client.get("/api/salepost/", {"limit": 2, "page": 4}).status_code, 404)
+
+    @override_settings(SALEPOST_LIST_COUNT_LIMIT=5, SALEPOST_LIST_CACHE_TIMEOUT=60, SALEPOST_LIST_CACHE_MAX_IDS=3)
+    def test_cached_count_stops_at_the_limit(self):
+        for _ in range(2):
+            self.assertEqual(self.page(1, sort_by="price")["count"], 5)
+        self.assertEqual(cache_stats()["hits"], 1)
+
+
+@override_settings(SALEPOST_LIST_CACHE_TIMEOUT=60)
+class SalePostListCacheTest(SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # baby > strollers, toys and istanbul > kadikoy, ankara
+        cls.strollers, cls.istanbul = cls.category, cls.region
+        cls.baby = Category.objects.create(name="baby")
+        cls.strollers.parent = cls.baby
+        cls.strollers.save()
+        cls.toys = Category.objects.create(name="toys")
+        cls.kadikoy = Region.objects.create(name="kadikoy", parent=cls.istanbul, latitude="40.99", longitude="29.03")
+        cls.ankara = Region.objects.create(name="ankara", latitude="39.9", longitude="32.8")
+        cls.stroller = cls.create_post(region=cls.kadikoy, product_price=Decimal("100"))
+        cls.doll = cls.create_post(category=cls.toys, region=cls.ankara, post_title="Doll", product_price=Decimal("20"))
+
+    def post_ids(self, **params):
+        response = self.client.get("/api/salepost/", {"sort_by": "price", **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [post["post_id"] for post in response.json()["results"]]
+
+    def stats(self):
+        return cache_stats()["hits"], cache_stats()["misses"]
+
+    def save(self, instance):
+        # versions are bumped on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save()
+
+    def test_repeated_query_is_a_hit(self):
+        self.post_ids(category_ids=self.baby.id)
+        # only the page is read: posts, attributes and images, no ordering or count
+        with self.assertNumQueries(3):
+            self.assertEqual(self.post_ids(category_ids=self.baby.id), [self.stroller.post_id])
+        self.assertEqual(self.stats(), (1, 1))
+
+    def test_new_post_in_a_subcategory(self):
+        self.assertEqual(self.post_ids(category_ids=self.baby.id), [self.stroller.post_id])
+        with self.captureOnCommitCallbacks(execute=True):
+            carrier = self.create_post(post_title="Carrier", product_price=Decimal("50"))
+        self.assertEqual(self.post_ids(category_ids=self.baby.id), [carrier.post_id, self.stroller.post_id])
+
+    def test_write_elsewhere_keeps_the_entry(self):
+        self.post_ids(category_ids=self.baby.id)
+        self.doll.product_price = Decimal("25")
+        self.save(self.doll)
+        self.post_ids(category_ids=self.baby.id)
+        self.assertEqual(self.stats(), (1, 1))
+
+    def test_post_changes_reorder_the_unscoped_list(self):
+        self.assertEqual(self.post_ids(), [self.doll.post_id, self.stroller.post_id])
+        self.stroller.product_price = Decimal("10")
+        self.save(self.stroller)
+        self.assertEqual(self.post_ids(), [self.stroller.post_id, self.doll.post_id])
+
+    def test_post_moved_to_another_category_or_region(self):
+        self.assertEqual(self.post_ids(category_ids=self.baby.id), [self.stroller.post_id])
+        self.assertEqual(self.post_ids(region_ids=self.istanbul.id), [self.stroller.post_id])
+        self.stroller.category = self.toys
+        self.stroller.region = self.ankara
+        self.save(self.stroller)
+        self.assertEqual(self.post_ids(category_ids=self.baby.id), [])
+        self.assertEqual(self.post_ids(region_ids=self.istanbul.id), [])
+
+    def test_category_reparent(self):
+        self.assertEqual(self.post_ids(category_ids=self.baby.id), [self.stroller.post_id])
+        self.strollers.parent = self.toys
+        self.save(self.strollers)
+        self.assertEqual(self.post_ids(category_ids=self.baby.id), [])
+        self.assertEqual(self.post_ids(category_ids=self.toys.id), [self.doll.post_id, self.stroller.post_id])
+
+    def test_region_reparent_and_centroid(self):
+        self.assertEqual(self.post_ids(region_ids=self.istanbul.id), [self.stroller.post_id])
+        self.kadikoy.parent = self.ankara
+        self.save(self.kadikoy)
+        self.assertEqual(self.post_ids(region_ids=self.istanbul.id), [])
+
+        location = {"user_latitude": 39.9, "user_longitude": 32.8, "max_distance": 10}
+        self.assertEqual(self.post_ids(**location), [self.doll.post_id])
+        self.kadikoy.latitude, self.kadikoy.longitude = "39.92", "32.85"
+        self.save(self.kadikoy)
+        self.assertEqual(self.post_ids(**location), [self.doll.post_id, self.stroller.post_id])
+
+
+class SalePostAttributeFilterTest(SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.color = Attribute.objects.create(unique_name="color", display_name="Color", data_type=DataType.CHOICE)
+        cls.red = AttributeChoice.objects.create(attribute=cls.color, value="Red")
+        cls.blue = AttributeChoice.objects.create(attribute=cls.color, value="Blue")
+        weight = Attribute.objects.create(unique_name="weight", display_name="Weight", data_type=DataType.NUMBER)
+        brand = Attribute.objects.create(unique_name="brand", display_name="Brand", data_type=DataType.TEXT)
+        # (color, weight, brand) of each post, None when the post has no such attribute
+        rows = [(cls.red, "5", "chicco"), (cls.blue, "8", "joie"), (cls.red, "12", "joie"), (None, None, None)]
+        cls.posts = []
+        for i, (color, weight_value, brand_value) in enumerate(rows):
+            post = cls.create_post(product_price=Decimal(10 + i))
+            for attribute, value in ((cls.color, color and str(color.id)), (weight, weight_value), (brand, brand_value)):
+                if value is not None:
+                    SalePostAttribute.objects.create(salepost=post, attribute=attribute, value=value)
+            cls.posts.append(post.post_id)
+
+    def get(self, params):
+        return self.client.get("/api/salepost/", {"sort_by": "price", **params})
+
+    def post_ids(self, **params):
+        response = self.get(params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [post["post_id"] for post in response.json()["results"]]
+
+    def test_choice_by_id_or_label(self):
+        red = [self.posts[0], self.posts[2]]
+        self.assertEqual(self.post_ids(**{"attr.color": str(self.red.id)}), red)
+        self.assertEqual(self.post_ids(**{"attr.color": "red"}), red)
+        self.assertEqual(self.post_ids(**{"attr.color": f"{self.blue.id}, RED"}), self.posts[:3])
+
+    def test_number_values_and_range(self):
+        self.assertEqual(self.post_ids(**{"attr.weight": "8,12.0"}), self.posts[1:3])
+        self.assertEqual(self.post_ids(**{"attr.weight.min": "6"}), self.posts[1:3])
+        self.assertEqual(self.post_ids(**{"attr.weight.max": "8"}), self.posts[:2])
+        self.assertEqual(self.post_ids(**{"attr.weight.min": "6", "attr.weight.max": "10"}), [self.posts[1]])
+
+    def test_text_values(self):
+        self.assertEqual(self.post_ids(**{"attr.brand": "joie"}), self.posts[1:3])
+
+    def test_filters_are_combined(self):
+        self.assertEqual(self.post_ids(**{"attr.color": "red", "attr.brand": "joie"}), [self.posts[2]])
+        self.assertEqual(self.post_ids(**{"attr.color": "blue", "attr.weight.min": "10"}), [])
+
+    def test_empty_filter_is_ignored(self):
+        self.assertEqual(self.post_ids(**{"attr.color": ""}), self.posts)
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({"attr.size": "3"}, {"attr.brand.min": "1"}, {"attr.weight": "heavy"}, {"attr.weight.max": "x"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(params).status_code, 400)
+
+
+class SalePostFacetsTest(SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.strollers, cls.istanbul = cls.category, cls.region
+        cls.toys = Category.objects.create(name="toys")
+        cls.ankara = Region.objects.create(name="ankara", latitude="39.9", longitude="32.8")
+        cls.usage = [UsageRange.objects.create(unique_id=i, name=f"range {i}") for i in (1, 2, 3)]
+        color = Attribute.objects.create(unique_name="color", display_name="Color", data_type=DataType.CHOICE)
+        cls.red = AttributeChoice.objects.create(attribute=color, value="Red")
+        cls.blue = AttributeChoice.objects.create(attribute=color, value="Blue")
+        # (category, region, price, min usage, max usage, color, status)
+        rows = [
+            (cls.strollers, cls.istanbul, "50", 0, 1, cls.red, PublishStatus.PUBLISHED),
+            (cls.strollers, cls.istanbul, "120", 1, None, cls.red, PublishStatus.PUBLISHED),
+            (cls.toys, cls.ankara, "300", None, None, cls.blue, PublishStatus.PUBLISHED),
+            (cls.toys, cls.istanbul, None, None, 0, None, PublishStatus.PUBLISHED),
+            (cls.strollers, cls.ankara, "80", 0, 2, cls.blue, PublishStatus.SOLD),
+        ]
+        for i, (category, region, price, min_usage, max_usage, choice, post_status) in enumerate(rows):
+            post = cls.create_post(
+                post_status=post_status, category=category, region=region, product_price=price and Decimal(price),
+                min_usage=None if min_usage is None else cls.usage[min_usage],
+                max_usage=None if max_usage is None else cls.usage[max_usage],
+            )
+            if choice is not None:
+                SalePostAttribute.objects.create(salepost=post, attribute=color, value=str(choice.id))
+
+    def facets(self, **params):
+        response = self.client.get("/api/salepost/facets/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]
+
+    def test_counts_of_published_posts(self):
+        facets = self.facets()
+
+        self.assertEqual(facets["total"], 4)
+        self.assertEqual(facets["categories"], [
+            {"id": self.strollers.id, "name": "strollers", "count": 2},
+            {"id": self.toys.id, "name": "toys", "count": 2},
+        ])
+        self.assertEqual(facets["regions"], [
+            {"id": self.istanbul.id, "name": "istanbul", "count": 3},
+            {"id": self.ankara.id, "name": "ankara", "count": 1},
+        ])
+        # a post counts in every range between its min and max usage, open ends included
+        self.assertEqual([item["count"] for item in facets["usage_ranges"]], [2, 2, 1])
+        self.assertEqual(
+            [(item["min"], item["max"], item["count"]) for item in facets["price_buckets"][:4]],
+            [(0, 100, 1), (100, 250, 1), (250, 500, 1), (500, 1000, 0)],
+        )
+        self.assertEqual(facets["attributes"], [{"attribute": "color", "values": [
+            {"id": self.red.id, "value": "Red", "count": 2},
+            {"id": self.blue.id, "value": "Blue", "count": 1},
+        ]}])
+
+    def test_counts_follow_the_filters(self):
+        facets = self.facets(category_ids=self.strollers.id)
+
+        self.assertEqual(facets["total"], 2)
+        self.assertEqual(facets["regions"], [{"id": self.istanbul.id, "name": "istanbul", "count": 2}])
+        self.assertEqual(facets["attributes"][0]["values"], [{"id": self.red.id, "value": "Red", "count": 2}])
+
+        facets = self.facets(**{"attr.color": "blue"})
+        self.assertEqual(facets["total"], 1)
+        self.assertEqual(facets["categories"], [{"id": self.toys.id, "name": "toys", "count": 1}])
+
+    @override_settings(SALEPOST_FACET_PRICE_BUCKETS=[0, 100])
+    def test_configured_price_buckets(self):
+        self.assertEqual(self.facets()["price_buckets"], [
+            {"min": 0, "max": 100, "count": 1},
+            {"min": 100, "max": None, "count": 2},
+        ])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get("/api/salepost/facets/", {"attr.size": "3"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SalePostChangePruneTest(SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.salepost = cls.create_post()
+
+    def setUp(self):
+        super().setUp()
+        SalePostChange.objects.all().delete()
+        self.expired = SalePostChange.objects.create(
+            salepost_id=self.salepost.id, changed_at=timezone.now() - timezone.timedelta(hours=25)
+        )
+
+    def save_post(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salepost.save()
+
+    def test_markers_are_written_with_the_catalog_disabled(self):
+        with override_settings(SALEPOST_CATALOG_ENABLED=False):
+            self.save_post()
+        self.assertEqual(SalePostChange.objects.exclude(pk=self.expired.pk).count(), 1)
+
+    @override_settings(SALEPOST_CHANGE_PRUNE_SECONDS=0)
+    def test_writes_prune_expired_markers(self):
+        self.save_post()
+        self.assertFalse(SalePostChange.objects.filter(pk=self.expired.pk).exists())
+        self.assertEqual(SalePostChange.objects.count(), 1)
+
+    def test_writes_prune_once_per_interval(self):
+        self.save_post()
+        self.assertTrue(SalePostChange.objects.filter(pk=self.expired.pk).exists())
+
+
+class FailingImageStorage(LocalImageStorage):
+    """Local files, except that upload number fail_on (counted from 1 across threads) raises."""
+
+    fail_on = None
+
+    def __init__(self, latency=None):
+        super().__init__(latency)
+        self.uploads = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def upload(self, file):
+        with self.lock:
+            number = next(self.uploads)
+        if number == self.fail_on:
+            raise OSError(f"upload {number} failed")
+        return super().upload(file)
+
+
+@override_settings(IMAGE_STORAGE_BACKEND="apps.salepost.tests.FailingImageStorage", IMAGE_RENDITION_WORKERS=0)
+class SalePostImageTestCase(SalePostTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        get_image_storage.cache_clear()
+        self.addCleanup(get_image_storage.cache_clear)
+        self.storage = get_image_storage()
+        self.post = self.create_post()
+
+    def files(self, count):
+        # distinct bytes, otherwise the batch would be deduplicated
+        return [SimpleUploadedFile(f"{i}.jpg", f"image {i}".encode()) for i in range(count)]
+
+    def stored_files(self):
+        return os.listdir(self.storage.root) if os.path.isdir(self.storage.root) else []
+
+    def fail_on(self, number):
+        self.storage.fail_on = number
+        self.storage.uploads = itertools.count(1)
+
+
+
+class SalePostImageUploadTest(SalePostImageTestCase):
+
+    def assertNothingLeft(self):
+        self.assertFalse(Image.objects.filter(related_post=self.post).exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_uploads_are_stored_in_file_order(self):
+        images = create_salepost_images(self.post, self.files(4))
+
+        self.assertEqual([image.position for image in images], [0, 1, 2, 3])
+        self.assertEqual([self.storage.read(image.img) for image in images], [f"image {i}".encode() for i in range(4)])
+        self.assertEqual(len(self.stored_files()), 4)
+
+    def test_failed_upload_deletes_the_others(self):
+        for number in (1, 3, 4):
+            with self.subTest(fail_on=number):
+                self.fail_on(number)
+                with self.assertRaises(OSError):
+                    create_salepost_images(self.post, self.files(4))
+                self.assertNothingLeft()
+
+    def test_failed_insert_deletes_the_uploads(self):
+        with mock.patch.object(Image.objects, "bulk_create", side_effect=IntegrityError("insert failed")):
+            with self.assertRaises(IntegrityError):
+                create_salepost_images(self.post, self.files(3))
+        self.assertNothingLeft()
+
+    def test_renditions_are_stored_after_commit(self):
+        output = io.BytesIO()
+        PILImage.new("RGB", (1200, 900), "red").save(output, "PNG")
+        with self.captureOnCommitCallbacks(execute=True):
+            [image] = create_salepost_images(self.post, [SimpleUploadedFile("photo.png", output.getvalue())])
+
+        image.refresh_from_db()
+        self.assertTrue(image.thumbnail_url.startswith(settings.MEDIA_URL))
+        self.assertTrue(image.medium_url.startswith(settings.MEDIA_URL))
+        self.assertEqual(len(self.stored_files()), 3)
+
+    def test_failed_renditions_are_logged(self):
+        with self.assertLogs("apps.salepost.renditions", "ERROR") as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                [image] = create_salepost_images(self.post, self.files(1))
+
+        image.refresh_from_db()
+        self.assertEqual((image.thumbnail_url, image.medium_url), ("", ""))
+        self.assertIn(f"Renditions of image {image.id} failed", logs.output[0])
+
+    def test_upload_files_on_fewer_workers_than_files(self):
+        files = self.files(5)
+        stored = upload_files(files, self.storage, workers=2)
+        self.assertEqual([self.storage.read(value) for value in stored], [file.read() for file in self.files(5)])
+
+        self.fail_on(2)
+        with self.assertRaises(OSError):
+            upload_files(self.files(5), self.storage, workers=2)
+        self.assertEqual(sorted(self.stored_files()), sorted(os.path.basename(value) for value in stored))
+
+
+class SalePostCoverImageTest(SalePostImageTestCase):
+
+    def cover_id(self, post=None):
+        return SalePost.objects.values_list("cover_image_id", flat=True).get(pk=(post or self.post).pk)
+
+    def test_first_image_of_the_first_batch(self):
+        self.assertIsNone(self.cover_id())
+        first = create_salepost_images(self.post, self.files(2))
+        self.assertEqual(self.cover_id(), first[0].id)
+        # later batches go after the existing images
+        create_salepost_images(self.post, self.files(3)[2:])
+        self.assertEqual(self.cover_id(), first[0].id)
+
+    def test_images_saved_one_by_one(self):
+        image = Image.objects.create(img="images/one.jpg", related_post=self.post, position=1)
+        self.assertEqual(self.cover_id(), image.id)
+        before = Image.objects.create(img="images/two.jpg", related_post=self.post, position=0)
+        self.assertEqual(self.cover_id(), before.id)
+
+    def test_deleted_cover_moves_to_the_next_image(self):
+        images = create_salepost_images(self.post, self.files(3))
+        images[0].delete()
+        self.assertEqual(self.cover_id(), images[1].id)
+        images[2].delete()
+        images[1].delete()
+        self.assertIsNone(self.cover_id())
+
+    def test_reorder_moves_the_cover(self):
+        images = create_salepost_images(self.post, self.files(3))
+        reorder_salepost_images(self.post, [images[2].id, images[0].id])
+        self.assertEqual(self.cover_id(), images[2].id)
+        self.assertEqual(
+            list(Image.objects.filter(related_post=self.post).order_by("position").values_list("id", flat=True)),
+            [images[2].id, images[0].id, images[1].id],
+        )
+
+    def list_cards(self):
+        cache.clear()
+        response = self.client.get("/api/salepost/", {"view": "card"})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_card_query_count_does_not_grow_with_posts(self):
+        create_salepost_images(self.post, self.files(2))
+        with CaptureQueriesContext(connection) as queries:
+            self.list_cards()
+
+        covers = {self.post.post_id: self.cover_id()}
+        for _ in range(10):
+            post = self.create_post()
+            create_salepost_images(post, self.files(2))
+            covers[post.post_id] = self.cover_id(post)
+        covers[self.create_post().post_id] = None
+        with self.assertNumQueries(len(queries)):
+            cards = self.list_cards()
+
+        self.assertEqual(len(cards), 12)
+        self.assertEqual({card["post_id"]: card["cover_image"] and card["cover_image"]["id"] for card in cards}, covers)
+
+
+class SalePostNearDuplicateTest(SalePostImageTestCase):
+    BASE = 0x9E3779B97F4A7C15
+
+    @staticmethod
+    def spread(value, distance):
+        """value with distance bits flipped round robin over the bands, the closest band differs in distance // BANDS bits."""
+        for i in range(distance):
+            value ^= 1 << ((i % BANDS) * BAND_BITS + i // BANDS)
+        return value
+
+    def create_image(self, value):
+        fields = {"perceptual_hash": _signed(value), **dict(zip(BAND_FIELDS, hash_bands(value)))}
+        return Image.objects.create(img=f"images/{value:x}.jpg", related_post=self.post, **fields)
+
+    def brute_force(self, value, distance):
+        distance = min(distance, MAX_DISTANCE_LIMIT)
+        matches = [
+            (image, hamming(_signed(value), image.perceptual_hash))
+            for image in Image.objects.exclude(perceptual_hash=None)
+        ]
+        return sorted(
+            [(image.id, d) for image, d in matches if d <= distance], key=lambda match: (match[1], match[0])
+        )
+
+    def test_matches_a_full_scan(self):
+        rng = random.Random(7)
+        for distance in range(MAX_DISTANCE_LIMIT + 3):
+            self.create_image(self.spread(self.BASE, distance))
+            # every flipped bit in one band, the other bands match exactly
+            self.create_image(self.BASE ^ ((1 << distance) - 1))
+        for _ in range(40):
+            bits = rng.sample(range(64), rng.randint(0, 16))
+            self.create_image(self.BASE ^ sum(1 << bit for bit in bits))
+        for _ in range(20):
+            self.create_image(rng.getrandbits(64))
+        Image.objects.create(img="images/unreadable.jpg", related_post=self.post)
+
+        for distance in range(MAX_DISTANCE_LIMIT + 3):
+            with self.subTest(distance=distance):
+                found = near_duplicate_images(_signed(self.BASE), distance)
+                self.assertEqual([(image.id, d) for image, d in found], self.brute_force(self.BASE, distance))
+
+    def test_band_radius_boundary(self):
+        # at distance BANDS * r every band differs in exactly r bits, the band lookup radius
+        for radius in range(1, MAX_DISTANCE_LIMIT // BANDS + 1):
+            distance = BANDS * radius
+            image = self.create_image(self.spread(self.BASE, distance))
+            with self.subTest(radius=radius):
+                self.assertIn((image, distance), near_duplicate_images(_signed(self.BASE), distance))
+                self.assertNotIn(image, [found for found, _ in near_duplicate_images(_signed(self.BASE), distance - 1)])
+
+    def test_distance_is_capped(self):
+        inside = self.create_image(self.spread(self.BASE, MAX_DISTANCE_LIMIT))
+        self.create_image(self.spread(self.BASE, MAX_DISTANCE_LIMIT + 1))
+        self.assertEqual(near_duplicate_images(_signed(self.BASE), 64), [(inside, MAX_DISTANCE_LIMIT)])
+
+    def test_identical_upload_reuses_the_file(self):
+        [first] = create_salepost_images(self.post, self.files(1))
+        Image.objects.filter(pk=first.pk).update(thumbnail_url="/media/thumb.jpg", medium_url="/media/medium.jpg")
+        other_post = self.create_post()
+        [second] = create_salepost_images(other_post, self.files(1))
+
+        self.assertEqual(len(self.stored_files()), 1)
+        # both rows point at the one stored file
+        urls = {image.get_url for image in Image.objects.filter(pk__in=[first.pk, second.pk])}
+        self.assertEqual(urls, {self.storage.url(first.img)})
+        self.assertEqual((second.thumbnail_url, second.medium_url), ("/media/thumb.jpg", "/media/medium.jpg"))
+
+    def test_admin_view_uses_the_default_distance(self):
+        admin = get_user_model().objects.create(username="admin", is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        image = self.create_image(self.BASE)
+        other_post = self.create_post()
+        duplicate = Image.objects.create(
+            img="images/other.jpg", related_post=other_post, perceptual_hash=_signed(self.spread(self.BASE, 6)),
+            **dict(zip(BAND_FIELDS, hash_bands(self.spread(self.BASE, 6)))),
+        )
+
+        response = self.client.get(f"/api/salepost/image-duplicates/{self.post.post_id}/")
+        self.assertEqual(response.status_code, 200, response.content)
+        [entry] = response.json()["data"]
+        self.assertEqual(entry["image_id"], image.id)
+        self.assertEqual([(match["image_id"], match["distance"]) for match in entry["duplicates"]], [(duplicate.id, 6)])
+        too_far = {"max_distance": MAX_DISTANCE_LIMIT + 1}
+        self.assertEqual(self.client.get(f"/api/salepost/image-duplicates/{self.post.post_id}/", too_far).status_code, 400)
+
+
+@override_settings(SALEPOST_SIMILAR_NEIGHBOURS=3)
+class SalePostSimilarTest(UnmigratedTablesMixin, SalePostTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # baby > strollers, toys and an unrelated furniture tree
+        baby = Category.objects.create(name="baby")
+        cls.category.parent = baby
+        cls.category.save()
+        toys = Category.objects.create(name="toys", parent=baby)
+        furniture = Category.objects.create(name="furniture")
+        color = Attribute.objects.create(unique_name="color", display_name="Color", data_type=DataType.CHOICE)
+        red = AttributeChoice.objects.create(attribute=color, value="red")
+        cls.stroller = cls.create_post(product_price=Decimal("100"))
+        cls.twin = cls.create_post(product_price=Decimal("110"))
+        cls.pricey = cls.create_post(product_price=Decimal("500"))
+        cls.toy = cls.create_post(category=toys, product_price=Decimal("100"))
+        cls.wardrobe = cls.create_post(category=furniture, product_price=Decimal("100"))
+        cls.uncategorized = cls.create_post(category=None, product_price=Decimal("100"))
+        for post in (cls.stroller, cls.twin):
+            SalePostAttribute.objects.create(salepost=post, attribute=color, value=str(red.id))
+
+    def stored(self):
+        stored = defaultdict(list)
+        for salepost_id, neighbour_id, score in SalePostNeighbour.objects.order_by("salepost_id", "rank").values_list(
+            "salepost_id", "neighbour_id", "score"
+        ):
+            stored[salepost_id].append((neighbour_id, round(score, 6)))
+        return dict(stored)
+
+    def test_neighbour_ranking(self):
+        rebuild_neighbours()
+        stored = self.stored()
+
+        # same category, close price and a shared attribute first, the sibling category last
+        self.assertEqual([pk for pk, _ in stored[self.stroller.id]], [self.twin.id, self.pricey.id, self.toy.id])
+        self.assertAlmostEqual(stored[self.stroller.id][0][1], 0.35 + 0.15 * 100 / 110 + 0.1 + 0.1, places=5)
+        # unrelated categories and posts without a category never match the others
+        self.assertNotIn(self.wardrobe.id, stored)
+        self.assertNotIn(self.uncategorized.id, stored)
+        self.assertTrue(all(self.wardrobe.id not in [pk for pk, _ in rows] for rows in stored.values()))
+
+    def test_incremental_refresh_matches_a_rebuild(self):
+        self.assertEqual(run_neighbour_refresh()[0], "full")
+        self.pricey.product_price = Decimal("100")
+        self.pricey.save()
+        self.twin.post_status = PublishStatus.SOLD
+        self.twin.save()
+        self.toy.delete()
+        self.create_post(product_price=Decimal("105"))
+
+        self.assertEqual(run_neighbour_refresh()[0], "incremental")
+        refreshed = self.stored()
+        rebuild_neighbours()
+        self.assertEqual(refreshed, self.stored())
+
+    @override_settings(SALEPOST_SIMILAR_MAX_CANDIDATES=4)
+    def test_large_neighbourhoods_keep_the_closest_texts_and_prices(self):
+        self.stroller.post_title = "Bebek arabası"
+        self.stroller.save()
+        lookalike = self.create_post(post_title="Bebek arabasi ikiz", product_price=Decimal("900"))
+        posts = SalePost.objects.filter(post_status=PublishStatus.PUBLISHED).values_list("id", "post_title", "description")
+        SalePostTextVector.objects.bulk_create([
+            SalePostTextVector(salepost_id=pk, digest=digest, vector=vector)
+            for pk, digest, vector in vectorize_rows(posts, vector_dimensions())
+        ])
+
+        index = SimilarityIndex()
+        # five posts in the neighbourhood: two closest texts (itself included) and two closest prices
+        candidates = index.ids[index.candidates(index.position[self.stroller.id])].tolist()
+        self.assertEqual(sorted(candidates), sorted([self.stroller.id, lookalike.id, self.toy.id]))
+
+        rebuild_neighbours(index)
+        self.assertEqual(self.stored()[self.stroller.id][0][0], lookalike.id)
+
+    def test_view_reads_the_stored_neighbours_once(self):
+        rebuild_neighbours()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/salepost/similar/{self.stroller.post_id}/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([post["post_id"] for post in response.json()["data"]], [
+            self.twin.post_id, self.pricey.post_id, self.toy.post_id
+        ])
+
+        reads = [query["sql"] for query in queries if "salepost_salepostneighbour" in query["sql"]]
+        self.assertEqual(len(reads), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {reads[0]}")
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn("SEARCH salepost_salepostneighbour USING INDEX", plan)
+
+
+class SalePostViewCountTest(SalePostFixtures, TransactionTestCase):
+
+    def setUp(self):
+        self.create_fixtures()
+        self.salepost = self.create_post()
+        view_counter.flush()
+
+    def viewed(self):
+        return SalePost.objects.values_list("viewed", flat=True).get(pk=self.salepost.pk)
+
+    def test_retrieve_counts_buffered_views(self):
+        for expected in (1, 2):
+            response = self.client.get(f"/api/salepost/{self.salepost.post_id}/")
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response.json()["data"]["viewed"], expected)
+            self.assertEqual(response.json()["data"]["unique_views"], 1)
+
+    @override_settings(SALEPOST_VIEW_FLUSH_SECONDS=0.05)
+    def test_idle_process_flushes_in_the_background(self):
+        counter = ViewCounter()
+        counter.add(self.salepost.id)
+        counter.add(self.salepost.id)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and self.viewed() != 2:
+            time.sleep(0.05)
+
+        self.assertEqual(self.viewed(), 2)
+        self.assertEqual(counter.pending_views([self.salepost.id]), {})
+
+    def test_flush_merges_the_stored_viewers(self):
+        counter = ViewCounter()
+        for viewer in range(50):
+            counter.add(self.salepost.id, f"user:{viewer}")
+        counter.flush()
+        first = SalePostViewSketch.objects.get(salepost=self.salepost)
+
+        # half of them again plus 50 new ones, the stored sketch is merged and touched
+        for viewer in range(25, 100):
+            counter.add(self.salepost.id, f"user:{viewer}")
+        counter.flush()
+        second = SalePostViewSketch.objects.get(salepost=self.salepost)
+
+        self.assertGreater(second.updated_at, first.updated_at)
+        self.assertAlmostEqual(viewer_sketches([self.salepost.id])[self.salepost.id].count(), 100, delta=3)
+        self.assertEqual(self.viewed(), 125)
@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from apps.salepost.models import SalePost, SalePostTextVector, PublishStatus
+from apps.salepost.changes import ChangeCheckpoint
+
+from core.vectors import text_digest, vectorize_rows
+
+
+STATE_NAME = "text_vectors"
+
+
+def vector_dimensions():
+    return getattr(settings, "SALEPOST_TEXT_VECTOR_DIMENSIONS", 256)
+
+
+def load_text_vectors(post_ids):
+    """float32 matrix with the stored vector of every post id in order, zero rows for posts without one."""
+    dimensions = vector_dimensions()
+    matrix = np.zeros((len(post_ids), dimensions), dtype=np.float32)
+    position = {pk: i for i, pk in enumerate(post_ids)}
+    for salepost_id, vector in SalePostTextVector.objects.filter(salepost__post_status=PublishStatus.PUBLISHED).values_list("salepost_id", "vector").iterator(chunk_size=5000):
+        vector = np.frombuffer(vector, dtype=np.float32)
+        # vectors of another dimension setting are left out until the next --full build
+        if salepost_id in position and len(vector) == dimensions:
+            matrix[position[salepost_id]] = vector
+    return matrix
+
+
+def _batches(post_ids, batch_size, skip_unchanged):
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start:start + batch_size]
+        rows = list(SalePost.objects.filter(id__in=batch).values_list("id", "post_title", "description"))
+        if skip_unchanged:
+            digests = dict(SalePostTextVector.objects.filter(salepost_id__in=batch).values_list("salepost_id", "digest"))
+            rows = [row for row in rows if digests.get(row[0]) != text_digest(row[1], row[2])]
+        if rows:
+            yield rows
+
+
+def _store(results):
+    with transaction.atomic():
+        SalePostTextVector.objects.filter(salepost_id__in=[pk for pk, _, _ in results]).delete()
+        SalePostTextVector.objects.bulk_create(
+            [SalePostTextVector(salepost_id=pk, digest=digest, vector=vector) for pk, digest, vector in results]
+        )
+
+
+def build_text_vectors(full=False, workers=None, batch_size=2000):
+    """
+    Vectorize the published posts changed since the last run (all of them when full, on the
+    first run or after pruned markers) in a process pool, batch_size posts per task. Posts
+    whose text digest did not change are skipped. Returns (mode, number of posts vectorized).
+    """
+    checkpoint = ChangeCheckpoint(STATE_NAME)
+    changed = checkpoint.changed_ids(full)
+    published = SalePost.objects.filter(post_status=PublishStatus.PUBLISHED)
+    if changed is None:
+        mode = "full"
+        post_ids = list(published.order_by("id").values_list("id", flat=True))
+        SalePostTextVector.objects.exclude(salepost__post_status=PublishStatus.PUBLISHED).delete()
+    else:
+        mode = "incremental"
+        # changed posts plus published posts that never got a vector
+        post_ids = sorted(
+            set(published.filter(id__in=changed).values_list("id", flat=True))
+            | set(published.filter(text_vector__isnull=True).values_list("id", flat=True))
+        )
+        SalePostTextVector.objects.filter(salepost_id__in=changed).exclude(
+            salepost__post_status=PublishStatus.PUBLISHED
+        ).delete()
+
+    count = 0
+    workers = workers or os.cpu_count() or 1
+    task = partial(vectorize_rows, dimensions=vector_dimensions())
+    # forked workers must not share the database connections of this process
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for rows in _batches(post_ids, batch_size, skip_unchanged=changed is not None):
+            pending.append(pool.submit(task, rows))
+            # bounded number of batches in flight, the texts of every post are never in memory at once
+            if len(pending) >= 2 * workers:
+                results = pending.pop(0).result()
+                _store(results)
+                count += len(results)
+        for future in pending:
+            results = future.result()
+            _store(results)
+            count += len(results)
+
+    checkpoint.save()
+    return mode, count
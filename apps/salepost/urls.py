@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SalePostViewSet, SalePostHomeView, SalePostSimilarView
+from .views import SalePostViewSet, SalePostHomeView, SalePostSimilarView, SalePostListCacheStatsView, SalePostImageDuplicatesView
 
 
 router = DefaultRouter()
@@ -8,7 +8,9 @@ router.register('', SalePostViewSet, basename="salepost")
 
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('list-cache/stats/', SalePostListCacheStatsView.as_view()),
+    path('image-duplicates/<int:public_id>/', SalePostImageDuplicatesView.as_view()),
     path('home/', SalePostHomeView.as_view()),
+    path('', include(router.urls)),
     path("similar/<int:public_id>/", SalePostSimilarView.as_view()),
 ]
\ No newline at end of file
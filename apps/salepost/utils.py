@@ -1,28 +1,12 @@
-from apps.category.models import Category
-from apps.region.models import Region
+from apps.category.models import category_tree
+from apps.region.models import region_tree
 
 def get_all_descendant_region_ids(region_ids):
-    all_ids = set()
-    regions_to_process = list(Region.objects.filter(id__in=region_ids))
-
-    while regions_to_process:
-        region = regions_to_process.pop()
-        all_ids.add(region.id)
-        children = list(region.subregions.all())
-        regions_to_process.extend(children)
-
-    return list(all_ids)
+    # one lookup in the closure table, which links every region to itself and its whole subtree
+    return region_tree.descendant_ids(region_ids)
 
 
 
 def get_all_descendant_category_ids(category_ids):
-    all_ids = set()
-    categories_to_process = list(Category.objects.filter(id__in=category_ids))
-
-    while categories_to_process:
-        category = categories_to_process.pop()
-        all_ids.add(category.id)
-        children = list(category.subcategories.all())
-        categories_to_process.extend(children)
-
-    return list(all_ids)
\ No newline at end of file
+    # one lookup in the closure table, which links every category to itself and its whole subtree
+    return category_tree.descendant_ids(category_ids)
\ No newline at end of file
@@ -1,27 +1,37 @@
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
 
 from core.permissions import HasPerm
+from core.identifiers import generate_unique_post_id
 from core.responses import build_response, swagger_response
 
-from apps.salepost.models import SalePost
-from apps.salepost.serializers import SalePostListSerializer
+from apps.salepost.models import SalePost, PublishStatus
+from apps.salepost.serializers import SalePostListSerializer, SalePostCardSerializer
+from apps.salepost.queries import filter_published_saleposts, ordered_salepost_ids, seek_ordered_saleposts, nearby_saleposts, hydrate_saleposts
+from apps.salepost.pagination import SalePostPagination, SalePostCursorPagination
+from apps.salepost.cache import ListQuery, cached_ordering, cached_result, cache_stats
+from apps.salepost.facets import salepost_facets
+from apps.salepost.catalog import get_catalog
+from apps.salepost.similar import similar_salepost_ids
+from apps.salepost.feed import home_feed_ids, resolve_gender, resolve_usage_bounds
+from apps.salepost.counters import record_view, pending_views, unique_views, seller_view_stats
+from apps.salepost.duplicates import salepost_near_duplicates, max_distance as near_duplicate_distance, MAX_DISTANCE_LIMIT
+from apps.salepost.services import create_salepost_atomic, update_salepost_atomic
+from apps.region.models import Region
+from apps.category.models import Category, UsageRange, category_tree
+from apps.category.schema import category_schema, SchemaValidationError
+
+from django.db.models import F
 
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, OpenApiResponse
 
 
 
-class SalePostPagination(PageNumberPagination):
-    page_size = 20  # Default page size
-    page_size_query_param = 'limit'  # Allow ?limit=40
-    max_page_size = 100
-
-
 class SalePostViewSet(ModelViewSet):
     queryset = SalePost.objects.filter(post_status='published')
     serializer_class = SalePostListSerializer
@@ -34,6 +44,8 @@ class SalePostViewSet(ModelViewSet):
             return [IsAuthenticated(), HasPerm("salepost.change_salepost")]
         elif self.action == "destroy":
             return [IsAuthenticated(), HasPerm("salepost.delete_salepost")]
+        elif self.action == "seller_stats":
+            return [IsAuthenticated()]
         else:
             return []
 
@@ -41,7 +53,7 @@ class SalePostViewSet(ModelViewSet):
     #List Endpoint
     @extend_schema(
         summary = "Salepost List",
-        description = "Retrive salepost list.",
+        description = "Retrive salepost list. Attribute filters: attr.<unique_name>=v1,v2 (choice values or ids, text or numbers) and attr.<unique_name>.min / attr.<unique_name>.max for number attributes.",
         tags = ["Salepost"],
         parameters = [
             OpenApiParameter(
@@ -118,6 +130,26 @@ class SalePostViewSet(ModelViewSet):
                 type=OpenApiTypes.STR,
                 description="Search in title or description.",
             ),
+            OpenApiParameter(
+                name="pagination",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=["cursor"],
+                description="Use cursor pagination (forward only, no count). Follow the returned next link.",
+            ),
+            OpenApiParameter(
+                name="cursor",
+                required=False,
+                type=OpenApiTypes.STR,
+                description="Opaque cursor from the next link of the previous cursor page.",
+            ),
+            OpenApiParameter(
+                name="view",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=["card"],
+                description="card returns lean list items: title, price, region, dates and only the cover image.",
+            ),
         ],
         responses = {
             status.HTTP_200_OK : OpenApiResponse(
@@ -232,12 +264,30 @@ class SalePostViewSet(ModelViewSet):
         user_region_id = query_params.get("user_region_id")
         max_distance = query_params.get("max_distance")
 
-        if max_distance and max_distance > 50:  # max value for max_distance parameter
-            max_distance = 50
+        if max_distance:
+            try:
+                max_distance = float(max_distance)
+            except ValueError:
+                payload = build_response(
+                    success=False,
+                    code=status.HTTP_400_BAD_REQUEST,
+                    message="Invalid max_distance value"
+                )
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            if max_distance > 50:  # max value for max_distance parameter
+                max_distance = 50
 
         sort_by = query_params.get("sort_by", "published_at")  # default sort
         order = query_params.get("order", "asc")  # default order
 
+        if sort_by not in ("price", "published_at", "distance"):
+            payload = build_response(
+                success=False,
+                code=status.HTTP_400_BAD_REQUEST,
+                message="Invalid sort_by value. Must be 'price', 'published_at', or 'distance'."
+            )
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+
         # Distance filtering requested, require location input
         if (max_distance or sort_by == "distance"):
             if not ((user_lat and user_lon) or user_region_id):
@@ -276,8 +326,8 @@ class SalePostViewSet(ModelViewSet):
             else:
                 try:
                     region = Region.objects.get(id=user_region_id)
-                    user_lat = region.latitude
-                    user_lon = region.longitude
+                    user_lat = float(region.latitude)
+                    user_lon = float(region.longitude)
                 except Region.DoesNotExist:
                     payload = build_response(
                         success=False,
@@ -285,6 +335,13 @@ class SalePostViewSet(ModelViewSet):
                         message="Region not found."
                     )
                     return Response(payload, status=status.HTTP_404_NOT_FOUND)
+                except (TypeError, ValueError):
+                    payload = build_response(
+                        success=False,
+                        code=status.HTTP_400_BAD_REQUEST,
+                        message="Invalid latitude or longitude."
+                    )
+                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
             if not (-90 <= user_lat <= 90 and -180 <= user_lon <= 180):
                 payload = build_response(
@@ -294,35 +351,9 @@ class SalePostViewSet(ModelViewSet):
                 )
                 return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
-        # Begin post filtering
-        posts = SalePost.objects.filter(post_status='published').select_related('region')
+        # Begin post filtering, nothing is read from the database until the page is sliced
         try:
-            category_ids = query_params.get("category_ids")
-            if category_ids:
-                category_id_list = [int(cid.strip()) for cid in category_ids.split(",") if cid.strip().isdigit()]
-                all_category_ids = get_all_descendant_category_ids(category_id_list)
-                posts = posts.filter(category_id__in=all_category_ids)
-
-            region_ids = query_params.get("region_ids")
-            if region_ids:
-                region_id_list = [int(rid.strip()) for rid in region_ids.split(",") if rid.strip().isdigit()]
-                all_region_ids = get_all_descendant_region_ids(region_id_list)
-                posts = posts.filter(region_id__in=all_region_ids)
-
-            price_min = query_params.get("price_min")
-            if price_min:
-                posts = posts.filter(product_price__gte=int(price_min))
-
-            price_max = query_params.get("price_max")
-            if price_max:
-                posts = posts.filter(product_price__lte=int(price_max))
-
-            published_last_days = query_params.get("published_last_days")
-            if published_last_days:
-                days = int(published_last_days)
-                cutoff = timezone.now() - timezone.timedelta(days=days)
-                posts = posts.filter(posted_at__gte=cutoff)
-
+            posts = filter_published_saleposts(query_params)
         except ValueError as e:
             payload = build_response(
                 success = False,
@@ -331,66 +362,224 @@ class SalePostViewSet(ModelViewSet):
             )
             return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
-        keyword = query_params.get("keyword")
-        if keyword: 
-            posts = posts.filter(Q(post_title__icontains=keyword) | Q(description__icontains=keyword))
+        # Distance mode reads only (id, lat, lon, sort key) of the rows passing the coarse prefilter,
+        # otherwise ordering and LIMIT/OFFSET happen in SQL
+        distance_mode = bool(max_distance or sort_by == "distance")
+
+        location = (user_lat, user_lon, max_distance) if distance_mode else None
+
+        def build_ordering():
+            # the in-memory catalog (when enabled) answers the same filters without touching the posts table
+            catalog = get_catalog()
+            if catalog is not None and catalog.supports(query_params):
+                return catalog.ordering(query_params, sort_by, order, location)
+            if distance_mode:
+                return nearby_saleposts(posts, user_lat, user_lon, max_distance, sort_by=sort_by, reverse=(order == "desc"))
+            return ordered_salepost_ids(posts, sort_by, order)
+
+        # Pagination, cursor mode seeks past the last served post instead of counting and skipping rows
+        cursor_pagination = SalePostCursorPagination()
+        use_cursor = cursor_pagination.is_requested(request)
+        if use_cursor:
+            ordered = build_ordering() if distance_mode else None
+            try:
+                position = cursor_pagination.decode_cursor(request, sort_by, order, distance_mode)
+            except ValueError:
+                payload = build_response(
+                    success=False,
+                    code=status.HTTP_400_BAD_REQUEST,
+                    message="Invalid cursor."
+                )
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
-        # Calculate distances only if required
-        if max_distance or sort_by == "distance":
-            latitudes = [p.effective_latitude for p in posts]
-            longitudes = [p.effective_longitude for p in posts]
-            distances = haversine_vectorized(user_lat, user_lon, latitudes, longitudes)
-            for post, dist in zip(posts, distances):
-                post._distance_km = dist
+            size = cursor_pagination.get_page_size(request)
+            next_position = None
+            if distance_mode:
+                remaining = ordered.after(position) if position else ordered
+                page = remaining[:size]
+                if len(remaining) > size:
+                    next_position = (remaining.sort_key_at(size - 1), page[-1][0])
+            else:
+                rows = seek_ordered_saleposts(posts, sort_by, order, position, size + 1)
+                page = [pk for pk, _ in rows[:size]]
+                if len(rows) > size:
+                    next_position = (rows[size - 1][1], rows[size - 1][0])
+            next_cursor = None
+            if next_position is not None:
+                next_cursor = cursor_pagination.encode_cursor(next_position, sort_by, order, distance_mode)
+        else:
+            # page mode slices the cached ordering of the same filters when there is one
+            ordered = cached_ordering(ListQuery(query_params, sort_by, order, location), build_ordering)
+            page = self.paginate_queryset(ordered)
+            paginated = page is not None
+            if not paginated:
+                page = ordered[:]
+
+        distances = dict(page) if distance_mode else {}
+        page_ids = list(distances) if distance_mode else list(page)
+        if query_params.get("view") == "card":
+            # cards need no attribute or image queries, the cover is joined in
+            page_posts = hydrate_saleposts(page_ids, related=("region", "cover_image"))
+            serialized = SalePostCardSerializer(page_posts, many=True).data
+        else:
+            page_posts = hydrate_saleposts(page_ids)
+            serialized = SalePostListSerializer(page_posts, many=True).data
+        if distance_mode:
+            for post, obj in zip(page_posts, serialized):
+                distance_km = distances[post.id]
+                obj["distance_km"] = "Less than 1 km" if distance_km < 1 else f"{distance_km:.2f} km"
 
-            if max_distance:
-                try:
-                    max_distance = float(max_distance)
-                    posts = [p for p in posts if p._distance_km <= max_distance]
-                except ValueError:
-                    payload = build_response(
-                        success=False,
-                        code=status.HTTP_400_BAD_REQUEST,
-                        message="Invalid max_distance value"
-                    )
-                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+        if use_cursor:
+            return cursor_pagination.get_cursor_response(request, serialized, next_cursor)
+        if paginated:
+            return self.get_paginated_response(serialized)
+        return Response(serialized)
 
-        # Sorting
-        reverse = (order == "desc")
-        if sort_by == "price":
-            posts_sorted = sorted(posts, key=lambda p: p.product_price or 0, reverse=reverse)
-        elif sort_by == "published_at":
-            posts_sorted = sorted(posts, key=lambda p: p.posted_at or timezone.datetime.min, reverse=reverse)
-        elif sort_by == "distance":
-            posts_sorted = sorted(posts, key=lambda p: getattr(p, "_distance_km", float("inf")), reverse=reverse)
-        else:
+
+    #Facets Endpoint
+    @extend_schema(
+        summary = "Salepost Facets",
+        description = "Counts per category, region, usage range, price bucket and choice attribute value for the list filters (same filter parameters as the list, attr.<unique_name> included).",
+        tags = ["Salepost"],
+        parameters = [
+            OpenApiParameter(
+                name="category_ids",
+                required=False,
+                type=OpenApiTypes.STR,
+                description="Comma separated category ids. Example: 1,2,3",
+            ),
+            OpenApiParameter(
+                name="region_ids",
+                required=False,
+                type=OpenApiTypes.STR,
+                description="Comma separated region ids. Example: 1,2,3",
+            ),
+            OpenApiParameter(
+                name="price_min",
+                required=False,
+                type=OpenApiTypes.FLOAT,
+                description="Minimum price.",
+            ),
+            OpenApiParameter(
+                name="price_max",
+                required=False,
+                type=OpenApiTypes.FLOAT,
+                description="Maximum price.",
+            ),
+            OpenApiParameter(
+                name="published_last_days",
+                required=False,
+                type=OpenApiTypes.INT,
+                description="Show posts published in last N days.",
+            ),
+            OpenApiParameter(
+                name="keyword",
+                required=False,
+                type=OpenApiTypes.STR,
+                description="Search in title or description.",
+            ),
+        ],
+        responses = {
+            status.HTTP_200_OK : OpenApiResponse(
+                response = True,
+                description = "Salepost facets retrieved.",
+                examples = [
+                    swagger_response(
+                        name = "Salepost facets retrieved successfully",
+                        success = True,
+                        code = status.HTTP_200_OK,
+                        message = "Salepost facets retrieved successfully.",
+                        data = {
+                            "total": 2,
+                            "categories": [{"id": 1, "name": "Category1", "count": 2}],
+                            "regions": [{"id": 3, "name": "Region3", "count": 2}],
+                            "usage_ranges": [{"id": 1, "name": "0-6 months", "count": 1}],
+                            "price_buckets": [{"min": 0, "max": 100, "count": 2}],
+                            "attributes": [{"attribute": "color", "values": [{"id": 4, "value": "Red", "count": 2}]}]
+                        }
+                    )
+                ]
+            ),
+            status.HTTP_400_BAD_REQUEST : OpenApiResponse(
+                response = True,
+                description = "Salepost facets error",
+                examples = [
+                    swagger_response(
+                        name = "Salepost facets error",
+                        success = False,
+                        code = status.HTTP_400_BAD_REQUEST,
+                        message = "Invalid filtering value: Test",
+                    ),
+                ]
+            ),
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="facets")
+    def facets(self, request):
+        query_params = request.query_params
+        try:
+            posts = filter_published_saleposts(query_params)
+        except ValueError as e:
             payload = build_response(
-                success=False,
-                code=status.HTTP_400_BAD_REQUEST,
-                message="Invalid sort_by value. Must be 'price', 'published_at', or 'distance'."
+                success = False,
+                code = status.HTTP_400_BAD_REQUEST,
+                message=f"Invalid filtering value: {str(e)}"
             )
             return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
-        # Pagination
-        page = self.paginate_queryset(posts_sorted)
-        if page is not None:
-            serialized = SalePostListSerializer(page, many=True)
-            for obj in serialized.data:
-                post = next(p for p in page if p.post_id == obj["post_id"])
-                if hasattr(post, "_distance_km"):
-                    obj["distance_km"] = (
-                        "Less than 1 km" if post._distance_km < 1 else f"{post._distance_km:.2f} km"
-                    )
-            return self.get_paginated_response(serialized.data)
+        # grouped aggregates, cached and invalidated like the list ordering of the same filters
+        data = cached_result(ListQuery(query_params, None, None), "facets", lambda: salepost_facets(posts))
+        payload = build_response(
+            success=True,
+            code=status.HTTP_200_OK,
+            message="Salepost facets retrieved successfully.",
+            data=data
+        )
+        return Response(payload, status=status.HTTP_200_OK)
 
-        serialized = SalePostListSerializer(posts_sorted, many=True)
-        return Response(serialized.data)
 
+    #Seller Stats Endpoint
+    @extend_schema(
+        summary="Salepost Seller Stats",
+        description="View counts of the authenticated user's saleposts. unique_views are estimates (about 2% error), the total counts each viewer once across all posts.",
+        tags = ["Salepost"],
+        responses = {
+            status.HTTP_200_OK : OpenApiResponse(
+                response = True,
+                description = "Seller stats retrieved.",
+                examples = [
+                    swagger_response(
+                        name = "Seller stats retrieved successfully",
+                        success = True,
+                        code = status.HTTP_200_OK,
+                        message = "Seller stats retrieved successfully.",
+                        data = {
+                            "posts": 1,
+                            "views": 12,
+                            "unique_views": 5,
+                            "saleposts": [
+                                {"post_id": 123456, "post_title": "Salepost1", "post_status": "published", "viewed": 12, "unique_views": 5}
+                            ]
+                        }
+                    )
+                ]
+            ),
+        }
+    )
+    @action(detail=False, methods=["get"], url_path="seller-stats")
+    def seller_stats(self, request):
+        payload = build_response(
+            success=True,
+            code=status.HTTP_200_OK,
+            message="Seller stats retrieved successfully.",
+            data=seller_view_stats(request.user)
+        )
+        return Response(payload, status=status.HTTP_200_OK)
 
     #Retrive Endpoint
     @extend_schema(
         summary="Salepost Retrieve",
-        description="Retrieve a single salepost by post_id.",
+        description="Retrieve a single salepost by post_id. unique_views estimates the distinct users (or client IPs) that viewed it, within about 2%.",
         tags = ["Salepost"],
         responses = {
             status.HTTP_200_OK : OpenApiResponse(
@@ -412,6 +601,7 @@ class SalePostViewSet(ModelViewSet):
                             "description": "This is a salepost 1",
                             "posted_at": "2026-01-18T17:56:53Z",
                             "viewed": 1,
+                            "unique_views": 1,
                             "latitude": None,
                             "longitude": None,
                             "product_price": "1.00",
@@ -439,13 +629,16 @@ class SalePostViewSet(ModelViewSet):
         try:
             salepost_instance = SalePost.objects.get(post_id=pk)
             serializer = SalePostListSerializer(salepost_instance)
-            salepost_instance.viewed += 1
-            salepost_instance.save()
+            record_view(salepost_instance.id, request)
+            data = serializer.data
+            # views still buffered in this process, including this one
+            data["viewed"] = salepost_instance.viewed + pending_views(salepost_instance.id)
+            data["unique_views"] = unique_views(salepost_instance.id)
             payload = build_response(
                 success = True,
                 code = status.HTTP_200_OK,
                 message = "Salepost retrived successfully",
-                data = serializer.data
+                data = data
             )
             return Response(payload, status=status.HTTP_200_OK)
         except SalePost.DoesNotExist:
@@ -734,49 +927,15 @@ class SalePostViewSet(ModelViewSet):
             return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
 
-        category_attributes = Attribute.objects.filter(categories=category_instance)
- 
-        for categoryAtt in category_attributes:
-            att_obj = Attribute.objects.get(id=categoryAtt.id)
-            att_value = request.data.get(categoryAtt.unique_name)
-            
-            if not att_value and categoryAtt.is_required:
-                payload = build_response(
-                    success=False,
-                    code=status.HTTP_400_BAD_REQUEST,
-                    message=f"{categoryAtt.unique_name} is required."
-                )
-                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            
-            if att_value:
-                if att_obj.data_type == 'number' or  att_obj.data_type == 'choice':
-                    if not isinstance(att_value, (int, float)):
-                        payload = build_response(
-                            success=False,
-                            code=status.HTTP_400_BAD_REQUEST,
-                            message=f"{categoryAtt.unique_name} must be a number."
-                        )
-                        return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-
-                else:
-                    if not isinstance(att_value, str):
-                        payload = build_response(
-                            success=False,
-                            code=status.HTTP_400_BAD_REQUEST,
-                            message=f"{categoryAtt.unique_name} must be a string."
-                        )
-                        return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-
-                """
-                if not ((att_obj.data_type == 'number' or att_obj.data_type == 'choice') and isinstance(att_value, (int, float))):
-                    return Response({'error': f"{categoryAtt.unique_name} must be a number"}, status=status.HTTP_400_BAD_REQUEST)
-            
-                elif not (att_obj.data_type == 'text' and isinstance(att_value, str)):
-                    return Response({'error': f"{categoryAtt.unique_name} must be a string"}, status=status.HTTP_400_BAD_REQUEST)
-                """
-        
-
-        attributes_payload = dict(request.data)
+        try:
+            attribute_values = category_schema(category_instance.id).validate(request.data)
+        except SchemaValidationError as error:
+            payload = build_response(
+                success=False,
+                code=status.HTTP_400_BAD_REQUEST,
+                message=str(error)
+            )
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
         salepost_instance = create_salepost_atomic(
             post_id=postid,
@@ -790,8 +949,7 @@ class SalePostViewSet(ModelViewSet):
             longitude=longitude,
             min_usage=min_usage,
             max_usage=max_usage,
-            category_attributes=category_attributes,
-            attributes_payload=attributes_payload,
+            attribute_values=attribute_values,
         )
 
         payload = build_response(
@@ -891,77 +1049,51 @@ class SalePostViewSet(ModelViewSet):
         description = request.data.get('description')
         product_price = request.data.get('product_price')
 
-        if product_price < 0:
+        if product_price is not None and (not isinstance(product_price, (int, float)) or product_price < 0):
             payload = build_response(
-                status=False,
+                success=False,
                 code=status.HTTP_400_BAD_REQUEST,
                 message="Product price is not valid."
             )
             return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            salepost_obj = SalePost.objects.get(id=pk)
-            if not salepost_obj.seller == request.user:
+            salepost_obj = SalePost.objects.get(post_id=pk)
+            if not salepost_obj.seller_id == request.user.id:
                 payload = build_response(
-                    status=False,
+                    success=False,
                     code=status.HTTP_401_UNAUTHORIZED,
                     message="You have no access to edit"
                 )
                 return Response(payload, status=status.HTTP_401_UNAUTHORIZED)
         except SalePost.DoesNotExist:
             payload = build_response(
-                status=False,
+                success=False,
                 code=status.HTTP_404_NOT_FOUND,
                 message="Salepost not found"
             )
             return Response(payload, status=status.HTTP_404_NOT_FOUND)
 
+        fields = {}
         if post_title:
-            salepost_obj.post_title = post_title
+            fields["post_title"] = post_title
         if description:
-            salepost_obj.description = description
-        if product_price:
-            salepost_obj.product_price = product_price
-
-        category_attributes = Attribute.objects.filter(category=salepost_obj.category.id)
-        for categoryAtt in category_attributes:
-            att_obj = Attribute.objects.get(id=categoryAtt.id)
-            att_value = request.data.get(categoryAtt.unique_name)
-            if not att_value and categoryAtt.is_required:
-                payload = build_response(
-                    success=False,
-                    code=status.HTTP_400_BAD_REQUEST,
-                    message=f'{categoryAtt.unique_name} is required'
-                )
-                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            
-            if not ((att_obj.data_type == 'number' or att_obj.data_type == 'choice') and isinstance(att_value, (int, float))):
-                payload = build_response(
-                    success=False,
-                    code=status.HTTP_400_BAD_REQUEST,
-                    message=f"{categoryAtt.unique_name} must be a number."
-                )
-                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            if not (att_obj.data_type == 'text' and isinstance(att_value, str)):
-                payload = build_response(
-                    success=False,
-                    code=status.HTTP_400_BAD_REQUEST,
-                    message=f"{categoryAtt.unique_name} must be a string"
-                )
-                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            fields["description"] = description
+        if product_price is not None:
+            fields["product_price"] = product_price
 
-        for categoryAtt in category_attributes:
-            att_obj = Attribute.objects.get(id=categoryAtt.attribute.id)
-            att_value = request.data.get(categoryAtt.unique_name)
-            if att_value:
-                try:
-                    salePostAtt = SalePostAttribute.objects.get(salepost=salepost_obj, attribute=att_obj)
-                    salePostAtt.value = att_value
-                    salePostAtt.save()
+        try:
+            attribute_values, cleared_attributes = category_schema(salepost_obj.category_id).validate_changes(request.data)
+        except SchemaValidationError as error:
+            payload = build_response(
+                success=False,
+                code=status.HTTP_400_BAD_REQUEST,
+                message=str(error)
+            )
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
-                except SalePostAttribute.DoesNotExist:
-                    salePostAtt = SalePostAttribute(salepost=salepost_obj, attribute=att_obj, value=att_value)
-                    salePostAtt.save()
+        # one transaction: the post, an upsert of the sent attributes and a delete of the cleared ones
+        update_salepost_atomic(salepost_obj, attribute_values=attribute_values, cleared_attributes=cleared_attributes, **fields)
 
         payload = build_response(
             success=True,
@@ -1073,7 +1205,7 @@ class SalePostHomeView(APIView):
                 name="gender",
                 required=False,
                 type=OpenApiTypes.STR,
-                description="Filter by gender.",
+                description="Filter by gender, a choice id or label of the gender attribute (400 otherwise).",
             )
         ],
         responses = {
@@ -1117,89 +1249,54 @@ class SalePostHomeView(APIView):
 
     )
     def get(self, request):
-        min_usage = request.data.get('min_usage')
-        max_usage = request.data.get('max_usage')
-        gender = request.data.get('gender')
+        min_usage = request.query_params.get('min_usage')
+        max_usage = request.query_params.get('max_usage')
+        gender = request.query_params.get('gender')
 
-        if gender:
-            gender_posts = SalePostAttribute.objects.filter(attribute__unique_name='gender', value=gender)
-            if min_usage and max_usage:
-                if isinstance(min_usage, int) and isinstance(max_usage, int):
-                    latest_posts = SalePost.objects.filter(post_status='published', salepostattribute__in=gender_posts, min_usage_range__gte=min_usage, max_usage_range__lte=max_usage).order_by('-posted_at')[:16]
-                else:
-                    payload = build_response(
-                        success=False,
-                        code=status.HTTP_400_BAD_REQUEST,
-                        message="min_usage and max_usage must be integers."
-                    )
-                    Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            elif min_usage and not max_usage:
-                if isinstance(min_usage, int):
-                    latest_posts = SalePost.objects.filter(post_status='published', salepostattribute__in=gender_posts, min_usage_range__gte=min_usage).order_by('-posted_at')[:16]
-                else:
-                    payload = build_response(
-                        success=False,
-                        code=status.HTTP_400_BAD_REQUEST,
-                        message="min_usage must be an integer."
-                    )
-                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            elif not min_usage and max_usage:
-                if isinstance(max_usage, int):
-                    latest_posts = SalePost.objects.filter(post_status='published', salepostattribute__in=gender_posts, max_usage_range__lte=max_usage).order_by('-posted_at')[:16]
-                else:
-                    payload = build_response(
-                        success=False,
-                        code=status.HTTP_400_BAD_REQUEST,
-                        message="max_usage must be an integer."
-                    )
-                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                latest_posts = SalePost.objects.filter(post_status='published', salepostattribute__in=gender_posts).order_by('-posted_at')[:16]
-        
-        else:
-            # All posts without any gender filter
+        try:
+            min_usage = int(min_usage) if min_usage else None
+            max_usage = int(max_usage) if max_usage else None
+        except ValueError:
             if min_usage and max_usage:
-                if isinstance(min_usage, int) and isinstance(max_usage, int):
-                    latest_posts = SalePost.objects.filter(post_status='published', min_usage_range__gte=min_usage, max_usage_range__lte=max_usage).order_by('-posted_at')[:16]
-                else:
-                    payload = build_response(
-                        success=False,
-                        code=status.HTTP_400_BAD_REQUEST,
-                        message="min_usage and max_usage must be integers."
-                    )
-                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            elif min_usage and not max_usage:
-                if isinstance(min_usage, int):
-                    latest_posts = SalePost.objects.filter(post_status='published', min_usage_range__gte=min_usage).order_by('-posted_at')[:16]
-                else:
-                    payload = build_response(
-                        success=False,
-                        code=status.HTTP_400_BAD_REQUEST,
-                        message="min_usage must be an integer."
-                    )
-                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
-            elif not min_usage and max_usage:
-                if isinstance(max_usage, int):
-                    latest_posts = SalePost.objects.filter(post_status='published', max_usage_range__lte=max_usage).order_by('-posted_at')[:16]
-                else:
-                    payload = build_response(
-                        success=False,
-                        code=status.HTTP_400_BAD_REQUEST,
-                        message="max_usage must be an integer."
-                    )
-                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+                message = "min_usage and max_usage must be integers."
+            elif min_usage:
+                message = "min_usage must be an integer."
             else:
-                latest_posts = SalePost.objects.filter(post_status='published').order_by('-posted_at')[:16]
-                serializer = SalePostListSerializer(latest_posts, many=True)
-                payload = build_response(
-                    success=True,
-                    code=status.HTTP_200_OK,
-                    message="Salepost retrived successfully",
-                    data = serializer.data
-                )
-                return Response(payload, status=status.HTTP_200_OK)
+                message = "max_usage must be an integer."
+            payload = build_response(
+                success=False,
+                code=status.HTTP_400_BAD_REQUEST,
+                message=message
+            )
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            gender = resolve_gender(gender)
+        except LookupError:
+            payload = build_response(
+                success=False,
+                code=status.HTTP_400_BAD_REQUEST,
+                message="gender is not valid."
+            )
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+
+        # one stored segment per gender x usage range bucket, kept up to date by apps.salepost.feed
+        try:
+            min_usage, max_usage = resolve_usage_bounds(min_usage, max_usage)
+            post_ids = home_feed_ids(gender, min_usage, max_usage)
+        except LookupError:
+            post_ids = []
+
+        latest_posts = hydrate_saleposts(post_ids)
+        serializer = SalePostListSerializer(latest_posts, many=True)
+        payload = build_response(
+            success=True,
+            code=status.HTTP_200_OK,
+            message="Salepost retrived successfully",
+            data = serializer.data
+        )
+        return Response(payload, status=status.HTTP_200_OK)
 
-                
 
 class SalePostSimilarView(APIView):
     permission_classes = []
@@ -1237,10 +1334,8 @@ class SalePostSimilarView(APIView):
     )
     def get(self, request, public_id=None):
         MAX_RESPONSE_LENGTH = 5
-        response_list = []
-        # lets first grab the post with the provided id 
         try:
-            sale_post_instance = SalePost.objects.get(post_id=pk)
+            sale_post_instance = SalePost.objects.get(post_id=public_id)
         except SalePost.DoesNotExist:
             payload = build_response(
                 success=False,
@@ -1248,74 +1343,168 @@ class SalePostSimilarView(APIView):
                 message="SalePost not found, cannot provide related posts"
             )
             return Response(payload, status=status.HTTP_404_NOT_FOUND)
-        
 
-        # our post has this category instance
-        category_instance = sale_post_instance.category  
+        # neighbours precomputed by `manage.py refresh_salepost_neighbours`
+        post_ids = similar_salepost_ids(sale_post_instance, MAX_RESPONSE_LENGTH)
+        if not post_ids:
+            # not indexed yet: newest posts in the category, its siblings and their subcategories
+            category = sale_post_instance.category
+            posts = SalePost.objects.filter(post_status=PublishStatus.PUBLISHED).exclude(id=sale_post_instance.id)
+            if category is not None:
+                root_id = category.parent_id if category.parent_id is not None else category.id
+                posts = posts.filter(category_id__in=category_tree.descendants([root_id]))
+            post_ids = list(posts.order_by(F("posted_at").desc(nulls_last=True), "-id").values_list("id", flat=True)[:MAX_RESPONSE_LENGTH])
+
+        serializer = SalePostListSerializer(hydrate_saleposts(post_ids), many=True)
+        payload = build_response(
+            success=True,
+            code=status.HTTP_200_OK,
+            message="Salepost retrived successfully",
+            data=serializer.data
+        )
+        return Response(payload, status=status.HTTP_200_OK)
 
-        # group A, same category posts
-        # lets grab all the posts with the same category
-        list_of_posts_with_same_category = SalePost.objects.filter(category=category_instance).exclude(id=sale_post_instance.id).order_by('-posted_at')[:MAX_RESPONSE_LENGTH]
-        
-        if (len(list_of_posts_with_same_category) == MAX_RESPONSE_LENGTH):
-            serializer = SalePostListSerializer(list_of_posts_with_same_category, many=True)
+
+class SalePostListCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    @extend_schema(
+        summary="Salepost list cache stats",
+        description="Hit and miss counters of the salepost list result cache (admin only).",
+        tags = ["Salepost"],
+        responses = {
+            status.HTTP_200_OK : OpenApiResponse(
+                response = True,
+                description = "Cache stats retrieved.",
+                examples = [
+                    swagger_response(
+                        name="Cache stats retrieved successfully",
+                        success=True,
+                        code=status.HTTP_200_OK,
+                        message="Cache stats retrieved successfully.",
+                        data={"hits": 120, "misses": 30, "hit_ratio": 0.8, "timeout": 60, "max_ids": 1000}
+                    ),
+                ]
+            ),
+        }
+    )
+    def get(self, request):
+        payload = build_response(
+            success=True,
+            code=status.HTTP_200_OK,
+            message="Cache stats retrieved successfully.",
+            data=cache_stats()
+        )
+        return Response(payload, status=status.HTTP_200_OK)
+
+
+class SalePostImageDuplicatesView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    @extend_schema(
+        summary="Salepost image duplicates",
+        description="Images of other saleposts that are identical or near duplicates of the images of this salepost (admin only, for moderation).",
+        tags = ["Salepost"],
+        parameters = [
+            OpenApiParameter(
+                name="max_distance",
+                required=False,
+                type=OpenApiTypes.INT,
+                description=f"Maximum Hamming distance of the 64 bit perceptual hashes, 0 finds identical pictures only (max {MAX_DISTANCE_LIMIT}).",
+            ),
+        ],
+        responses = {
+            status.HTTP_200_OK : OpenApiResponse(
+                response = True,
+                description = "Duplicates retrieved.",
+                examples = [
+                    swagger_response(
+                        name="Duplicates retrieved successfully",
+                        success=True,
+                        code=status.HTTP_200_OK,
+                        message="Image duplicates retrieved successfully.",
+                        data=[{
+                            "image_id": 12,
+                            "image_url": "https://res.cloudinary.com/demo/image/upload/sample.jpg",
+                            "duplicates": [
+                                {"image_id": 7, "post_id": 482913, "seller": "seller1", "distance": 2, "same_file": False, "image_url": "https://res.cloudinary.com/demo/image/upload/other.jpg"}
+                            ]
+                        }]
+                    ),
+                ]
+            ),
+            status.HTTP_400_BAD_REQUEST : OpenApiResponse(
+                response = True,
+                description = "Invalid max_distance.",
+                examples = [
+                    swagger_response(
+                        name="Invalid max_distance",
+                        success=False,
+                        code=status.HTTP_400_BAD_REQUEST,
+                        message="Invalid max_distance value"
+                    ),
+                ]
+            ),
+            status.HTTP_404_NOT_FOUND : OpenApiResponse(
+                response = True,
+                description = "SalePost not found.",
+                examples = [
+                    swagger_response(
+                        name="SalePost not found",
+                        success=False,
+                        code=status.HTTP_404_NOT_FOUND,
+                        message="SalePost not found"
+                    ),
+                ]
+            ),
+        }
+    )
+    def get(self, request, public_id=None):
+        distance = request.query_params.get("max_distance")
+        try:
+            distance = near_duplicate_distance() if distance in (None, "") else int(distance)
+        except ValueError:
+            distance = -1
+        if not 0 <= distance <= MAX_DISTANCE_LIMIT:
             payload = build_response(
-                success=True,
-                code=status.HTTP_200_OK,
-                message="Salepost retrived successfully",
-                data = serializer.data
+                success=False,
+                code=status.HTTP_400_BAD_REQUEST,
+                message="Invalid max_distance value"
             )
-            return Response(payload, status=status.HTTP_200_OK)
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
 
-        
-        for i in range(len(list_of_posts_with_same_category)):
-               response_list.append(list_of_posts_with_same_category[i])
-        
-        
-        # group B, sibling category posts
-        # Get all sibling categories
-        list_of_sibling_categories = Category.objects.filter(parent_category=category_instance.parent_category)
-        list_of_posts_with_sibling_category = SalePost.objects.filter(category__in=list_of_sibling_categories).exclude(id=sale_post_instance.id).order_by('-posted_at')[:MAX_RESPONSE_LENGTH]
-
-        for i in range(len(list_of_posts_with_sibling_category)):
-            response_list.append(list_of_posts_with_sibling_category[i])
-            #remove duplicates from list
-            response_list = list(dict.fromkeys(response_list))
-            if len(response_list) >= MAX_RESPONSE_LENGTH:
-                serializer = SalePostListSerializer(response_list, many=True)
-                payload = build_response(
-                    success=True,
-                    code=status.HTTP_200_OK,
-                    message="Salepost retrived successfully",
-                    data=serializer.data,
-                )
-                return Response(payload, status=status.HTTP_200_OK)
-                
-        
-        #group C, cousin category posts
-        # parent category instance of our post 
         try:
-            parent_category_instance = Category.objects.get(name=category_instance.parent_category)
-        except Category.DoesNotExist:
-            parent_category_instance = None
-
-        if parent_category_instance != None:
-            list_of_uncle_categories = Category.objects.filter(parent_category=parent_category_instance.parent_category)
-            list_of_cousin_categories = Category.objects.filter(parent_category__in=list_of_uncle_categories)
-            list_of_posts_with_cousin_category = SalePost.objects.filter(category__in=list_of_cousin_categories).exclude(id=sale_post_instance.id).order_by('-posted_at')[:MAX_RESPONSE_LENGTH]
-
-            for i in range(len(list_of_posts_with_cousin_category)):
-                response_list.append(list_of_posts_with_cousin_category[i])
-                #remove duplicates from list
-                response_list = list(dict.fromkeys(response_list))
-                if len(response_list) >= MAX_RESPONSE_LENGTH:
-                    break
+            sale_post_instance = SalePost.objects.get(post_id=public_id)
+        except SalePost.DoesNotExist:
+            payload = build_response(
+                success=False,
+                code=status.HTTP_404_NOT_FOUND,
+                message="SalePost not found"
+            )
+            return Response(payload, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = SalePostListSerializer(response_list, many=True)
+        data = [
+            {
+                "image_id": image.id,
+                "image_url": image.get_url,
+                "duplicates": [
+                    {
+                        "image_id": other.id,
+                        "post_id": other.related_post.post_id,
+                        "seller": str(other.related_post.seller),
+                        "distance": other_distance,
+                        "same_file": bool(image.content_hash) and other.content_hash == image.content_hash,
+                        "image_url": other.get_url,
+                    }
+                    for other, other_distance in matches
+                ],
+            }
+            for image, matches in salepost_near_duplicates(sale_post_instance, distance)
+        ]
         payload = build_response(
             success=True,
             code=status.HTTP_200_OK,
-            message="Salepost retrived successfully",
-            data=serializer.data
+            message="Image duplicates retrieved successfully.",
+            data=data
         )
         return Response(payload, status=status.HTTP_200_OK)
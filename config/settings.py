@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
     "cloudinary",
     "cloudinary_storage",
 
+    "core",
     "apps.authentication",
     "apps.category",
     "apps.region",
@@ -94,6 +96,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # a file instead of the shared in-memory database, whose table locks fail concurrent
+        # writers at once, so the threaded tests (core/tests.py) can write in parallel.
+        # Kept in the temp directory, outside the repository.
+        'TEST': {'NAME': Path(tempfile.gettempdir()) / 'bebelet_test_db.sqlite3'},
     }
 }
 
@@ -200,7 +206,48 @@ OTP_EXPIRY_MINUTES = 15
 OTP_LENGTH = 4
 MAX_NUM_OF_IMAGES_PER_SALEPOST = 10
 
+# Image uploads (core/storage.py): core.storage.LocalImageStorage keeps files under MEDIA_ROOT instead of Cloudinary.
+IMAGE_STORAGE_BACKEND = config("IMAGE_STORAGE_BACKEND", default="core.storage.CloudinaryImageStorage")
+IMAGE_UPLOAD_WORKERS = 4
+# Processes rendering the thumbnail/medium WebP renditions after upload (apps/salepost/renditions.py), 0 renders inline.
+IMAGE_RENDITION_WORKERS = 2
+# Hamming distance (bits of the 64 bit dHash) up to which images count as near duplicates (apps/salepost/duplicates.py).
+IMAGE_NEAR_DUPLICATE_DISTANCE = 6
+
 
 CLOUDINARY_CLOUD_NAME=config("CLOUDINARY_CLOUD_NAME", default="")
 CLOUDINARY_API_KEY=config("CLOUDINARY_API_KEY", default="")
-CLOUDINARY_API_SECRET=config("CLOUDINARY_SECRET_KEY", default="")
\ No newline at end of file
+CLOUDINARY_API_SECRET=config("CLOUDINARY_SECRET_KEY", default="")
+
+# Salepost list result cache (apps/salepost/cache.py), 0 disables it.
+# Uses the default cache, which must be shared (Redis/Memcached) when running several workers.
+SALEPOST_LIST_CACHE_TIMEOUT = 60
+SALEPOST_LIST_CACHE_MAX_IDS = 1000
+# The page mode `count` stops at this many posts (apps/salepost/pagination.py), so the first page
+# does not count the whole catalog. Pages past it return 404, clients go on with ?pagination=cursor.
+SALEPOST_LIST_COUNT_LIMIT = 10000
+# Seconds a compiled category attribute schema (apps/category/schema.py) is reused at most,
+# bounds how long other workers validate with old rules when the default cache is not shared.
+CATEGORY_SCHEMA_MAX_AGE = 60
+
+# Per-process numpy snapshot of the published saleposts serving list filters/sorting (apps/salepost/catalog.py).
+SALEPOST_CATALOG_ENABLED = False
+SALEPOST_CATALOG_REFRESH_SECONDS = 2
+# Every salepost write is logged to SalePostChange (apps/salepost/changes.py) whatever the settings above,
+# the catalog, the neighbour refresh and the text vectors read it. Markers older than the retention are
+# pruned by the writing processes once per interval, or with `manage.py prune_salepost_changes`.
+SALEPOST_CHANGE_RETENTION_HOURS = 24
+SALEPOST_CHANGE_PRUNE_SECONDS = 3600
+
+# Salepost views are buffered per process and added to SalePost.viewed in batches (apps/salepost/counters.py).
+SALEPOST_VIEW_FLUSH_SECONDS = 10
+SALEPOST_VIEW_MAX_PENDING = 1000
+
+# Similar posts stored per post by `manage.py refresh_salepost_neighbours` (apps/salepost/similar.py),
+# run it more often than SALEPOST_CHANGE_RETENTION_HOURS or it falls back to a full rebuild.
+SALEPOST_SIMILAR_NEIGHBOURS = 10
+# posts scored per post at most, larger category neighbourhoods are cut to the closest texts and prices
+SALEPOST_SIMILAR_MAX_CANDIDATES = 5000
+# Hashed title/description vectors of `manage.py build_salepost_text_vectors` (apps/salepost/text_vectors.py),
+# run it before refresh_salepost_neighbours. Changing the dimensions needs a --full build.
+SALEPOST_TEXT_VECTOR_DIMENSIONS = 256
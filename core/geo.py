@@ -1,5 +1,8 @@
 import numpy as np
 
+EARTH_RADIUS_KM = 6371  # Earth radius in kilometers
+
+
 def haversine_vectorized(lat1, lon1, lats2, lons2):
     # Convert degrees to radians
     lat1 = np.radians(lat1)
@@ -13,5 +16,73 @@ def haversine_vectorized(lat1, lon1, lats2, lons2):
     a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lats2) * np.sin(dlon / 2.0) ** 2
     c = 2 * np.arcsin(np.sqrt(a))
 
-    R = 6371  # Earth radius in kilometers
-    return R * c
\ No newline at end of file
+    return EARTH_RADIUS_KM * c
+
+
+def bounding_box(lat, lon, radius_km):
+    # Coarse lat/lon box that contains every point within radius_km of (lat, lon).
+    # Used as a cheap SQL prefilter before the exact haversine check.
+    dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat = max(lat - dlat, -90.0)
+    max_lat = min(lat + dlat, 90.0)
+
+    # Near the poles (or across the antimeridian) the longitude span degenerates, keep it open
+    cos_lat = np.cos(np.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat <= 1e-6:
+        return min_lat, max_lat, -180.0, 180.0
+    dlon = np.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+    if lon - dlon < -180 or lon + dlon > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+
+# Fixed lat/lon grid used to index post coordinates, a cell is ~11 km tall
+GRID_CELL_DEGREES = 0.1
+GRID_ROWS = int(round(180 / GRID_CELL_DEGREES))
+GRID_COLUMNS = int(round(360 / GRID_CELL_DEGREES))
+
+
+def _grid_row(lat):
+    return min(max(int((lat + 90) // GRID_CELL_DEGREES), 0), GRID_ROWS - 1)
+
+
+def _grid_column(lon):
+    return min(max(int((lon + 180) // GRID_CELL_DEGREES), 0), GRID_COLUMNS - 1)
+
+
+def grid_cell(lat, lon):
+    # cells are numbered row by row, so the cells of one row form a contiguous id range
+    return _grid_row(lat) * GRID_COLUMNS + _grid_column(lon)
+
+
+def grid_cell_ranges(lat, lon, radius_km):
+    # (first, last) cell id ranges, one per grid row, covering the circle around (lat, lon)
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    first_column, last_column = _grid_column(min_lon), _grid_column(max_lon)
+    return [
+        (row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+        for row in range(_grid_row(min_lat), _grid_row(max_lat) + 1)
+    ]
+
+
+def nearest_indices(distances, k, farthest=False, tiebreak=None):
+    """
+    Indices of the k smallest distances (largest with farthest=True), ordered, in O(n + k log k)
+    instead of sorting every candidate. Equal distances are ordered by tiebreak (e.g. post ids),
+    ascending for nearest and descending for farthest, like a full lexsort would.
+    """
+    n = len(distances)
+    if tiebreak is None:
+        tiebreak = np.arange(n)
+    values = -distances if farthest else distances
+    ties = -tiebreak if farthest else tiebreak
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        # everything up to the k-th value (ties included), only these get sorted
+        kth = values[np.argpartition(values, k - 1)[k - 1]]
+        candidates = np.flatnonzero(values <= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((ties[candidates], values[candidates]))[:k]
+    return candidates[order]
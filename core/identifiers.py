@@ -1,6 +1,5 @@
 import string
 import secrets
-import random
 
 from datetime import datetime
 from decouple import config
@@ -9,16 +8,43 @@ from django.contrib.auth import get_user_model
 
 from apps.salepost.models import SalePost
 
+from core.sequences import IdentifierGenerator
+
 User = get_user_model()
 
 
+USERNAME_ALPHABET = string.ascii_letters + string.digits + "-_"  # token_urlsafe alphabet
+USERNAME_CODE_LENGTH = 10
+
+
+def _encode_username_code(number):
+    chars = []
+    for _ in range(USERNAME_CODE_LENGTH):
+        number, index = divmod(number, len(USERNAME_ALPHABET))
+        chars.append(USERNAME_ALPHABET[index])
+    return "".join(chars)
+
+
+def _username(code):
+    now = datetime.now()
+    return f"{now.year}{code}{now.month}"
+
+
+def _taken_username_codes(codes):
+    usernames = {_username(code): code for code in codes}
+    return [usernames[name] for name in User.objects.filter(username__in=list(usernames)).values_list("username", flat=True)]
+
+
+username_codes = IdentifierGenerator(
+    "username",
+    domain_size=len(USERNAME_ALPHABET) ** USERNAME_CODE_LENGTH,
+    encode=_encode_username_code,
+    existing=_taken_username_codes,
+)
+
+
 def create_username():
-    month = datetime.now().month
-    year = datetime.now().year
-    while True:
-        username = f"{year}{secrets.token_urlsafe(10)[:10]}{month}"
-        if not User.objects.filter(username=username).exists():
-            return username
+    return _username(username_codes.next())
 
 def generate_otp(length):
     if (config("ENVIRONMENT") == 'LOCAL' or config("ENVIRONMENT") == 'QA'):
@@ -29,8 +55,18 @@ def generate_otp(length):
         return f"{number:0{length}d}"
 
 
+def _taken_post_ids(post_ids):
+    # posts created with the former random ids
+    return SalePost.objects.filter(post_id__in=post_ids).values_list("post_id", flat=True)
+
+
+post_ids = IdentifierGenerator(
+    "salepost.post_id",
+    domain_size=900000,
+    encode=lambda number: 100000 + number,  # 6-digit number
+    existing=_taken_post_ids,
+)
+
+
 def generate_unique_post_id():
-    while True:
-        new_id = random.randint(100000, 999999)  # 6-digit number
-        if not SalePost.objects.filter(post_id=new_id).exists():
-            return new_id
\ No newline at end of file
+    return post_ids.next()
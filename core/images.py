@@ -0,0 +1,62 @@
+import hashlib
+import io
+
+import numpy as np
+from PIL import Image, ImageOps, features
+
+
+# rendition name -> longest edge in pixels, images are never upscaled
+RENDITIONS = {"thumbnail": 320, "medium": 1024}
+
+# dHash grid, HASH_SIZE x HASH_SIZE bits (64)
+HASH_SIZE = 8
+
+
+def rendition_format():
+    """WebP when this Pillow build can encode it, JPEG otherwise: (PIL format, extension)."""
+    return ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+
+def render_renditions(data, renditions=None, quality=80):
+    """
+    {name: (bytes, extension)} of the image bytes scaled to every rendition size, EXIF rotation
+    applied and metadata dropped. Pure function without Django, so it runs in worker processes.
+    """
+    renditions = renditions or RENDITIONS
+    image_format, extension = rendition_format()
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+        if image_format == "JPEG" and source.mode == "RGBA":
+            source = source.convert("RGB")
+
+        options = {"quality": quality, "method": 4} if image_format == "WEBP" else {"quality": quality, "optimize": True}
+        rendered = {}
+        for name, edge in renditions.items():
+            image = source.copy()
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, image_format, **options)
+            rendered[name] = (output.getvalue(), extension)
+    return rendered
+
+
+def content_hash(data):
+    """sha256 hex digest of the file bytes, equal only for byte identical uploads."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def dhash(data, size=HASH_SIZE):
+    """
+    Difference hash of the image bytes as an unsigned size*size bit int: the image is reduced
+    to (size + 1) x size grayscale pixels and each bit says whether a pixel is brighter than
+    its right neighbour. Re-encoded, rescaled or lightly edited copies differ in a few bits.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        # JPEGs decode at a fraction of their size, the hash only needs a few pixels
+        source.draft("L", (size * 8, size * 8))
+        source = ImageOps.exif_transpose(source).convert("L")
+        pixels = np.asarray(source.resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('key', models.CharField(max_length=64)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
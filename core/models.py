@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class IdentifierSequence(models.Model):
+    # counter and permutation key of one core.sequences.IdentifierGenerator, the key never changes once created
+    name = models.CharField(max_length=50, unique=True)
+    key = models.CharField(max_length=64)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
@@ -0,0 +1,111 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+
+from django.db import transaction
+from django.db.models import F
+
+
+class IdentifierSpaceExhausted(Exception):
+    pass
+
+
+class FeistelPermutation:
+    """
+    Keyed bijection of range(domain_size): a balanced Feistel network over the smallest even
+    bit width that covers the domain, with cycle-walking for values that fall outside it.
+    Consecutive inputs map to unrelated looking outputs, distinct inputs never collide.
+    """
+
+    rounds = 6
+
+    def __init__(self, key, domain_size):
+        self.key = key.encode() if isinstance(key, str) else key
+        self.domain_size = domain_size
+        self.half_bits = max(1, ((domain_size - 1).bit_length() + 1) // 2)
+        self.half_mask = (1 << self.half_bits) - 1
+
+    def _round(self, round_number, value):
+        digest = hmac.new(self.key, f"{round_number}:{value}".encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], "big") & self.half_mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.half_mask
+        for round_number in range(self.rounds):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, value):
+        if not 0 <= value < self.domain_size:
+            raise ValueError("value out of the permutation domain")
+        value = self._encrypt(value)
+        # the network permutes [0, 4 ** half_bits), walking the cycle lands back inside the domain
+        while value >= self.domain_size:
+            value = self._encrypt(value)
+        return value
+
+
+class IdentifierGenerator:
+    """
+    Unique, non-sequential identifiers without a lookup per id: a database counter
+    (core.models.IdentifierSequence) hands out blocks of block_size positions per process, and
+    each position goes through a keyed permutation of the id space. encode turns the permuted
+    number into the identifier. existing (optional) returns the identifiers of a block that are
+    already taken by rows created before the generator, checked once per block.
+    """
+
+    def __init__(self, name, domain_size, encode=None, existing=None, block_size=100):
+        self.name = name
+        self.domain_size = domain_size
+        self.encode = encode or (lambda number: number)
+        self.existing = existing
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.pid = None
+        self.pending = []
+
+    def _reserve(self, size):
+        from core.models import IdentifierSequence
+
+        while True:
+            with transaction.atomic():
+                # bump before reading, the UPDATE takes the row (SQLite: write) lock up front
+                bumped = IdentifierSequence.objects.filter(
+                    name=self.name, next_value__lt=self.domain_size
+                ).update(next_value=F("next_value") + size)
+                if bumped:
+                    sequence = IdentifierSequence.objects.get(name=self.name)
+                    break
+            sequence, created = IdentifierSequence.objects.get_or_create(
+                name=self.name, defaults={"key": secrets.token_hex(32)}
+            )
+            if not created and sequence.next_value >= self.domain_size:
+                raise IdentifierSpaceExhausted(f"{self.name}: all {self.domain_size} identifiers are used")
+
+        start = sequence.next_value - size
+        stop = min(sequence.next_value, self.domain_size)
+        permutation = FeistelPermutation(sequence.key, self.domain_size)
+        return [self.encode(permutation.permute(position)) for position in range(start, stop)]
+
+    def _fresh(self, size):
+        while True:
+            block = self._reserve(size)
+            taken = set(self.existing(block)) if self.existing else set()
+            free = [identifier for identifier in reversed(block) if identifier not in taken]
+            if free:
+                return free
+
+    def next(self):
+        if transaction.get_connection().in_atomic_block:
+            # the counter update would be rolled back with the caller's transaction while the rest
+            # of the block stayed in memory, so reserve just the id used by this transaction
+            return self._fresh(1)[0]
+        with self.lock:
+            # a block reserved before a fork must not be shared by the worker processes
+            if self.pid != os.getpid():
+                self.pid, self.pending = os.getpid(), []
+            if not self.pending:
+                self.pending = self._fresh(self.block_size)
+            return self.pending.pop()
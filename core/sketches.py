@@ -0,0 +1,70 @@
+import hashlib
+import math
+
+import numpy as np
+
+
+DENSE, SPARSE = 0, 1
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate of the added values in 2 ** precision one byte registers
+    (4 KB at the default precision 12, about 1.6% standard error). Sketches merge with a
+    register-wise max, so adding the same value or merging the same sketch twice changes
+    nothing. to_bytes() stores sketches with few set registers as (index, rank) pairs.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = np.zeros(self.size, dtype=np.uint8) if registers is None else registers
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        rest_bits = 64 - self.precision
+        index = hashed >> rest_bits
+        rest = hashed & ((1 << rest_bits) - 1)
+        # position of the first set bit of the remaining hash bits
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            # small cardinalities: linear counting on the empty registers
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        indexes = np.flatnonzero(self.registers)
+        if len(indexes) * 3 < self.size:
+            pairs = np.empty(len(indexes), dtype=[("index", ">u2"), ("rank", "u1")])
+            pairs["index"], pairs["rank"] = indexes, self.registers[indexes]
+            return bytes([SPARSE, self.precision]) + pairs.tobytes()
+        return bytes([DENSE, self.precision]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        kind, precision = data[0], data[1]
+        sketch = cls(precision)
+        if kind == SPARSE:
+            pairs = np.frombuffer(data[2:], dtype=[("index", ">u2"), ("rank", "u1")])
+            sketch.registers[pairs["index"]] = pairs["rank"]
+        else:
+            sketch.registers = np.frombuffer(data[2:], dtype=np.uint8).copy()
+        return sketch
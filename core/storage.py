@@ -0,0 +1,130 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ImageStorage:
+    """
+    Where uploaded image files go. upload() returns the value stored in the CloudinaryField,
+    delete() removes an upload again (used to undo partial batches), url() builds the public URL
+    and read() fetches the stored bytes back.
+    """
+
+    def upload(self, file):
+        raise NotImplementedError
+
+    def read(self, stored):
+        with urlopen(self.url(stored), timeout=30) as response:
+            return response.read()
+
+    def delete(self, stored):
+        pass
+
+    def url(self, stored):
+        raise NotImplementedError
+
+
+class CloudinaryImageStorage(ImageStorage):
+
+    def upload(self, file):
+        from cloudinary import uploader
+
+        if hasattr(file, "seekable") and file.seekable():
+            file.seek(0)
+        return uploader.upload_resource(file, type="upload", resource_type="image")
+
+    def delete(self, stored):
+        from cloudinary import uploader
+
+        uploader.destroy(stored.public_id, type="upload", resource_type="image")
+
+    def url(self, stored):
+        return f"https://res.cloudinary.com/{settings.CLOUDINARY_CLOUD_NAME}/{stored}"
+
+
+class LocalImageStorage(ImageStorage):
+    """
+    Files under MEDIA_ROOT/images, a stand-in for development and offline benchmarks.
+    latency (seconds, LOCAL_IMAGE_STORAGE_LATENCY) simulates the network round trip of an upload.
+    """
+
+    directory = "images"
+
+    def __init__(self, latency=None):
+        self.latency = getattr(settings, "LOCAL_IMAGE_STORAGE_LATENCY", 0) if latency is None else latency
+        self.root = os.path.join(getattr(settings, "MEDIA_ROOT", "") or os.path.join(settings.BASE_DIR, "media"), self.directory)
+
+    def upload(self, file):
+        if self.latency:
+            time.sleep(self.latency)
+        extension = os.path.splitext(getattr(file, "name", "") or "")[1].lower() or ".jpg"
+        name = f"{uuid.uuid4().hex}{extension}"
+        os.makedirs(self.root, exist_ok=True)
+        if hasattr(file, "seekable") and file.seekable():
+            file.seek(0)
+        with open(os.path.join(self.root, name), "wb") as target:
+            for chunk in file.chunks() if hasattr(file, "chunks") else [file.read()]:
+                target.write(chunk)
+        return f"{self.directory}/{name}"
+
+    @staticmethod
+    def _path(stored):
+        # values read back from the CloudinaryField are resources with the extension split off
+        if hasattr(stored, "public_id"):
+            return f"{stored.public_id}.{stored.format}" if stored.format else stored.public_id
+        return str(stored)
+
+    def read(self, stored):
+        with open(os.path.join(self.root, os.path.basename(self._path(stored))), "rb") as source:
+            return source.read()
+
+    def delete(self, stored):
+        try:
+            os.remove(os.path.join(self.root, os.path.basename(self._path(stored))))
+        except FileNotFoundError:
+            pass
+
+    def url(self, stored):
+        return f"{settings.MEDIA_URL}{self._path(stored)}"
+
+
+@lru_cache(maxsize=None)
+def get_image_storage():
+    return import_string(getattr(settings, "IMAGE_STORAGE_BACKEND", "core.storage.CloudinaryImageStorage"))()
+
+
+def upload_files(files, storage=None, workers=None):
+    """
+    Upload the files concurrently on at most workers threads, results in file order.
+    If any upload fails the successful ones are deleted again and the first error is raised.
+    """
+    storage = storage or get_image_storage()
+    workers = workers or getattr(settings, "IMAGE_UPLOAD_WORKERS", 4)
+    if not files:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        futures = [pool.submit(storage.upload, file) for file in files]
+        wait(futures)
+
+    failed = [future.exception() for future in futures if future.exception() is not None]
+    if failed:
+        delete_uploads([future.result() for future in futures if future.exception() is None], storage)
+        raise failed[0]
+    return [future.result() for future in futures]
+
+
+def delete_uploads(stored_values, storage=None, workers=None):
+    storage = storage or get_image_storage()
+    workers = workers or getattr(settings, "IMAGE_UPLOAD_WORKERS", 4)
+    if not stored_values:
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(stored_values))) as pool:
+        # best effort, a failed delete leaves an orphaned file but must not hide the original error
+        wait([pool.submit(storage.delete, stored) for stored in stored_values])
@@ -0,0 +1,234 @@
+import threading
+from decimal import Decimal
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from apps.category.models import Category
+from apps.region.models import Region
+from apps.salepost.models import SalePost
+
+from core.geo import EARTH_RADIUS_KM, bounding_box, grid_cell, grid_cell_ranges, haversine_vectorized, nearest_indices
+from core.identifiers import _taken_post_ids
+from core.sequences import IdentifierGenerator
+from core.sketches import DENSE, SPARSE, HyperLogLog
+from core.vectors import cosine_top_k, hashed_vector
+
+
+class IdentifierGeneratorConcurrencyTest(TransactionTestCase):
+    THREADS = 8
+    POSTS_PER_THREAD = 25
+
+    def setUp(self):
+        self.seller = get_user_model().objects.create(username="seller")
+        self.category = Category.objects.create(name="strollers")
+        self.region = Region.objects.create(name="istanbul", latitude="41.0", longitude="29.0")
+        self.taken = []
+
+    def existing(self, post_ids):
+        taken = list(_taken_post_ids(post_ids))
+        self.taken.extend(taken)
+        return taken
+
+    def create_posts(self, errors):
+        # one generator per thread like one per worker process, they only share the database counter
+        generator = IdentifierGenerator(
+            "test.post_id", domain_size=900000, encode=lambda number: 100000 + number,
+            existing=self.existing, block_size=5,
+        )
+        try:
+            for i in range(self.POSTS_PER_THREAD):
+                SalePost.objects.create(
+                    post_id=generator.next(), seller=self.seller, category=self.category, region=self.region,
+                    post_title=f"Post {i}", description="", product_price=Decimal("10"),
+                )
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_parallel_creates_get_unique_ids_without_retries(self):
+        errors = []
+        threads = [threading.Thread(target=self.create_posts, args=(errors,)) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        post_ids = list(SalePost.objects.values_list("post_id", flat=True))
+        self.assertEqual(len(post_ids), self.THREADS * self.POSTS_PER_THREAD)
+        self.assertEqual(len(set(post_ids)), len(post_ids))
+        # no reserved id was already used by another post
+        self.assertEqual(self.taken, [])
+
+
+class CosineTopKTest(SimpleTestCase):
+
+    def unit_rows(self, rng, count, dimensions=16):
+        rows = rng.normal(size=(count, dimensions)).astype(np.float32)
+        return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+    def brute_force(self, matrix, queries, k):
+        scores = queries @ matrix.T
+        indices = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return indices, np.take_along_axis(scores, indices, axis=1)
+
+    def test_matches_a_full_sort(self):
+        rng = np.random.default_rng(7)
+        matrix, queries = self.unit_rows(rng, 300), self.unit_rows(rng, 45)
+        for k in (1, 10, 299, 300, 500):
+            with self.subTest(k=k):
+                # chunks smaller than the query count go through several matrix products
+                indices, scores = cosine_top_k(matrix, queries, k, chunk_size=16)
+                expected_indices, expected_scores = self.brute_force(matrix, queries, k)
+                self.assertEqual(indices.shape, (45, min(k, 300)))
+                np.testing.assert_array_equal(indices, expected_indices)
+                np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+    def test_single_query_and_text_vectors(self):
+        texts = ["bebek arabası", "bebek arabasi az kullanılmış", "ahşap oyuncak", "çocuk bisikleti"]
+        matrix = np.array([hashed_vector([(text, 1.0)], 64) for text in texts])
+        indices, scores = cosine_top_k(matrix, hashed_vector([("Bebek Arabası", 1.0)], 64), 2)
+        self.assertEqual(indices.tolist(), [[0, 1]])
+        self.assertAlmostEqual(float(scores[0, 0]), 1.0, places=5)
+
+
+
+class NearestIndicesTest(SimpleTestCase):
+
+    def lexsort(self, distances, k, farthest, tiebreak):
+        if farthest:
+            return np.lexsort((-tiebreak, -distances))[:max(k, 0)]
+        return np.lexsort((tiebreak, distances))[:max(k, 0)]
+
+    def test_matches_a_full_lexsort(self):
+        rng = np.random.default_rng(3)
+        for n in (0, 1, 7, 200):
+            # few distinct values, so the k-th distance is usually tied
+            distances = rng.integers(0, 10, n).astype(float)
+            tiebreak = rng.permutation(n) + 1000
+            for k in (0, 1, 5, n - 1, n, n + 3):
+                for farthest in (False, True):
+                    with self.subTest(n=n, k=k, farthest=farthest):
+                        np.testing.assert_array_equal(
+                            nearest_indices(distances, k, farthest=farthest, tiebreak=tiebreak),
+                            self.lexsort(distances, k, farthest, tiebreak),
+                        )
+
+    def test_continuous_distances_and_default_tiebreak(self):
+        rng = np.random.default_rng(4)
+        distances = rng.uniform(0, 50, 1000)
+        distances[::50] = 25.0
+        for k in (1, 20, 999, 1000):
+            with self.subTest(k=k):
+                np.testing.assert_array_equal(nearest_indices(distances, k), self.lexsort(distances, k, False, np.arange(1000)))
+                np.testing.assert_array_equal(
+                    nearest_indices(distances, k, farthest=True), self.lexsort(distances, k, True, np.arange(1000))
+                )
+
+
+class HyperLogLogTest(SimpleTestCase):
+
+    def sketch(self, values, precision=12):
+        sketch = HyperLogLog(precision)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    def test_error_bound(self):
+        # 1.04 / sqrt(4096) is about 1.6% standard error, stay within four of them
+        for n in (10, 100, 1000, 10000, 100000):
+            with self.subTest(n=n):
+                estimate = self.sketch(f"user:{i}" for i in range(n)).count()
+                self.assertLessEqual(abs(estimate - n), max(1, 0.065 * n))
+
+    def test_repeated_values_count_once(self):
+        sketch = self.sketch(f"user:{i % 300}" for i in range(3000))
+        self.assertEqual(len(sketch), self.sketch(f"user:{i}" for i in range(300)).count())
+
+    def test_sparse_until_a_third_of_the_registers_are_set(self):
+        sparse = self.sketch(range(200))
+        self.assertEqual(sparse.to_bytes()[0], SPARSE)
+        self.assertLess(len(sparse.to_bytes()), 2 + 3 * 200)
+
+        dense = self.sketch(range(3000))
+        self.assertGreater(np.count_nonzero(dense.registers) * 3, dense.size)
+        self.assertEqual(dense.to_bytes()[0], DENSE)
+        self.assertEqual(len(dense.to_bytes()), 2 + dense.size)
+
+        for sketch in (HyperLogLog(), sparse, dense, self.sketch(range(50), precision=8)):
+            restored = HyperLogLog.from_bytes(sketch.to_bytes())
+            self.assertEqual(restored.precision, sketch.precision)
+            np.testing.assert_array_equal(restored.registers, sketch.registers)
+
+    def test_merge_is_the_sketch_of_the_union(self):
+        # overlapping halves, one stored dense and read back
+        left, right = self.sketch(range(0, 5000)), self.sketch(range(4000, 8000))
+        union = self.sketch(range(0, 8000))
+        merged = HyperLogLog.from_bytes(right.to_bytes()).merge(left)
+        np.testing.assert_array_equal(merged.registers, union.registers)
+        # merging the same sketch again changes nothing
+        np.testing.assert_array_equal(merged.merge(right).registers, union.registers)
+
+        disjoint = self.sketch(range(100)).merge(self.sketch(range(100, 200)))
+        np.testing.assert_array_equal(disjoint.registers, self.sketch(range(200)).registers)
+        with self.assertRaises(ValueError):
+            HyperLogLog(12).merge(HyperLogLog(10))
+
+def destination(lat, lon, bearings, distances_km):
+    """Points reached from (lat, lon) along the bearings (degrees) after distances_km, great circle."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    theta, delta = np.radians(bearings), np.asarray(distances_km) / EARTH_RADIUS_KM
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(delta) + np.cos(lat1) * np.sin(delta) * np.cos(theta))
+    lon2 = lon1 + np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(lat1), np.cos(delta) - np.sin(lat1) * np.sin(lat2))
+    return np.degrees(lat2), (np.degrees(lon2) + 180) % 360 - 180
+
+
+class GridPrefilterTest(SimpleTestCase):
+    # (lat, lon, radius km): on a cell corner, near both poles, over the pole, across the antimeridian
+    CASES = [
+        (41.0, 29.0, 10), (41.05, 29.05, 30), (-33.9, 18.4, 2),
+        (89.5, 10.0, 40), (89.95, -120.0, 25), (-89.8, 0.0, 50),
+        (0.0, 179.99, 15), (-16.5, -179.95, 40), (65.0, 180.0, 5),
+    ]
+
+    def assertCovers(self, lat, lon, radius_km, rng):
+        bearings = rng.uniform(0, 360, 3000)
+        # half of the points close to the circle edge, on both sides of it
+        distances = np.concatenate([rng.uniform(0, 1.5 * radius_km, 1500), rng.uniform(0.98, 1.02, 1500) * radius_km])
+        lats, lons = destination(lat, lon, bearings, distances)
+        inside = haversine_vectorized(lat, lon, lats, lons) <= radius_km
+
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        ranges = grid_cell_ranges(lat, lon, radius_km)
+        for point_lat, point_lon in zip(lats[inside], lons[inside]):
+            self.assertTrue(min_lat <= point_lat <= max_lat and min_lon <= point_lon <= max_lon, (point_lat, point_lon))
+            cell = grid_cell(point_lat, point_lon)
+            self.assertTrue(any(first <= cell <= last for first, last in ranges), (point_lat, point_lon))
+
+    def test_cells_cover_every_point_in_the_radius(self):
+        rng = np.random.default_rng(11)
+        for lat, lon, radius_km in self.CASES:
+            with self.subTest(lat=lat, lon=lon, radius_km=radius_km):
+                self.assertCovers(lat, lon, radius_km, rng)
+
+    def test_random_centers(self):
+        rng = np.random.default_rng(12)
+        for lat, lon, radius_km in zip(rng.uniform(-90, 90, 40), rng.uniform(-180, 180, 40), rng.uniform(0.5, 50, 40)):
+            with self.subTest(lat=lat, lon=lon, radius_km=radius_km):
+                self.assertCovers(lat, lon, radius_km, rng)
+
+    def test_boxes_stay_narrow_away_from_the_poles_and_the_antimeridian(self):
+        # 11.1 km is about 0.1 degrees of latitude, 40.9002 to 41.0998 spans two grid rows of a few cells
+        min_lat, max_lat, min_lon, max_lon = bounding_box(41.0, 29.0, 11.1)
+        self.assertAlmostEqual(max_lat - min_lat, 0.2, places=3)
+        self.assertLess(max_lon - min_lon, 0.3)
+        ranges = grid_cell_ranges(41.0, 29.0, 11.1)
+        self.assertEqual(len(ranges), 2)
+        self.assertTrue(all(last - first <= 3 for first, last in ranges), ranges)
+        self.assertEqual(bounding_box(0.0, 179.99, 15)[2:], (-180.0, 180.0))
+        self.assertEqual(bounding_box(89.95, 0.0, 25)[2:], (-180.0, 180.0))
@@ -0,0 +1,108 @@
+from django.db import transaction
+
+
+def closure_rows(parents):
+    """
+    (ancestor id, descendant id, depth) rows of the closure of a {node id: parent id} forest,
+    including the depth 0 row of every node. A parent chain that loops stops where it repeats.
+    """
+    rows = []
+    for node_id in parents:
+        ancestor_id, depth, seen = node_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            rows.append((ancestor_id, node_id, depth))
+            seen.add(ancestor_id)
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    return rows
+
+
+class ClosureTree:
+    """
+    Ancestor/descendant closure of a self-referencing `parent` tree, stored in closure_model
+    (ancestor, descendant, depth). Every node links to itself at depth 0, so the subtree of a
+    node is one indexed lookup on ancestor. The node model signals keep it in sync; bulk
+    updates bypass them, check()/rebuild() repair that.
+    """
+
+    def __init__(self, closure_model):
+        self.closure_model = closure_model
+
+    @property
+    def node_model(self):
+        return self.closure_model._meta.get_field("ancestor").related_model
+
+    @property
+    def links(self):
+        return self.closure_model.objects
+
+    def descendants(self, node_ids):
+        """Subquery of the ids of the given (existing) nodes and all of their descendants."""
+        return self.links.filter(ancestor_id__in=node_ids).values("descendant_id")
+
+    def descendant_ids(self, node_ids):
+        return list(
+            self.links.filter(ancestor_id__in=node_ids).values_list("descendant_id", flat=True).distinct()
+        )
+
+    def ancestor_ids(self, node_ids):
+        """The given (existing) nodes and all of their ancestors."""
+        return list(
+            self.links.filter(descendant_id__in=node_ids).values_list("ancestor_id", flat=True).distinct()
+        )
+
+    def is_descendant(self, node_id, other_id):
+        return self.links.filter(ancestor_id=node_id, descendant_id=other_id).exists()
+
+    def _attach(self, subtree, parent_id):
+        # link every ancestor of parent (and parent itself) to every node of the subtree
+        ancestors = self.links.filter(descendant_id=parent_id).values_list("ancestor_id", "depth")
+        self.links.bulk_create([
+            self.closure_model(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+            for ancestor_id, up in ancestors
+            for descendant_id, down in subtree
+        ])
+
+    def _detach(self, node_id):
+        # drop the links from the strict ancestors of node to its subtree
+        subtree = list(self.links.filter(ancestor_id=node_id).values_list("descendant_id", flat=True))
+        self.links.filter(descendant_id__in=subtree).exclude(
+            ancestor_id__in=subtree
+        ).delete()
+
+    def node_created(self, node):
+        with transaction.atomic():
+            self.links.create(ancestor_id=node.pk, descendant_id=node.pk, depth=0)
+            if node.parent_id is not None:
+                self._attach([(node.pk, 0)], node.parent_id)
+
+    def node_moved(self, node):
+        with transaction.atomic():
+            self._detach(node.pk)
+            if node.parent_id is not None:
+                subtree = list(self.links.filter(ancestor_id=node.pk).values_list("descendant_id", "depth"))
+                self._attach(subtree, node.parent_id)
+
+    def node_deleting(self, node):
+        # children are set to NULL with a plain UPDATE, they become roots of their own subtrees
+        for child_id in self.node_model.objects.filter(parent_id=node.pk).values_list("pk", flat=True):
+            self._detach(child_id)
+
+    def expected_rows(self):
+        parents = dict(self.node_model.objects.values_list("pk", "parent_id"))
+        return set(closure_rows(parents))
+
+    def check(self):
+        """(missing, unexpected) closure rows compared to the parent links."""
+        expected = self.expected_rows()
+        stored = set(self.links.values_list("ancestor_id", "descendant_id", "depth"))
+        return expected - stored, stored - expected
+
+    def rebuild(self, batch_size=2000):
+        rows = self.expected_rows()
+        with transaction.atomic():
+            self.links.all().delete()
+            self.links.bulk_create(
+                [self.closure_model(ancestor_id=a, descendant_id=d, depth=depth) for a, d, depth in rows],
+                batch_size=batch_size,
+            )
+        return len(rows)
@@ -0,0 +1,85 @@
+import hashlib
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from core.text import turkish_lower
+
+
+# folded to ASCII after Turkish lowercasing, so "çocuk" and "cocuk" share features
+ASCII_FOLD = str.maketrans({"ç": "c", "ğ": "g", "ı": "i", "ö": "o", "ş": "s", "ü": "u", "â": "a", "î": "i", "û": "u"})
+WORD = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    return turkish_lower(text or "").translate(ASCII_FOLD)
+
+
+def text_features(text):
+    """Words and the character trigrams of each word (with ^/$ boundaries) of the normalized text."""
+    features = []
+    for word in WORD.findall(normalize_text(text)):
+        features.append(f"w:{word}")
+        padded = f"^{word}$"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def hashed_vector(fields, dimensions):
+    """
+    L2 normalized float32 vector of [(text, weight), ...]: every feature is hashed to a signed
+    slot (the hashing trick, no vocabulary to build or ship) with a 1 + log(count) weight.
+    Empty text gives the zero vector, which has cosine 0 with everything.
+    """
+    counts = Counter()
+    for text, weight in fields:
+        for feature, count in Counter(text_features(text)).items():
+            counts[feature] += weight * (1 + math.log(count))
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature, weight in counts.items():
+        hashed = zlib.crc32(feature.encode())
+        vector[hashed % dimensions] += weight if hashed & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def text_digest(*texts):
+    return hashlib.md5("\x00".join(normalize_text(text) for text in texts).encode()).hexdigest()
+
+
+def vectorize_rows(rows, dimensions, title_weight=2.0):
+    """
+    [(id, title, description), ...] -> [(id, digest, vector bytes), ...]. Pure function without
+    database access, so it runs in worker processes.
+    """
+    return [
+        (pk, text_digest(title, description), hashed_vector([(title, title_weight), (description, 1.0)], dimensions).tobytes())
+        for pk, title, description in rows
+    ]
+
+
+def cosine_top_k(matrix, queries, k, chunk_size=1024):
+    """
+    Indices and scores of the k rows of matrix closest to every query row by cosine (rows are
+    L2 normalized, so a dot product), best first. Queries go through one matrix product per
+    chunk_size rows to keep the (queries x rows) score block bounded.
+    """
+    queries = np.atleast_2d(queries)
+    k = min(k, len(matrix))
+    indices = np.empty((len(queries), k), dtype=np.intp)
+    scores = np.empty((len(queries), k), dtype=np.float32)
+    for start in range(0, len(queries), chunk_size):
+        block = queries[start:start + chunk_size] @ matrix.T
+        if k < block.shape[1]:
+            best = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        else:
+            best = np.broadcast_to(np.arange(block.shape[1]), block.shape).copy()
+        best_scores = np.take_along_axis(block, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        indices[start:start + len(block)] = np.take_along_axis(best, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(best_scores, order, axis=1)
+    return indices, scores